@@ -0,0 +1,62 @@
+/** compact wire schema of live messages, see ldt_core/wire.py
+ * translates messages between full and compact form, using tables from server's js_vars
+ * the compact form is used after server replied to page load with it
+ * keys are replaced in messages and in records nested in known fields, other values are passed as is
+ */
+class Wire {
+    constructor(conf) {
+        this.conf = conf;
+        this.long_keys = {};
+        for (let key in conf.keys) this.long_keys[conf.keys[key]] = key;
+        this.compact = false;
+    }
+
+    static isRecord(data) {
+        return data !== null && typeof data == 'object' && !Array.isArray(data);
+    }
+
+    static lookup(table, k) {
+        return Object.prototype.hasOwnProperty.call(table, k) ? table[k] : k;
+    }
+
+    rename(record, keys, names) {
+        /** replace keys of a record, and of records nested in known fields */
+        let nested = (v) => (Wire.isRecord(v) ? this.rename(v, keys, names) : v);
+        let renamed = {};
+        for (let k in record) {
+            let name = Wire.lookup(names, k), v = record[k];
+            if (this.conf.records.includes(name)) {
+                v = nested(v);
+            } else if (this.conf.record_lists.includes(name) && Array.isArray(v)) {
+                v = v.map(nested);
+            } else if (this.conf.record_maps.includes(name) && Wire.isRecord(v)) {
+                let m = {};
+                for (let i in v) m[i] = nested(v[i]);
+                v = m;
+            }
+            renamed[Wire.lookup(keys, k)] = v;
+        }
+        return renamed;
+    }
+
+    loadMessage() {
+        /** page load message, requesting compact schema */
+        return {type: 'load', schema: this.conf.schema};
+    }
+
+    encode(message) {
+        if (!this.compact) return message;
+        let encoded = this.rename(message, this.conf.keys, {});
+        let code = this.conf.types.indexOf(message.type);
+        if (code != -1) encoded[this.conf.keys.type] = code;
+        return encoded;
+    }
+
+    decode(message) {
+        if (!(this.conf.keys.type in message)) return message;
+        this.compact = true;
+        let decoded = this.rename(message, this.long_keys, this.long_keys);
+        if (typeof decoded.type == 'number') decoded.type = this.conf.types[decoded.type];
+        return decoded;
+    }
+}
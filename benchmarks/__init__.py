@@ -0,0 +1,116 @@
+"""Micro-benchmarks of hot functions of the apps
+
+Run all of them from the project directory:
+```python -m benchmarks```
+or some of them:
+```python -m benchmarks nonwords images```
+
+Timings can be stored as baselines, and later runs compared against them:
+```
+python -m benchmarks --save
+python -m benchmarks --compare
+```
+The baselines are specific to a machine, so they are kept out of git, and saved on the same machine before comparing.
+"""
+
+import os
+import json
+import time
+import timeit
+from pathlib import Path
+
+# importing any app imports oTree database, make it in-memory, not touching db.sqlite3 of devserver
+os.environ['OTREE_IN_MEMORY'] = '1'
+os.environ['OTREE_EPHEMERAL'] = '1'
+
+BASELINES_FILE = Path(__file__).parent / "baselines.json"
+
+# timings of the current run, by benchmark name, in seconds
+RESULTS = {}
+
+
+def measure(func, *args, repeat=5):
+    """Time calls of a function, returning best time per call, in seconds"""
+    timer = timeit.Timer(lambda: func(*args))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def measure_with_reset(func, reset, repeat=5):
+    """Time single calls of a function that changes some state, restored by `reset` after each call
+
+    Return:
+        best time per call, in seconds, not including the resets
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+        reset()
+    return min(timings)
+
+
+def report(name, seconds, baseline=None):
+    """Print timing of a benchmark, and speedup relative to a baseline timing"""
+    RESULTS[name] = seconds
+    line = f"{name:<48} {format_result(name, seconds)}"
+    if baseline is not None:
+        line += f" {baseline / seconds:8.2f}x"
+    print(line)
+
+
+def report_size(name, size, baseline=None):
+    """Print size of data in bytes, and reduction relative to a baseline size"""
+    report(f"{name} (bytes)", size, baseline)
+
+
+def format_result(name, value):
+    if name.endswith("(bytes)"):
+        return f"{value:12d} B "
+    return f"{value * 1e6:12.2f} us"
+
+
+def setup_otree():
+    """Initialize oTree in process, with in-memory database, once"""
+    from otree import database
+    from otree.main import setup
+
+    if database.ephemeral_connection is None:
+        # ephemeral mode binds sessions to this connection
+        database.ephemeral_connection = database.engine.connect()
+        setup()
+
+
+def load_baselines(path=BASELINES_FILE):
+    """Load stored timings, by module and benchmark name"""
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baselines(results, path=BASELINES_FILE):
+    """Store timings of modules, replacing previous timings of the same modules"""
+    baselines = load_baselines(path)
+    baselines.update(results)
+    path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+
+
+def compare(results, baselines, tolerance):
+    """Compare timings with baselines
+
+    Args:
+        results (dict): timings of current run, by module and benchmark name
+        baselines (dict): stored timings, the same way
+        tolerance (float): allowed relative slowdown, e.g. 0.25 for 25%
+
+    Return:
+        list of (name, seconds, baseline seconds) of benchmarks slower than allowed
+    """
+    regressions = []
+    for module, timings in results.items():
+        stored = baselines.get(module, {})
+        for name, seconds in timings.items():
+            if name in stored and seconds > stored[name] * (1 + tolerance):
+                regressions.append((f"{module}: {name}", seconds, stored[name]))
+    return regressions
@@ -0,0 +1,44 @@
+import argparse
+import sys
+import importlib
+
+from . import RESULTS, load_baselines, save_baselines, compare, format_result
+
+MODULES = ['nonwords', 'stimuli', 'images', 'scoring', 'apps', 'wire', 'startup']
+
+parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Micro-benchmarks of hot functions")
+parser.add_argument('names', nargs='*', default=MODULES, help=f"modules to run, of {', '.join(MODULES)}")
+parser.add_argument('--save', action='store_true', help="store timings as baselines")
+parser.add_argument('--compare', action='store_true', help="compare timings with stored baselines")
+parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown, default 0.25")
+args = parser.parse_args()
+
+results = {}
+
+for name in args.names:
+    print(f"# {name}")
+    module = importlib.import_module(f"benchmarks.{name}")
+    RESULTS.clear()
+    module.run()
+    results[name] = dict(RESULTS)
+
+if args.compare:
+    baselines = load_baselines()
+    if not baselines:
+        print("# no baselines stored on this machine, save them with --save")
+    regressions = compare(results, baselines, args.tolerance)
+    print(f"# compared to baselines, tolerance {args.tolerance:.0%}")
+    for name, seconds, baseline in regressions:
+        print(
+            f"REGRESSION {name:<48} {format_result(name, seconds)}, "
+            f"was {format_result(name, baseline).strip()} ({seconds / baseline - 1:+.0%})"
+        )
+    if not regressions:
+        print("no regressions")
+
+if args.save:
+    save_baselines(results)
+    print("# baselines saved")
+
+if args.compare and regressions:
+    sys.exit(1)
@@ -0,0 +1,77 @@
+"""Encoding of trials/puzzles for pages, and generating of trials, within the apps
+
+Runs oTree in process, with in-memory database (see benchmarks/__init__.py),
+creating a session of each config with `NUM_PLAYERS`.
+"""
+import importlib
+
+from otree.database import db, session_scope
+from otree.session import create_session
+
+from . import measure, measure_with_reset, report, setup_otree
+
+NUM_PLAYERS = 20
+
+CONFIGS = [
+    'generic',
+    'ldt_yesno',
+    'ldt_gonogo',
+    'ldt_priming',
+    'transcription',
+    'matrices',
+    'decoding',
+    'sliders',
+    'iat_words',
+    'iat_images',
+]
+
+
+def discard(players):
+    """Rollback all changes, and reload players with their session"""
+
+    def reset():
+        db.rollback()
+        for player in players:
+            db._db.refresh(player)
+            db._db.refresh(player.session)
+
+    return reset
+
+
+def bench_encode(config, app, player):
+    if hasattr(app, 'encode_trial'):
+        trial = app.Trial.filter(player=player)[0]
+        report(f"{config}: encode_trial", measure(app.encode_trial, trial))
+    else:
+        puzzle = app.generate_puzzle(player)
+        db.commit()
+        report(f"{config}: encode_puzzle", measure(app.encode_puzzle, puzzle))
+
+
+def bench_generate(config, app, players):
+    if hasattr(app, 'generate_all_trials'):
+        name, generate = 'generate_all_trials', app.generate_all_trials
+    elif hasattr(app, 'generate_trials'):
+        name, generate = 'generate_trials', app.generate_trials
+    else:
+        name, generate = 'generate_puzzle', app.generate_puzzle
+
+    def generate_all():
+        for player in players:
+            generate(player)
+        db._db.flush()
+
+    report(f"{config}: {name}", measure_with_reset(generate_all, discard(players)))
+
+
+def run():
+    setup_otree()
+    print(f"{NUM_PLAYERS} players per session")
+    with session_scope():
+        for config in CONFIGS:
+            session = create_session(config, num_participants=NUM_PLAYERS)
+            db.commit()
+            app = importlib.import_module(session.config['app_sequence'][0])
+            players = session.get_subsessions()[0].get_players()
+            bench_encode(config, app, players[0])
+            bench_generate(config, app, players)
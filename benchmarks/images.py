@@ -0,0 +1,33 @@
+"""Rendering of images, apart from apps"""
+from types import SimpleNamespace
+
+from ldt_core import image_utils
+from real_effort import task_transcription, task_matrix, task_decoding
+from sliders import task_sliders
+
+from . import measure, report
+
+WORD = "benchmark"
+# sliders with default params of the app
+SLIDERS_PARAMS = dict(num_sliders=48, num_columns=3)
+
+
+def render_distorted(text):
+    return image_utils.distort_image(image_utils.render_text(text))
+
+
+def run():
+    report("render_text", measure(image_utils.render_text, WORD))
+    image = image_utils.render_text(WORD)
+    report("distort_image", measure(image_utils.distort_image, image))
+    report("render_text+distort_image", measure(render_distorted, WORD))
+    report("encode_image", measure(image_utils.encode_image, image_utils.distort_image(image)))
+
+    layout = task_sliders.generate_layout(SLIDERS_PARAMS)
+    targets = [task_sliders.generate_slider()[0] for _ in range(SLIDERS_PARAMS['num_sliders'])]
+    report("task_sliders.render_image", measure(task_sliders.render_image, layout, targets))
+
+    for task in (task_transcription, task_matrix, task_decoding):
+        puzzle = SimpleNamespace(**task.generate_puzzle_fields())
+        name = task.__name__.rsplit('.', 1)[1]
+        report(f"{name}.render_image", measure(task.render_image, puzzle))
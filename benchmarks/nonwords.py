@@ -0,0 +1,76 @@
+"""Throughput of nonword generation, compared to the original list-based implementation"""
+import random
+
+from ldt_core import nonword_utils, nonword_bank, stimuli_utils
+from ldt_core.lexicon import TOP_WORDS
+
+from . import measure, report
+
+WORDS_CSV = TOP_WORDS
+BANK_CSV = nonword_bank.TOP_WORDS_BANK
+
+
+# the original implementation, scanning lists
+
+
+def legacy_fragmentize_word(word):
+    word = word.lower()
+    return [f for f in nonword_utils.CLUSTER_re.split(word) if f != ""]
+
+
+def legacy_classify_frag(frag):
+    if frag in nonword_utils.VOWL_CLUSTERS:
+        return nonword_utils.VOWL_CLUSTERS
+    if frag in nonword_utils.CONS_CLUSTERS:
+        return nonword_utils.CONS_CLUSTERS
+
+
+def legacy_mutate_frag(frag):
+    clusters = legacy_classify_frag(frag)
+    assert clusters is not None
+    clusters = clusters.copy()
+    clusters.remove(frag)
+    return random.choice(clusters)
+
+
+def legacy_mutate_word(word):
+    frags = legacy_fragmentize_word(word)
+    i = random.randint(0, len(frags) - 1)
+    frags[i] = legacy_mutate_frag(frags[i])
+    return "".join(frags)
+
+
+def legacy_count_syllables(word):
+    word = word.rstrip('e')
+    frags = legacy_fragmentize_word(word)
+    return sum([f in nonword_utils.VOWL_CLUSTERS for f in frags])
+
+
+def run():
+    pool = []
+    stimuli_utils.load_csv(pool, WORDS_CSV, ['target'])
+    words = [row['target'] for row in pool]
+
+    def each(func):
+        return lambda: [func(w) for w in words]
+
+    pairs = [
+        ("fragmentize_word", legacy_fragmentize_word, nonword_utils.fragmentize_word),
+        ("count_syllables", legacy_count_syllables, nonword_utils.count_syllables),
+        ("mutate_word", legacy_mutate_word, nonword_utils.mutate_word),
+    ]
+
+    print(f"{len(words)} words per call")
+    for name, legacy, current in pairs:
+        baseline = measure(each(legacy))
+        report(f"{name} (legacy)", baseline)
+        report(name, measure(each(current)), baseline)
+
+    # compared to legacy mutate_word, the last baseline
+    report("mutate_words", measure(nonword_utils.mutate_words, words), baseline)
+
+    lexicon = set(words)
+    bank = nonword_bank.load_bank(BANK_CSV)
+    baseline = measure(nonword_utils.generate_nonwords, words, lexicon)
+    report("generate_nonwords", baseline)
+    report("sample_nonwords", measure(nonword_bank.sample_nonwords, bank, words, lexicon), baseline)
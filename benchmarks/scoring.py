@@ -0,0 +1,26 @@
+"""Scoring of IAT results"""
+import random
+
+from iat import stats
+
+from . import measure, report
+
+# trials in rounds 3, 4, 6, 7 with default `num_iterations`
+ROUND_SIZES = (10, 20, 10, 20)
+
+
+def latencies(count, mean, std):
+    return [max(0.2, random.gauss(mean, std)) for _ in range(count)]
+
+
+def run():
+    random.seed(0)
+    compatible = [latencies(n, 0.7, 0.2) for n in ROUND_SIZES[:2]]
+    incompatible = [latencies(n, 0.9, 0.25) for n in ROUND_SIZES[2:]]
+    data = compatible + incompatible
+    print(f"{sum(ROUND_SIZES)} trials")
+    report("dscore", measure(stats.dscore, *data))
+
+    data = [values * 10 for values in data]
+    print(f"{sum(ROUND_SIZES) * 10} trials")
+    report("dscore, 10x", measure(stats.dscore, *data))
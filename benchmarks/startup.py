@@ -0,0 +1,64 @@
+"""Import time of the apps, as paid by every process starting the server or tests
+
+Imports oTree and all apps of `settings.SESSION_CONFIGS` in a fresh interpreter with `python -X importtime`,
+and reports cumulative import time of each app, of all the apps after oTree, and of Pillow, if imported at all.
+An app imported first also pays for the shared modules, like `ldt_core`.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from ldt_core.settings_utils import app_names
+
+from . import report
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+REPEAT = 5
+
+
+def import_times(modules):
+    """Import modules in a fresh interpreter
+
+    Return:
+        dict of cumulative import times of top-level imported modules, in seconds
+    """
+    code = "; ".join(f"import {name}" for name in modules)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=PROJECT_DIR,
+        env=os.environ.copy(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    times = {}
+    # lines like: "import time:       512 |      10466 | otree.api", nested imports indented
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def best_import_times(modules, repeat=REPEAT):
+    """Best of several runs, for each module"""
+    runs = [import_times(modules) for _ in range(repeat)]
+    return {name: min(run.get(name, float('inf')) for run in runs) for name in runs[0]}
+
+
+def run():
+    apps = app_names()
+    times = best_import_times(['otree.api'] + apps)
+    for app in apps:
+        report(f"import {app}", times[app])
+    report("import all apps", sum(times[app] for app in apps))
+    if 'PIL.Image' in times:
+        report("import PIL.Image", times['PIL.Image'])
+    else:
+        print("PIL not imported")
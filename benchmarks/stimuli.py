@@ -0,0 +1,30 @@
+"""Loading and filtering of stimuli pools"""
+from pathlib import Path
+
+from ldt_core import stimuli_utils, lexicon
+
+from . import measure, report
+
+ROOT = Path(__file__).parent.parent
+WORDS_CSV = lexicon.TOP_WORDS
+PAIRS_CSV = ROOT / "ldt_priming" / "freeassoc_top100.csv"
+STIMULI_CSV = ROOT / "generic" / "stimuli.csv"
+
+# replicas of the small generic pool, to filter a pool of realistic size
+POOL_REPLICAS = 50
+
+
+def load(filepath, fields=None):
+    pool = []
+    stimuli_utils.load_csv(pool, filepath, fields)
+    return pool
+
+
+def run():
+    report("load_csv words", measure(load, WORDS_CSV, ['target', 't_freq']))
+    report("load_csv pairs", measure(load, PAIRS_CSV, ['CUE', 'TARGET', 'FSG']))
+
+    pool = load(STIMULI_CSV) * POOL_REPLICAS
+    print(f"{len(pool)} stimuli in pool")
+    report("filter_by_category", measure(stimuli_utils.filter_by_category, pool, ['positive']))
+    report("filter_by_fields", measure(lambda: stimuli_utils.filter_by_fields(pool, category='positive')))
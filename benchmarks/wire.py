@@ -0,0 +1,148 @@
+"""Bytes of live messages per session, in full and compact wire schema
+
+Runs oTree in process, like `apps`, and plays a session of each config through its live method:
+page load, calibration pings, all trials with correct responses, and a reload.
+Sizes are of messages both ways, serialized as the browser and the server do.
+
+Also size and time of reloading a page of sliders midgame, with a large grid,
+when the client has no puzzle, and when it keeps the puzzle and gets only changes.
+"""
+import contextlib
+import importlib
+import io
+import json
+import random
+
+from otree.database import db, session_scope
+from otree.session import create_session
+
+from ldt_core import clock, wire
+
+from . import measure, report, report_size, setup_otree
+
+CONFIGS = [
+    'generic',
+    'ldt_yesno',
+    'ldt_gonogo',
+    'ldt_priming',
+    'sliders',
+]
+
+RELOAD_SLIDERS = 120
+RELOAD_CHANGES = 5
+
+
+def size(message) -> int:
+    return len(json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode())
+
+
+class Channel:
+    """Live method of a player, counting bytes of messages both ways"""
+
+    def __init__(self, app, player, compact):
+        self.app = app
+        self.player = player
+        self.compact = compact
+        self.bytes = 0
+
+    def send(self, msgtype, **fields):
+        message = dict(type=msgtype, **fields)
+        if msgtype == 'load':
+            if self.compact:
+                message['schema'] = wire.SCHEMA
+        elif self.compact:
+            message = wire.compact(message)
+        self.bytes += size(message)
+        reply = self.app.play_game(self.player, message)
+        if not reply:
+            return None
+        reply = reply[self.player.id_in_group]
+        self.bytes += size(reply)
+        return wire.expand(reply) if self.compact else reply
+
+
+def play_trials(channel):
+    player = channel.player
+    params = player.session.params
+    channel.send('load')
+    channel.send('ping', time=clock.now().wall * 1000, first=True)
+    for _ in range(params['calibration_pings']):
+        channel.send('ping', time=clock.now().wall * 1000)
+    channel.send('prefetched', time=100, failed=0)
+    for _ in range(params['num_iterations']):
+        channel.send('new')
+        trial = channel.app.GAME.get_current_trial(player)
+        channel.send('response', response=trial.solution, reaction_time=500, total_time=550)
+        if trial.iteration == params['num_iterations'] // 2:
+            channel.send('load')
+    channel.send('new')
+
+
+def play_sliders(channel):
+    app, player = channel.app, channel.player
+    channel.send('load')
+    channel.send('new')
+    puzzle = app.get_current_puzzle(player)
+    for slider in app.Slider.filter(puzzle=puzzle):
+        clock.sleep(player.session.params['retry_delay'])
+        channel.send('value', slider=slider.idx, value=slider.target)
+        if slider.idx == puzzle.num_sliders // 2:
+            channel.send('load')
+
+
+def play_session(config, compact):
+    # the same trials in both schemas
+    random.seed(config)
+    session = create_session(config, num_participants=1)
+    app = importlib.import_module(session.config['app_sequence'][0])
+    player = session.get_subsessions()[0].get_players()[0]
+    channel = Channel(app, player, compact)
+    # the apps print debugging output of each message
+    with contextlib.redirect_stdout(io.StringIO()):
+        if hasattr(app, 'GAME'):
+            play_trials(channel)
+        else:
+            play_sliders(channel)
+    db.rollback()
+    return channel.bytes
+
+
+def bench_reload():
+    session = create_session(
+        'sliders',
+        num_participants=1,
+        # repeating the same message, not to be rate limited
+        modified_session_config_fields=dict(num_sliders=RELOAD_SLIDERS, num_columns=4, rate_limit=0),
+    )
+    app = importlib.import_module('sliders')
+    player = session.get_subsessions()[0].get_players()[0]
+    app.play_game(player, dict(type='new'))
+    puzzle = app.get_current_puzzle(player)
+    for slider in app.Slider.filter(puzzle=puzzle)[:RELOAD_CHANGES * 2]:
+        clock.sleep(session.params['retry_delay'])
+        app.play_game(player, dict(type='value', slider=slider.idx, value=slider.target))
+    db._db.flush()
+
+    name = f"sliders x{RELOAD_SLIDERS}: reload"
+    cached = dict(puzzle=puzzle.id, version=puzzle.version - RELOAD_CHANGES)
+    for label, message in [('', {}), (f', {RELOAD_CHANGES} changed', cached)]:
+        message = dict(message, type='load')
+        reply = app.play_game(player, message)[player.id_in_group]
+        report_size(f"{name}{label}", size(reply))
+        report(f"{name}{label}", measure(app.play_game, player, message))
+    db.rollback()
+
+
+def run():
+    setup_otree()
+    # not to wait for delays between messages
+    previous = clock.install(clock.VirtualClock())
+    try:
+        with session_scope():
+            for config in CONFIGS:
+                full = play_session(config, compact=False)
+                report_size(f"{config}: full", full)
+                report_size(f"{config}: compact", play_session(config, compact=True), full)
+            bench_reload()
+    finally:
+        clock.install(previous)
@@ -1,13 +1,14 @@
-import time
 import random
+import hashlib
+from functools import lru_cache
 from pathlib import Path
 
 from otree.api import *
-from otree import settings
 
 
 from . import stimuli_utils
 from . import image_utils
+from ldt_core import live_engine, live_timing, shared_cache, lazy, asset_bundle
 
 doc = """
 Generic stimulus/response app
@@ -35,10 +36,18 @@ class Constants(BaseConstants):
 
 C = Constants
 
-POOL = []
-stimuli_utils.load_csv(
-    POOL, Path(__file__).parent / "stimuli.csv", ['stimulus', 'category']
-)
+
+@lru_cache(maxsize=None)
+def get_pool():
+    """Stimuli loaded on first use, not at import, see ldt_core/lazy.py"""
+    pool = []
+    stimuli_utils.load_csv(
+        pool, Path(__file__).parent / "stimuli.csv", ['stimulus', 'category']
+    )
+    return pool
+
+
+__getattr__ = lazy.attributes(__name__, POOL=get_pool)
 
 
 class Subsession(BaseSubsession):
@@ -51,10 +60,22 @@ class Group(BaseGroup):
 
 class Player(BasePlayer):
     iteration = models.IntegerField(initial=0)
+    # last iteration sent to client, in batch mode
+    delivered = models.IntegerField(initial=0)
     num_trials = models.IntegerField(initial=0)
     num_solved = models.IntegerField(initial=0)
     num_failed = models.IntegerField(initial=0)
 
+    # preloading of images, reported by client
+    prefetch_time = models.IntegerField()
+    prefetch_failed = models.IntegerField()
+
+    # network round trip time and clock offset, see ldt_core/calibration.py
+    calibration = models.LongStringField()
+    rtt = models.FloatField()
+    rtt_jitter = models.FloatField()
+    clock_offset = models.FloatField()
+
 
 class Trial(ExtraModel):
     """A record of single iteration"""
@@ -64,6 +85,9 @@ class Trial(ExtraModel):
     iteration = models.IntegerField(initial=0)
     server_loaded_timestamp = models.FloatField()
     server_response_timestamp = models.FloatField()
+    # monotonic clock readings paired with the timestamps, see ldt_core/clock.py
+    server_loaded_mono = models.FloatField()
+    server_response_mono = models.FloatField()
 
     stimulus = models.StringField()
     category = models.StringField()
@@ -77,6 +101,10 @@ class Trial(ExtraModel):
 
     # network delay, includes: transfering trial data, loading images, transfering response data
     network_latency = models.IntegerField()
+    # latency abnormal for the player's estimated round trip time
+    latency_spike = models.BooleanField()
+    # server processing time of messages, see ldt_core/live_timing.py
+    server_timing = models.LongStringField()
 
 
 def creating_session(subsession: Subsession):
@@ -90,6 +118,9 @@ def creating_session(subsession: Subsession):
         auto_response_time=5000,
         input_freezing_time=100,
         inter_trial_time=2000,
+        batch_size=1,
+        calibration_pings=5,
+        calibration_period=5,
     )
     required = ["categories", "labels"]
     session.params = {}
@@ -100,39 +131,7 @@ def creating_session(subsession: Subsession):
 
     subsession.is_practice = True
 
-    for player in subsession.get_players():
-        generate_all_trials(player)
-
-
-def get_progress(player: Player, trial: Trial = None) -> dict:
-    """Return whatever progress data to show on page"""
-    params = player.session.params
-    return dict(
-        total=params['num_iterations'],
-        completed=player.num_trials,
-        # attempts_total=params["attempts_per_trial"],
-        # attempts_used=trial.attempts if trial else None,
-    )
-
-
-def update_stats(player: Player, trial: Trial):
-    """Update player stats"""
-    if trial.attempts == 1:
-        # count trials only once
-        player.num_trials += 1
-
-    if trial.is_correct:
-        player.num_solved += 1
-    else:
-        player.num_failed += 1
-
-
-def undo_stats(player: Player, trial: Trial):
-    """Undo last update of stats"""
-    if trial.is_correct:
-        player.num_solved -= 1
-    else:
-        player.num_failed -= 1
+    GAME.setup(subsession)
 
 
 def generate_trial(player: Player) -> Trial:
@@ -140,7 +139,7 @@ def generate_trial(player: Player) -> Trial:
     params = player.session.params
     target_side = random.choice(C.choices)
     target_cat = params['categories'][target_side]
-    targets = stimuli_utils.filter_by_category(POOL, [target_cat])
+    targets = stimuli_utils.filter_by_category(get_pool(), [target_cat])
     target = random.choice(targets)
 
     return Trial.create(
@@ -163,7 +162,7 @@ def generate_all_trials(player: Player):
     if not count:
         raise RuntimeError("Cannot generate trials without `num_iterations`")
 
-    selected = stimuli_utils.filter_by_category(POOL, list(categories.values()))
+    selected = stimuli_utils.filter_by_category(get_pool(), list(categories.values()))
 
     if len(selected) < count:
         raise RuntimeError(f"Insufficient stimuli in the pool for {count} iterations")
@@ -187,23 +186,52 @@ def generate_all_trials(player: Player):
         )
 
 
-def get_current_trial(player: Player) -> Trial:
-    """Get trial for current iteration, or None"""
-    trials = Trial.filter(player=player, iteration=player.iteration)
-    if trials:
-        [trial] = trials
-        return trial
+STATIC_IMAGES_DIR = Path(__file__).parent.parent / "_static" / "images"
+STATIC_IMAGES_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif")
 
 
 def static_image_url(path):
-    """hardcoded for now"""
+    """Url of an image in asset bundle, if served, or in static files, see ldt_core/asset_bundle.py"""
+    bundle = asset_bundle.current()
+    if bundle is not None and f"images/{path}" in bundle:
+        return bundle.url(f"images/{path}")
     return f'/static/images/{path}'
 
 
+def bundled_images():
+    """Static images referenced by stimuli, to pack into asset bundle"""
+    paths = set(
+        row['stimulus'] for row in get_pool() if row['stimulus'].lower().endswith(STATIC_IMAGES_SUFFIXES)
+    )
+    return {f"images/{path}": STATIC_IMAGES_DIR / path for path in sorted(paths)}
+
+
+def static_image_info(path):
+    """Get url, size and hash of a static image
+    Computed once for all server processes, see ldt_core/shared_cache.py
+    """
+
+    url = static_image_url(path)
+
+    def build():
+        filepath = STATIC_IMAGES_DIR / path
+        width, height = image_utils.image_size(filepath)
+        return dict(
+            url=url,
+            width=width,
+            height=height,
+            hash=hashlib.md5(filepath.read_bytes()).hexdigest(),
+        )
+
+    return shared_cache.get('static-images', url, build)
+
+
 def render_image(text):
-    img = image_utils.render_text(text)
-    img = image_utils.distort_image(img)
-    data = image_utils.encode_image(img)
+    with live_timing.phase('render'):
+        img = image_utils.render_text(text)
+        img = image_utils.distort_image(img)
+    with live_timing.phase('encode'):
+        data = image_utils.encode_image(img)
     return data
 
 
@@ -219,217 +247,44 @@ def encode_trial(trial: Trial) -> dict:
     # return dict(stimulus=dict(type='image-data', data=render_image(trial.stimulus)))
 
 
-def check_response(trial: Trial, response: str) -> bool:
-    """Check if the response is correct"""
-    return trial.solution == response
-
-
-def play_game(player: Player, message: dict):
-    """Main task workflow on the live page
-    Implemented as reactive scheme: receive message from browser, react, respond.
-
-    Generic task workflow, from server point of view:
-
-    - receive: {'type': 'load'} -- the page has been loaded
-    - check if it's game start or page refresh midgame
-    - respond: {'type': 'status', 'progress': status}
-    - respond: {'type': 'status', 'progress': status, 'trial': data} -- in case of midgame page reload
-
-    - receive: {'type': 'new'} -- request for a new (or first) trial
-    - generate new trial
-    - respond: {'type': 'trial', 'trial': data}
-    - respond: {'type': 'status', 'game_over': True} -- if num_iterations exhausted
-
-    - receive: {'type': 'response', 'response': ..., 'reaction_time': ...} -- user responded
-    - check and record response
-    - respond: {'type': 'feedback', 'response': ..., 'is_correct': true|false} -- feedback to the response
-
-    - receive: {'type': 'timeout'} -- response timeout happened
-    - record timeout response
-    - respond: {'type': 'feedback', 'response': ..., 'is_correct': true|false}
-
-    Field 'progress' is added to all server responses.
+def prefetch_manifest(player: Player) -> list:
+    """Get list of all images that can appear in a round, to preload them in browser
+    Should correspond to encode_trial
     """
-    if not isinstance(message, dict):
-        raise ValueError("invalid message")
-
-    def validate(*fields):
-        """Checks if the message has all the fields and they're nonempty"""
-        if any([message.get(f) in ("", None) for f in fields]):
-            raise ValueError("invalid message")
-
-    def respond(msgtype, **fields):
-        """Prepare message to send to current player"""
-        msgdata = {'type': msgtype}
-        msgdata.update(fields)
-        print("response:", msgdata)
-        return {player.id_in_group: msgdata}
-
-    current = get_current_trial(player)
-    params = player.session.params
-    now = time.time()
-
-    # time passed (ms) since the last trial retrieved by client
-    # NB: this includes network latency
-    time_passed = (
-        int((now - current.server_loaded_timestamp) * 1000) if current else None
-    )
-
-    print("time:", now, "passed:", time_passed)
-    print("iteration:", player.iteration)
-    print("current trial:", current)
-    print("received:", message)
-
-    validate('type')
-    message_type = message["type"]
-
-    if message_type == "load":  # client loaded page
-        progress = get_progress(player, current)
+    # for plain text or rendered text
+    # return []
 
-        if player.iteration == params["num_iterations"]:
-            return respond("status", progress=progress, game_over=True)
-        elif current:
-            # NB: not accurate because of network delays
-            timedout = (
-                params['auto_response_time']
-                and time_passed > params['auto_response_time']
-            )
-
-            return respond(
-                "status",
-                progress=progress,
-                trial=encode_trial(current),
-                timed_out=timedout,
-            )
-        else:
-            return respond("status", progress=progress)
-
-    if message_type == "new":  # client requests new trial
-        if current:
-            if current.response is None:
-                raise RuntimeError("trying to skip unanswered trial")
-
-        if player.iteration == params["num_iterations"]:
-            return respond("status", game_over=True)
-
-        player.iteration += 1
-
-        # with on-the-go generated trials
-        # t = generate_trial(player)
-
-        # with pre-generated trials
-        t = get_current_trial(player)
-
-        if t is None:
-            raise RuntimeError("failed to pick next trial")
-
-        t.server_loaded_timestamp = now
-
-        return respond("trial", trial=encode_trial(t))
-
-    if message_type == "response":  # client responded current trial
-        max_attempts = params['attempts_per_trial']
-
-        if current is None:
-            raise RuntimeError("response without trial")
-
-        if current.response is not None:  # it's a retry
-            if max_attempts <= 1:
-                raise RuntimeError("retrying not allowed")
-
-            if current.attempts >= max_attempts:
-                raise RuntimeError("max attempts exhausted")
-
-            undo_stats(player, current)
-
-        validate('response', 'reaction_time')
-        if message['response'] not in Constants.choices:
-            raise ValueError("invalid response")
-
-        current.response = message["response"]
-        current.is_correct = check_response(current, current.response)
-        current.attempts += 1
-
-        current.reaction_time = int(message["reaction_time"])
-        current.network_latency = time_passed - int(message.get('total_time', 0))
-        current.server_response_timestamp = now
-
-        update_stats(player, current)
-
-        # if this is a final attempt and user should advance
-        is_final = (
-            max_attempts == 1 or current.is_correct or current.attempts == max_attempts
-        )
-
-        return respond(
-            "feedback",
-            is_correct=current.is_correct,
-            is_final=is_final,
-            response=current.response,
-            progress=get_progress(player, current),
-        )
-
-    if message_type == "timeout":  # client response timeout
-        if current is None:
-            raise RuntimeError("response without trial")
-
-        if current.response is not None:  # weird timeout after retry
-            undo_stats(player, current)
-
-        current.response = Constants.timeout_response
-        current.reaction_time = None
-
-        current.is_correct = check_response(current, current.response)
-        current.server_response_timestamp = now
-        current.is_timeout = True
-
-        update_stats(player, current)
-        if current.attempts == 0:  # no-go trials do count
-            player.num_trials += 1
-
-        return respond(
-            "feedback",
-            is_correct=current.is_correct,
-            is_final=True,
-            response=current.response,
-            progress=get_progress(player, current),
+    # for static images
+    categories = player.session.params['categories']
+    selected = stimuli_utils.filter_by_category(get_pool(), list(categories.values()))
+    paths = sorted(
+        set(
+            row['stimulus']
+            for row in selected
+            if row['stimulus'].lower().endswith(STATIC_IMAGES_SUFFIXES)
         )
-
-    if message_type == "cheat" and settings.DEBUG:  # debugging
-        cheat_round(player, message['rt'])
-        return respond("status", game_over=True)
-
-    raise RuntimeError("unrecognized message from client")
+    )
+    return [static_image_info(path) for path in paths]
 
 
-def cheat_round(player, rt_mean):
-    params = player.session.params
-    now = time.time()
+GAME = live_engine.TrialEngine(
+    C,
+    Trial,
+    generate=generate_all_trials,
+    encode=encode_trial,
+    prefetch=prefetch_manifest,
+    export_fields=['stimulus', 'category', 'solution'],
+)
 
-    rt_mean = float(rt_mean)
-    rt_std = 1.0
 
-    for i in range(max(1, player.iteration), params['num_iterations'] + 1):
-        r = random.choice(Constants.choices)
-        rt = max(0.0, random.gauss(rt_mean, rt_std))
-        t = Trial.filter(player=player, iteration=i)[0]
-        t.server_loaded_timestamp = now + i
-        t.server_response_timestamp = now + i + rt
-        t.response = r
-        t.is_correct = check_response(t, r)
-        t.reaction_time = int(rt * 1000)
-        t.is_timeout = False
+@live_timing.instrument
+def play_game(player: Player, message: dict):
+    """Main task workflow on the live page, see ldt_core/live_engine.py"""
+    return GAME.play(player, message)
 
 
 def generic_page_vars(player):
-    return dict(
-        conf=dict(
-            choices=Constants.choices,
-            keymap=Constants.keymap,
-        ),
-        params=player.session.params,
-        DEBUG=settings.DEBUG,
-    )
+    return GAME.page_vars(player)
 
 
 class Intro(Page):
@@ -437,10 +292,17 @@ class Intro(Page):
 
 
 class Main(Page):
-    js_vars = generic_page_vars
     vars_for_template = generic_page_vars
     live_method = play_game
 
+    @staticmethod
+    def js_vars(player: Player):
+        return GAME.js_vars(player)
+
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        GAME.before_next_page(player, timeout_happened)
+
 
 class Results(Page):
     pass
@@ -450,64 +312,8 @@ page_sequence = [Intro, Main, Results]
 
 
 def custom_export(players):
-    yield [
-        "participant_code",
-        "is_dropout",
-        "session",
-        "round",
-        "is_practice",
-        "player",
-        "iteration",
-        "server_loaded_timestamp",
-        "server_response_timestamp",
-        "server_response_time",
-        "network_latency",
-        "stimulus",
-        "category",
-        "solution",
-        "response",
-        "response_correct",
-        "reaction_time",
-        "response_timeout",
-        "attempts",
-    ]
-    for player in players:
-        participant = player.participant
-        session = player.session
-        subsession = player.subsession
-
-        player_fields = [
-            participant.code,
-            participant.is_dropout if 'is_dropout' in participant.vars else None,
-            session.code,
-            subsession.round_number,
-            subsession.is_practice,
-            player.id,
-        ]
-
-        # yield a line for players even without trials
-        yield player_fields
-
-        for trial in Trial.filter(player=player):
-            if trial.server_loaded_timestamp is None:  # buffer trials
-                continue
-            if trial.server_response_timestamp is None:  # unanswered trials
-                continue
-            server_response_time = (
-                trial.server_response_timestamp - trial.server_loaded_timestamp
-            )
-            yield player_fields + [
-                trial.iteration,
-                round(trial.server_loaded_timestamp, 3),
-                round(trial.server_response_timestamp, 3),
-                int(server_response_time * 1000),
-                trial.network_latency,
-                trial.stimulus,
-                trial.category,
-                trial.solution,
-                trial.response,
-                trial.is_correct,
-                trial.reaction_time,
-                trial.is_timeout,
-                trial.attempts,
-            ]
+    return GAME.export(players)
+
+
+def vars_for_admin_report(subsession: Subsession):
+    return GAME.admin_report(subsession)
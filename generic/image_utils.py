@@ -1,9 +1,15 @@
 """
 Utilities to generate and manipulate images
+
+Pillow is imported by the functions on first use, not to slow down importing of the apps.
 """
 from io import BytesIO
 from base64 import b64encode
+from functools import lru_cache
 from pathlib import Path
+import importlib.util
+
+from ldt_core import lazy
 
 MSG_NEED_PIL = """
 FAILURE: Before using these real-effort tasks,
@@ -12,17 +18,13 @@ You need to:
 (2) add Pillow to your requirements.txt
 """
 
-try:
-    # PIL is not actually used here; this is just to generate the warning to install Pillow.
-    import PIL  # noqa
-except ImportError:
+# checking that Pillow is installed, without importing it
+if importlib.util.find_spec("PIL") is None:
     import sys
 
     sys.tracebacklimit = 0
     raise SystemExit(MSG_NEED_PIL)
 
-from PIL import Image, ImageDraw, ImageFont, ImageMorph
-
 
 TEXT_FONT = Path(__file__).parent / "assets" / "FreeSansBold.otf"
 TEXT_SIZE = 32
@@ -32,6 +34,8 @@ TEXT_BACKGROND = "#FFFFFF"
 
 
 def render_text(text):
+    from PIL import Image, ImageDraw, ImageFont
+
     dumb = Image.new("RGB", (0, 0))
     font = ImageFont.truetype(str(TEXT_FONT), TEXT_SIZE)
     w, h = ImageDraw.ImageDraw(dumb).textsize(text, font)
@@ -45,13 +49,23 @@ def render_text(text):
     return image
 
 
-def distort_image(img):
-    img = img.convert("L")
-    distortions = [
+@lru_cache(maxsize=None)
+def get_distortions():
+    """Morphing operations, with lookup tables built once"""
+    from PIL import ImageMorph
+
+    return [
         ImageMorph.MorphOp(op_name="erosion4"),
         ImageMorph.MorphOp(op_name="dilation4"),
     ]
-    for op in distortions:
+
+
+__getattr__ = lazy.attributes(__name__, DISTORTIONS=get_distortions)
+
+
+def distort_image(img):
+    img = img.convert("L")
+    for op in get_distortions():
         _, img = op.apply(img)
 
     # the distorsion leaves black border
@@ -67,3 +81,10 @@ def encode_image(image):
     buf64 = b64encode(buf.getvalue())
     datauri = b"data:image/png;base64," + buf64
     return datauri.decode("ascii")
+
+
+def image_size(filepath):
+    from PIL import Image
+
+    with Image.open(filepath) as img:
+        return img.size
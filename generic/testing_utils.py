@@ -1,12 +1,19 @@
 from contextlib import contextmanager
-import time
+from pathlib import Path
+from urllib.parse import unquote
+import asyncio
+import os
 import random
+import shutil
+import tempfile
 
 from otree.api import expect
 
+from ldt_core import clock, asset_bundle
+
 
 def sleep(time_ms):
-    time.sleep(time_ms / 1000)
+    clock.sleep(time_ms / 1000)
 
 
 def get_trial(Trial, p):  # noqa
@@ -30,10 +37,47 @@ def send(m, p, tp, **values):
 
 
 def send_slow(m, p, tp, slowdown=0.5, **values):
-    time.sleep(slowdown)
+    clock.sleep(slowdown)
     return send(m, p, tp, **values)
 
 
+@contextmanager
+def serving_bundle(files):
+    """Build a temporary asset bundle and serve it, as under prodserver"""
+    directory = tempfile.mkdtemp()
+    previous = os.environ.get(asset_bundle.BUNDLE_ENV)
+    bundlepath = Path(directory) / "assets.bundle"
+    bundle = asset_bundle.open_bundle(bundlepath, files)
+    os.environ[asset_bundle.BUNDLE_ENV] = str(bundlepath)
+    asset_bundle.current.cache_clear()
+    try:
+        yield bundle
+    finally:
+        if previous is None:
+            del os.environ[asset_bundle.BUNDLE_ENV]
+        else:
+            os.environ[asset_bundle.BUNDLE_ENV] = previous
+        asset_bundle.current.cache_clear()
+        shutil.rmtree(directory)
+
+
+def get_bundled(bundle, url, etag=None):
+    """Request a url from bundle server, return status, headers and body"""
+    messages = []
+
+    async def passed(scope, receive, send):
+        raise AssertionError(f"{scope['path']} is not served by bundle")
+
+    async def send(message):
+        messages.append(message)
+
+    headers = [(b'if-none-match', etag)] if etag else []
+    scope = dict(type='http', method='GET', path=unquote(url), headers=headers)
+    asyncio.run(asset_bundle.BundleFiles(passed, bundle)(scope, None, send))
+    start, *chunks = messages
+    return start['status'], dict(start['headers']), b''.join(bytes(c['body']) for c in chunks)
+
+
 @contextmanager
 def expect_failure(*exceptions):
     try:
@@ -69,6 +113,7 @@ def expect_new(trial, last):
     expect(trial.id, '!=', last.id)
     expect(trial.iteration, last.iteration + 1)
     expect(trial.server_loaded_timestamp, '>', last.server_loaded_timestamp)
+    expect(trial.server_loaded_mono, '>', last.server_loaded_mono)
 
 
 def expect_answered(z, response):
@@ -1,7 +1,14 @@
+import json
+import time
+
 from otree.api import *
 
 from .testing_utils import *
 from . import Constants, Trial, Intro, Main, Results
+from . import encode_trial, prefetch_manifest, STATIC_IMAGES_SUFFIXES, GAME
+from . import bundled_images, static_image_url
+from ldt_core import live_timing, clock, wire, asset_bundle
+from ldt_core.fuzzing import fuzz, EngineProtocol
 
 
 class PlayerBot(Bot):
@@ -10,12 +17,24 @@ class PlayerBot(Bot):
         "normal_slow",
         "messaging_bogus",
         "reloading",
+        "reloading_drift",
         "responding_bogus",
         "responding_notrial",
         "responding_timeout",
         "retrying_exhaust",
+        "retrying_timeout",
         "advancing_noanswer",
         "advancing_exhaust",
+        "prefetching",
+        "prefetching_bundle",
+        "timing",
+        "clock_stepping",
+        "clock_virtual",
+        "calibrating",
+        "batched",
+        "batched_outoforder",
+        "compact_schema",
+        "fuzzing",
     ]
 
     def play_round(self):
@@ -25,7 +44,11 @@ class PlayerBot(Bot):
             print(f"Skipping test case: {self.case}")
             return
 
-        if 'responding_timeout' in self.case and params['auto_response_time'] is None:
+        if 'timeout' in self.case and params['auto_response_time'] is None:
+            print(f"Skipping test case: {self.case}")
+            return
+
+        if self.case != 'fuzzing' and ('batched' in self.case) != (params['batch_size'] > 1):
             print(f"Skipping test case: {self.case}")
             return
 
@@ -202,6 +225,59 @@ def live_test_messaging_bogus(m, p, conf):  # noqa
         m(p.id_in_group, {'type': 'BOGUS'})
 
 
+def live_test_prefetching(m, p, conf):  # noqa
+    manifest = prefetch_manifest(p)
+    urls = [item['url'] for item in manifest]
+
+    for z in Trial.filter(player=p):
+        stimulus = encode_trial(z)['stimulus']
+        if stimulus['type'] == 'image-url' and z.stimulus.endswith(STATIC_IMAGES_SUFFIXES):
+            expect(stimulus['url'], 'in', urls)
+
+    send(m, p, 'load')
+    r = m(p.id_in_group, {'type': 'prefetched', 'time': 100.5, 'failed': 0})
+    expect(r, None)
+    expect_attrs(p, prefetch_time=100, prefetch_failed=0)
+
+    with expect_failure(ValueError):
+        send(m, p, 'prefetched')
+
+
+def live_test_prefetching_bundle(m, p, conf):  # noqa
+    files = bundled_images()
+    with serving_bundle(files) as bundle:
+        for key, filepath in files.items():
+            expect(bytes(bundle.content(key)), filepath.read_bytes())
+            path = key.removeprefix("images/")
+            expect(static_image_url(path), bundle.url(key))
+
+        # trials refer to the cached urls, prefetched before the first one
+        urls = [item['url'] for item in prefetch_manifest(p)]
+        for z in Trial.filter(player=p):
+            stimulus = encode_trial(z)['stimulus']
+            if z.stimulus.endswith(STATIC_IMAGES_SUFFIXES):
+                expect(stimulus, dict(type='image-url', url=static_image_url(z.stimulus)))
+                expect(stimulus['url'], 'in', urls)
+
+        key = sorted(files)[0]
+        status, headers, body = get_bundled(bundle, bundle.url(key))
+        expect(status, 200)
+        expect(body, files[key].read_bytes())
+        expect(headers[b'cache-control'], asset_bundle.CACHE_CONTROL)
+
+        status, _, body = get_bundled(bundle, bundle.url(key), etag=headers[b'etag'])
+        expect(status, 304)
+        expect(body, b'')
+
+        status, _, _ = get_bundled(bundle, f"{asset_bundle.BUNDLE_URL}00000000/{key}")
+        expect(status, 404)
+
+    # plain static files when not served
+    for z in Trial.filter(player=p):
+        if z.stimulus.endswith(STATIC_IMAGES_SUFFIXES):
+            expect(encode_trial(z)['stimulus']['type'], 'image-url')
+
+
 def live_test_reloading(m, p, conf):  # noqa
     # start of game
     r = send(m, p, 'load')
@@ -222,6 +298,19 @@ def live_test_reloading(m, p, conf):  # noqa
     expect(z, '!=', None)
 
 
+def live_test_reloading_drift(m, p, conf):  # noqa
+    send(m, p, 'load')
+    send(m, p, 'new')
+    z = get_trial(Trial, p)
+    send(m, p, 'response', response=get_correct_response(z), reaction_time=1.0)
+
+    # counters gone out of sync
+    p.num_trials, p.num_solved, p.num_failed = 5, 0, 5
+
+    send(m, p, 'load')
+    expect_attrs(p, num_trials=1, num_solved=1, num_failed=0)
+
+
 def live_test_responding_bogus(m, p, conf):  # noqa
     send(m, p, 'load')
     send(m, p, 'new')
@@ -293,6 +382,23 @@ def live_test_retrying_exhaust(m, p, conf):  # noqa
     expect_attrs(z, response=response1, is_correct=False)
 
 
+def live_test_retrying_timeout(m, p, conf):  # noqa
+    send(m, p, 'load')
+    send(m, p, 'new')
+    z = get_trial(Trial, p)
+
+    send(m, p, 'response', response=get_incorrect_response(z, Constants.choices), reaction_time=1.0)
+    expect_attrs(p, num_trials=1, num_solved=0, num_failed=1)
+
+    sleep(conf['auto_response_time'])
+
+    # timeout after retry replaces the response, but the trial is counted once
+    send(m, p, 'timeout')
+    expect_attrs(z, is_timeout=True)
+    expect_attrs(p, num_trials=1)
+    expect(p.num_solved + p.num_failed, 1)
+
+
 def live_test_advancing_noanswer(m, p, conf):  # noqa
     send(m, p, 'load')
     send(m, p, 'new')
@@ -330,3 +436,191 @@ def live_test_advancing_exhaust(m, p, conf):  # noqa
     expect_attrs(p, iteration=num_iterations)
     z = get_trial(Trial, p)
     expect_attrs(z, iteration=num_iterations)
+
+
+def live_test_batched(m, p, conf):  # noqa
+    """normal flow in batch mode
+    the client advances to next trial by responding it
+    """
+    num_iterations = conf['num_iterations']
+    batch_size = conf['batch_size']
+
+    send(m, p, 'load')
+
+    r = send(m, p, 'new')
+    expect_fields(r, type='trials')
+    expect([t['iteration'] for t in r['trials']], list(range(1, batch_size + 1)))
+    expect_attrs(p, iteration=1, delivered=batch_size)
+
+    for i in range(num_iterations):
+        z = Trial.filter(player=p, iteration=i + 1)[0]
+        response = get_correct_response(z)
+        r = send(m, p, 'response', iteration=i + 1, response=response, reaction_time=1.0)
+        expect_fields(r, type='feedback', is_correct=True, is_final=True)
+        expect_answered(z, response)
+        expect_attrs(p, iteration=i + 1, delivered=min(i + 1 + batch_size, num_iterations))
+
+        # trials to keep the batch full
+        refilled = [t['iteration'] for t in r['trials']]
+        expect(refilled, [i + 1 + batch_size] if i + 1 + batch_size <= num_iterations else [])
+
+    expect_attrs(p, num_trials=num_iterations, num_solved=num_iterations)
+
+    r = send(m, p, 'new')
+    expect_fields(r, type='status', game_over=True)
+
+
+def live_test_batched_outoforder(m, p, conf):  # noqa
+    batch_size = conf['batch_size']
+
+    send(m, p, 'load')
+    send(m, p, 'new')
+
+    # skipping unanswered
+    with expect_failure(RuntimeError):
+        send(m, p, 'response', iteration=2, response=Constants.choices[0], reaction_time=1.0)
+
+    # skipping ahead
+    with expect_failure(RuntimeError):
+        send(m, p, 'response', iteration=3, response=Constants.choices[0], reaction_time=1.0)
+
+    send(m, p, 'response', iteration=1, response=Constants.choices[0], reaction_time=1.0)
+
+    # responding to undelivered
+    for i in range(2, batch_size + 1):
+        send(m, p, 'response', iteration=i, response=Constants.choices[0], reaction_time=1.0)
+
+    with expect_failure(RuntimeError):
+        send(m, p, 'response', iteration=batch_size + 2, response=Constants.choices[0], reaction_time=1.0)
+
+    # responding to past
+    with expect_failure(RuntimeError):
+        send(m, p, 'response', iteration=1, response=Constants.choices[0], reaction_time=1.0)
+
+    expect_attrs(p, iteration=batch_size, num_trials=batch_size)
+
+
+def live_test_timing(m, p, conf):  # noqa
+    """processing time of messages is recorded on the trial"""
+    send(m, p, 'load')
+    send(m, p, 'new')
+    z = get_trial(Trial, p)
+    send(m, p, 'response', response=get_correct_response(z), reaction_time=1.0)
+    send(m, p, 'load')
+
+    # kept in memory till leaving the page
+    expect(z.server_timing, None)
+    live_timing.store(Trial, p)
+    timing = json.loads(z.server_timing)
+    expect(sorted(timing), ['load', 'new', 'response'])
+    for samples in timing.values():
+        expect(len(samples), 1)
+        total, *phases = samples[0]
+        expect(len(phases), len(live_timing.PHASES))
+        for value in phases:
+            expect(value, '<=', total)
+
+    db_time = timing['new'][0][1 + live_timing.PHASES.index('db')]
+    expect(db_time, '>', 0)
+
+
+def live_test_clock_stepping(m, p, conf):  # noqa
+    """wall clock stepped forward by an hour while a trial is shown"""
+    send(m, p, 'load')
+    send(m, p, 'new')
+    z = get_trial(Trial, p)
+    z.server_loaded_timestamp -= 3600
+
+    send(m, p, 'response', response=get_correct_response(z), reaction_time=1.0, total_time=1)
+    expect(z.network_latency, '<', 1000)
+
+
+def live_test_clock_virtual(m, p, conf):  # noqa
+    """sleeping in tests advances server clock without waiting"""
+    send(m, p, 'load')
+    send(m, p, 'new')
+    z = get_trial(Trial, p)
+    started = time.perf_counter()
+    sleep(60000)
+    expect(time.perf_counter() - started, '<', 1)
+
+    send(m, p, 'response', response=get_correct_response(z), reaction_time=1.0, total_time=1)
+    expect(z.network_latency, '>=', 59999)
+
+
+def live_test_calibrating(m, p, conf):  # noqa
+    """a burst of pings estimates roundtrip time and clock offset, slow trials are flagged"""
+    send(m, p, 'load')
+
+    r = send(m, p, 'ping', time=clock.now().wall * 1000, first=True)
+    expect_fields(r, type='pong')
+    for i in range(conf['calibration_pings'] - 1):
+        r = send(m, p, 'ping', time=clock.now().wall * 1000)
+        expect_fields(r, type='pong')
+    r = send(m, p, 'ping', time=clock.now().wall * 1000)
+    expect_fields(r, type='calibrated', rtt=p.rtt, offset=p.clock_offset)
+    expect(p.rtt, '>=', 0)
+    expect(abs(p.clock_offset), '<', 100)
+
+    send(m, p, 'new')
+    z = get_trial(Trial, p)
+    send(m, p, 'response', response=get_correct_response(z), reaction_time=1.0, total_time=0)
+    expect(z.latency_spike, False)
+
+    send(m, p, 'new')
+    z = get_trial(Trial, p)
+    sleep(300)
+    send(m, p, 'response', response=get_correct_response(z), reaction_time=1.0, total_time=0)
+    expect(z.latency_spike, True)
+
+
+def live_test_compact_schema(m, p, conf):  # noqa
+    """messages in compact wire schema, requested on page load
+    progress is sent only when changed
+    """
+
+    def send_compact(tp, **values):
+        return m(p.id_in_group, wire.compact(dict(type=tp, **values)))[p.id_in_group]
+
+    r = send(m, p, 'load', schema=wire.SCHEMA)
+    expect(r, {'t': wire.TYPE_CODES['status'], 'p': {'N': conf['num_iterations'], 'n': 0}})
+
+    r = send_compact('new')
+    expect(r['t'], wire.TYPE_CODES['trial'])
+    expect(wire.expand(r)['trial'], encode_trial(get_trial(Trial, p)))
+
+    z = get_trial(Trial, p)
+    response = get_correct_response(z)
+    r = send_compact('response', response=response, reaction_time=1.0)
+    expect(
+        wire.expand(r),
+        dict(type='feedback', is_correct=True, is_final=True, response=response, progress={'completed': 1}),
+    )
+    expect_answered(z, response)
+
+    if conf['attempts_per_trial'] > 1:  # retrying doesn't change progress
+        r = send_compact('response', response=response, reaction_time=1.0)
+        expect(r['t'], wire.TYPE_CODES['feedback'])
+        expect('p', 'not in', r)
+
+    # a page not requesting it gets full schema
+    r = send(m, p, 'load')
+    expect_fields(r, type='status', progress=dict(total=conf['num_iterations'], completed=1))
+
+    with expect_failure(ValueError):
+        m(p.id_in_group, {'t': len(wire.TYPES)})
+
+    # payload maps are passed as is, even with keys matching the schema
+    message = dict(
+        type='trial',
+        trial={'stimulus': {'type': 'text', 'text': 'x'}, 'stimuli': {'text': 'x', 'url': 'y'}},
+        progress={'completed': 1},
+    )
+    compacted = wire.compact(message)
+    expect(compacted['tr'], {'s': {'t': 'text', 'x': 'x'}, 'stimuli': {'text': 'x', 'url': 'y'}})
+    expect(wire.expand(compacted), message)
+
+
+def live_test_fuzzing(m, p, conf):  # noqa
+    """random sequence of valid and malformed messages, checked against model of the engine"""
+    fuzz(m, p, EngineProtocol(GAME, conf))
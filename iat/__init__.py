@@ -1,10 +1,11 @@
-import time
 import random
 from otree.api import *
 from otree import settings
 from . import stimuli
 from . import blocks
 from . import stats
+from . import sequences
+from ldt_core import live_timing, clock, shared_cache, counters
 
 doc = """
 Implicit Association Test, draft
@@ -20,10 +21,6 @@ class Constants(BaseConstants):
     trial_delay = 0.250
 
 
-def url_for_image(filename):
-    return f"/static/images/{filename}"
-
-
 class Subsession(BaseSubsession):
     practice = models.BooleanField()
 
@@ -35,7 +32,7 @@ class Subsession(BaseSubsession):
 
 def get_block_for_round(rnd, params):
     """Get a round setup from BLOCKS with actual categories' names substituted from session config
-    The `rnd`: Player or Subsession
+    The `rnd`: round number
     """
     block = blocks.BLOCKS[rnd]
     result = blocks.configure(block, params)
@@ -51,8 +48,8 @@ def thumbnails_for_block(block, params):
         for cls in ['primary', 'secondary']:
             if cls in block[side] and params[f"{cls}_images"]:
                 # use first image in categopry as a corner thumbnail
-                images = stimuli.DICT[block[side][cls]]
-                thumbnails[side][cls] = url_for_image(images[0])
+                images = stimuli.CATALOGUE[block[side][cls]]
+                thumbnails[side][cls] = images[0].data
     return thumbnails
 
 
@@ -72,6 +69,77 @@ def labels_for_block(block):
     return labels
 
 
+def choices_for_block(block):
+    """Return table of stimuli to choose from for each side of block
+    {'left': [(cls, cat, stimuli), ...], 'right': [...]}
+    """
+    choices = {'left': [], 'right': []}
+    for side in ['left', 'right']:
+        for cls, cat in block[side].items():
+            values = tuple(s.value for s in stimuli.CATALOGUE[cat])
+            choices[side].append((cls, cat, values))
+    return choices
+
+
+def prefetch_for_block(block):
+    """Return list of all images that can appear in block, to preload them in browser"""
+    manifest = []
+    for side in ['left', 'right']:
+        for cat in block[side].values():
+            for stimulus in stimuli.CATALOGUE[cat]:
+                if stimulus.is_image:
+                    manifest.append(
+                        dict(
+                            url=stimulus.data,
+                            width=stimulus.width,
+                            height=stimulus.height,
+                            hash=stimulus.hash,
+                        )
+                    )
+    return manifest
+
+
+def bundled_images():
+    """Return all images of stimuli, to pack into asset bundle, see ldt_core/asset_bundle.py"""
+    values = sorted(set(v for values in stimuli.get_dict().values() for v in values if stimuli.is_image(v)))
+    return {f"images/{value}": stimuli.IMAGES_DIR / value for value in values}
+
+
+def setup_block(block, params):
+    """Precompute everything derived from a configured block"""
+    for side in ['left', 'right']:
+        for cat in block[side].values():
+            if cat not in stimuli.CATALOGUE:
+                raise RuntimeError(f"unknown stimuli category '{cat}'")
+    return dict(
+        block=block,
+        labels=labels_for_block(block),
+        thumbnails=thumbnails_for_block(block, params),
+        categories={side: list(block[side].values()) for side in ['left', 'right']},
+        choices=choices_for_block(block),
+        prefetch=prefetch_for_block(block),
+    )
+
+
+def setup_all_blocks(session):
+    """Configure blocks of all rounds for a session"""
+    params = session.params
+    return {
+        rnd: setup_block(get_block_for_round(rnd, params), params)
+        for rnd in blocks.BLOCKS
+    }
+
+
+def get_setup_for_round(session, rnd):
+    """Get precomputed setup of a round
+    Returns dict with fields: block, labels, thumbnails, categories, choices, prefetch
+    The setups of all rounds are computed once per session, and shared by server processes,
+    see ldt_core/shared_cache.py
+    """
+    setups = shared_cache.get('iat-setups', session.code, lambda: setup_all_blocks(session))
+    return setups[rnd]
+
+
 def get_num_iterations_for_round(rnd):
     """Get configured number of iterations
     The `rnd`: Player or Subsession
@@ -96,7 +164,7 @@ def creating_session(subsession: Subsession):
     for param in defaults:
         session.params[param] = session.config.get(param, defaults[param])
 
-    block = get_block_for_round(subsession.round_number, session.params)
+    block = get_setup_for_round(session, subsession.round_number)['block']
 
     subsession.practice = block['practice']
     subsession.primary_left = block['left'].get('primary', "")
@@ -104,6 +172,9 @@ def creating_session(subsession: Subsession):
     subsession.secondary_left = block['left'].get('secondary', "")
     subsession.secondary_right = block['right'].get('secondary', "")
 
+    for player in subsession.get_players():
+        generate_trials(player)
+
 
 class Group(BaseGroup):
     pass
@@ -115,6 +186,10 @@ class Player(BasePlayer):
     num_correct = models.IntegerField(initial=0)
     num_failed = models.IntegerField(initial=0)
 
+    # preloading of images, reported by client
+    prefetch_time = models.IntegerField()
+    prefetch_failed = models.IntegerField()
+
 
 class Trial(ExtraModel):
     """A record of single iteration
@@ -126,6 +201,8 @@ class Trial(ExtraModel):
     round = models.IntegerField(initial=0)
     iteration = models.IntegerField(initial=0)
     timestamp = models.FloatField(initial=0)
+    # monotonic clock readings paired with the timestamps, see ldt_core/clock.py
+    timestamp_mono = models.FloatField()
 
     stimulus_cls = models.StringField(choices=('primary', 'secondary'))
     stimulus_cat = models.StringField()
@@ -134,30 +211,32 @@ class Trial(ExtraModel):
 
     response = models.StringField(choices=('left', 'right'))
     response_timestamp = models.FloatField()
+    response_timestamp_mono = models.FloatField()
     reaction_time = models.FloatField()
     is_correct = models.BooleanField()
     retries = models.IntegerField(initial=0)
-
-
-def generate_trial(player: Player) -> Trial:
-    """Create new question for a player"""
-    block = get_block_for_round(player.round_number, player.session.params)
-    chosen_side = random.choice(['left', 'right'])
-    chosen_cls = random.choice(list(block[chosen_side].keys()))
-    chosen_cat = block[chosen_side][chosen_cls]
-    stimulus = random.choice(stimuli.DICT[chosen_cat])
-
-    player.iteration += 1
-    return Trial.create(
-        player=player,
-        iteration=player.iteration,
-        timestamp=time.time(),
-        #
-        stimulus_cls=chosen_cls,
-        stimulus_cat=chosen_cat,
-        stimulus=stimulus,
-        correct=chosen_side,
-    )
+    # server processing time of messages, see ldt_core/live_timing.py
+    server_timing = models.LongStringField()
+
+
+def generate_trials(player: Player):
+    """Create balanced sequence of trials for a player's round"""
+    setup = get_setup_for_round(player.session, player.round_number)
+    count = get_num_iterations_for_round(player)
+
+    sequence = sequences.generate_sequence(setup['choices'], count)
+
+    for i, (side, cls, cat, stimulus) in enumerate(sequence):
+        Trial.create(
+            player=player,
+            round=player.round_number,
+            iteration=1 + i,
+            #
+            stimulus_cls=cls,
+            stimulus_cat=cat,
+            stimulus=stimulus,
+            correct=side,
+        )
 
 
 def get_current_trial(player: Player):
@@ -172,10 +251,15 @@ def encode_trial(trial: Trial):
     return dict(
         cls=trial.stimulus_cls,
         cat=trial.stimulus_cat,
-        stimulus=url_for_image(trial.stimulus) if trial.stimulus.endswith((".png", ".jpg")) else str(trial.stimulus),
+        stimulus=stimuli.CATALOGUE.get(trial.stimulus_cat, trial.stimulus).data,
     )
 
 
+def recompute_progress(player: Player):
+    """Recount progress from all answered trials, repairing any drift of counters"""
+    counters.recount(player, [z for z in Trial.filter(player=player) if z.response is not None])
+
+
 def get_progress(player: Player):
     """Return current player progress"""
     return dict(
@@ -199,6 +283,9 @@ def custom_export(players):
         "secondary_right",
         "iteration",
         "timestamp",
+        "timestamp_mono",
+        "response_timestamp",
+        "response_timestamp_mono",
         "stimulus_class",
         "stimulus_category",
         "stimulus",
@@ -206,6 +293,7 @@ def custom_export(players):
         "response",
         "is_correct",
         "reaction_time",
+        "server_timing",
     ]
     for p in players:
         if p.round_number not in (3, 4, 6, 7):
@@ -214,6 +302,8 @@ def custom_export(players):
         session = p.session
         subsession = p.subsession
         for z in Trial.filter(player=p):
+            if not z.timestamp:  # not yet shown
+                continue
             yield [
                 session.code,
                 participant.code,
@@ -224,6 +314,9 @@ def custom_export(players):
                 subsession.secondary_right,
                 z.iteration,
                 z.timestamp,
+                z.timestamp_mono,
+                z.response_timestamp,
+                z.response_timestamp_mono,
                 z.stimulus_cls,
                 z.stimulus_cat,
                 z.stimulus,
@@ -231,9 +324,11 @@ def custom_export(players):
                 z.response,
                 z.is_correct,
                 z.reaction_time,
+                z.server_timing,
             ]
 
 
+@live_timing.instrument
 def play_game(player: Player, message: dict):
     """Main game workflow
     Implemented as reactive scheme: receive message from vrowser, react, respond.
@@ -244,8 +339,11 @@ def play_game(player: Player, message: dict):
     - respond: {'type': 'status', 'progress': ...}
     - respond: {'type': 'status', 'progress': ..., 'trial': data} -- in case of midgame page reload
 
+    - receive: {'type': 'prefetched', 'time': ..., 'failed': ...} -- images from manifest are preloaded
+    - record prefetch time, no response
+
     - receive: {'type': 'next'} -- request for a next/first trial
-    - generate new trial
+    - pick next pre-generated trial
     - respond: {'type': 'trial', 'trial': data}
 
     - receive: {'type': 'answer', 'answer': ...} -- user answered the trial
@@ -263,9 +361,10 @@ def play_game(player: Player, message: dict):
     ret_params = session.params
     max_iters = get_num_iterations_for_round(player)
 
-    now = time.time()
+    now = clock.now()
     # the current trial or none
     current = get_current_trial(player)
+    live_timing.track(current)
 
     message_type = message['type']
 
@@ -275,18 +374,28 @@ def play_game(player: Player, message: dict):
 
     # page loaded
     if message_type == 'load':
+        recompute_progress(player)
         p = get_progress(player)
         if current:
-            return {my_id: dict(type='status', progress=p, trial=encode_trial(current))}
+            with live_timing.phase('encode'):
+                data = encode_trial(current)
+            return {my_id: dict(type='status', progress=p, trial=data)}
         else:
             return {my_id: dict(type='status', progress=p)}
 
+    # client preloaded images
+    if message_type == "prefetched":
+        player.prefetch_time = int(message["time"])
+        player.prefetch_failed = int(message.get("failed", 0))
+        return
+
     # client requested new trial
     if message_type == "next":
         if current is not None:
             if current.response is None:
                 raise RuntimeError("trying to skip over unsolved trial")
-            if now < current.timestamp + ret_params["trial_delay"]:
+            passed = clock.elapsed(current.timestamp, current.timestamp_mono, now)
+            if passed < ret_params["trial_delay"]:
                 raise RuntimeError("retrying too fast")
             if current.iteration == max_iters:
                 return {
@@ -294,10 +403,19 @@ def play_game(player: Player, message: dict):
                         type='status', progress=get_progress(player), iterations_left=0
                     )
                 }
-        # generate new trial
-        z = generate_trial(player)
+        # pick next pre-generated trial
+        player.iteration += 1
+        z = get_current_trial(player)
+
+        if z is None:
+            raise RuntimeError("failed to pick next trial")
+
+        live_timing.track(z)
+        z.timestamp, z.timestamp_mono = now
         p = get_progress(player)
-        return {my_id: dict(type='trial', trial=encode_trial(z), progress=p)}
+        with live_timing.phase('encode'):
+            data = encode_trial(z)
+        return {my_id: dict(type='trial', trial=data, progress=p)}
 
     # client gives an answer to current trial
     if message_type == "answer":
@@ -305,33 +423,26 @@ def play_game(player: Player, message: dict):
             raise RuntimeError("trying to answer no trial")
 
         if current.response is not None:  # it's a retry
-            if now < current.response_timestamp + ret_params["retry_delay"]:
+            passed = clock.elapsed(current.response_timestamp, current.response_timestamp_mono, now)
+            if passed < ret_params["retry_delay"]:
                 raise RuntimeError("retrying too fast")
 
-            # undo last updation of player progress
-            player.num_trials -= 1
-            if current.is_correct:
-                player.num_correct -= 1
-            else:
-                player.num_failed -= 1
+            was_correct = current.is_correct
+        else:
+            was_correct = None
 
         # check answer
         answer = message["answer"]
 
-        if answer == "" or answer is None:
+        if not isinstance(answer, str) or answer == "":
             raise ValueError("bogus answer")
 
         current.response = answer
-        current.reaction_time = message["reaction_time"]
+        current.reaction_time = float(message["reaction_time"])
         current.is_correct = current.correct == answer
-        current.response_timestamp = now
+        current.response_timestamp, current.response_timestamp_mono = now
 
-        # update player progress
-        if current.is_correct:
-            player.num_correct += 1
-        else:
-            player.num_failed += 1
-        player.num_trials += 1
+        counters.count_response(player, was_correct, current.is_correct)
 
         p = get_progress(player)
         return {
@@ -345,16 +456,17 @@ def play_game(player: Player, message: dict):
     if message_type == "cheat" and settings.DEBUG:
         # generate remaining data for the round
         m = float(message['reaction'])
-        if current:
-            current.delete()
-        for i in range(player.iteration, max_iters):
-            t = generate_trial(player)
-            t.iteration = i
-            t.timestamp = now + i
+        for i in range(max(1, player.iteration), max_iters + 1):
+            t = Trial.filter(player=player, iteration=i)[0]
+            t.timestamp = now.wall + i
+            t.timestamp_mono = now.mono + i
             t.response = t.correct
             t.is_correct = True
-            t.response_timestamp = now + i
+            t.response_timestamp = now.wall + i
+            t.response_timestamp_mono = now.mono + i
             t.reaction_time = random.gauss(m, 0.3)
+        player.iteration = max_iters
+        recompute_progress(player)
         return {
             my_id: dict(type='status', progress=get_progress(player), iterations_left=0)
         }
@@ -362,6 +474,10 @@ def play_game(player: Player, message: dict):
     raise RuntimeError("unrecognized message from client")
 
 
+def vars_for_admin_report(subsession: Subsession):
+    return live_timing.admin_report(Trial, subsession)
+
+
 # PAGES
 
 
@@ -374,10 +490,10 @@ class Intro(Page):
     def vars_for_template(player: Player):
         # using 3rd block to take categories labels in instructions
         params = player.session.params
-        block = get_block_for_round(3, params)
+        setup = get_setup_for_round(player.session, 3)
         return dict(
             params=params,
-            labels=labels_for_block(block),
+            labels=setup['labels'],
         )
 
 
@@ -386,17 +502,22 @@ class RoundN(Page):
 
     @staticmethod
     def js_vars(player: Player):
-        return dict(params=player.session.params, keys=Constants.keys)
+        setup = get_setup_for_round(player.session, player.round_number)
+        return dict(
+            params=player.session.params,
+            keys=Constants.keys,
+            prefetch=setup['prefetch'],
+        )
 
     @staticmethod
     def vars_for_template(player: Player):
         params = player.session.params
-        block = get_block_for_round(player.round_number, params)
+        setup = get_setup_for_round(player.session, player.round_number)
         return dict(
             params=params,
-            block=block,
-            thumbnails=thumbnails_for_block(block, params),
-            labels=labels_for_block(block),
+            block=setup['block'],
+            thumbnails=setup['thumbnails'],
+            labels=setup['labels'],
             num_iterations=get_num_iterations_for_round(player),
             DEBUG=settings.DEBUG,
             keys=Constants.keys,
@@ -410,6 +531,10 @@ class RoundN(Page):
 
     live_method = play_game
 
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        live_timing.store(Trial, player)
+
 
 class Results(Page):
     @staticmethod
@@ -435,9 +560,9 @@ class Results(Page):
         dscore = stats.dscore(data3, data4, data6, data7)
 
         # combinations for positive score
-        labels3 = labels_for_block(get_block_for_round(3, player.session.params))
+        labels3 = get_setup_for_round(player.session, 3)['labels']
         # combinations for negative score
-        labels6 = labels_for_block(get_block_for_round(6, player.session.params))
+        labels6 = get_setup_for_round(player.session, 6)['labels']
 
         return dict(dscore=dscore, pos_pairs=labels3, neg_pairs=labels6)
 
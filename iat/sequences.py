@@ -0,0 +1,97 @@
+"""Generating balanced sequences of trials for a block
+
+A sequence is a list of tuples `(side, cls, cat, stimulus)`,
+generated from a block's choices table: `{'left': [(cls, cat, stimuli), ...], 'right': [...]}`
+
+Constraints:
+- equal number of left and right trials (differ by 1 for odd counts)
+- no more than MAX_SIDE_RUN trials in a row on the same side
+- alternating primary/secondary classes in combined blocks
+- no immediate repeats of a stimulus
+- stimuli of a category are used evenly
+"""
+
+import random
+
+# max number of consequent trials with the same correct side
+MAX_SIDE_RUN = 3
+# attempts to shuffle sides satisfying MAX_SIDE_RUN before giving up
+MAX_SHUFFLES = 100
+
+
+def max_run(values):
+    """Return length of longest run of equal values"""
+    longest, run = 0, 0
+    for i, v in enumerate(values):
+        run = run + 1 if i > 0 and v == values[i - 1] else 1
+        longest = max(longest, run)
+    return longest
+
+
+def generate_sides(count):
+    """Generate balanced random sequence of sides"""
+    sides = ['left', 'right'] * (count // 2)
+    if count % 2:
+        sides.append(random.choice(['left', 'right']))
+
+    for _ in range(MAX_SHUFFLES):
+        random.shuffle(sides)
+        if max_run(sides) <= MAX_SIDE_RUN:
+            break
+    return sides
+
+
+def generate_classes(count):
+    """Generate alternating sequence of classes, starting from random one"""
+    classes = ['primary', 'secondary']
+    random.shuffle(classes)
+    return [classes[i % 2] for i in range(count)]
+
+
+class Deck:
+    """Stimuli of a category, dealt in random order and reshuffled when exhausted"""
+
+    def __init__(self, stimuli):
+        self.stimuli = list(stimuli)
+        self.cards = []
+
+    def shuffle(self):
+        self.cards = self.stimuli.copy()
+        random.shuffle(self.cards)
+
+    def deal(self, previous=None):
+        """Take next stimulus, different from the previous one if possible"""
+        if not self.cards:
+            self.shuffle()
+        if self.cards[-1] == previous and len(self.cards) == 1:
+            # the last card repeats previous one, starting next round of the deck
+            self.shuffle()
+        if self.cards[-1] == previous:
+            # put it to the bottom
+            self.cards.insert(0, self.cards.pop())
+        return self.cards.pop()
+
+
+def generate_sequence(choices, count):
+    """Generate a balanced sequence of `count` trials for a block"""
+    sides = generate_sides(count)
+    is_combined = all(len(choices[side]) > 1 for side in ['left', 'right'])
+    classes = generate_classes(count) if is_combined else None
+
+    decks = {}
+    for side in ['left', 'right']:
+        for cls, cat, stimuli in choices[side]:
+            decks[side, cls] = (cat, Deck(stimuli))
+
+    sequence = []
+    previous = None
+    for i, side in enumerate(sides):
+        if classes:
+            cls = classes[i]
+        else:
+            [(cls, _, _)] = choices[side]
+        cat, deck = decks[side, cls]
+        stimulus = deck.deal(previous)
+        sequence.append((side, cls, cat, stimulus))
+        previous = stimulus
+    return sequence
@@ -35,6 +35,16 @@ class View {
         this.$answer = document.getElementById("answer-inp");
         this.$starthelp = document.getElementById("start-help");
         this.$warn = document.getElementById("warning-txt");
+
+        this.prefetched = {};
+    }
+
+    async prefetchImage(url) {
+        /** preload and decode an image, keeping it in browser's memory */
+        let img = new Image();
+        img.src = url;
+        this.prefetched[url] = img;
+        return img.decode();
     }
 
     renderStimulus() {
@@ -122,9 +132,19 @@ class Controller {
         document.querySelector('.stimulus-container').addEventListener('touchstart', (e) => this.onTouchMiddle(e));
         document.querySelector('.corners-container').addEventListener('touchstart', (e) => this.onTouchCorner(e));
 
+        this.prefetching = this.prefetch(js_vars.prefetch);
+
         liveSend({type: 'load'});
     }
 
+    async prefetch(manifest) {
+        /** preload all images that can appear in the round, before first trial */
+        let started = performance.now();
+        let results = await Promise.allSettled(manifest.map((item) => this.view.prefetchImage(item.url)));
+        let failed = results.filter((r) => r.status == 'rejected').length;
+        return {time: (performance.now() - started) / 1000, failed: failed};
+    }
+
     recvMessage(message) {
         // console.debug("received:", message);
         switch(message.type) {
@@ -225,9 +245,11 @@ class Controller {
         }
     }
 
-    startGame() {
+    async startGame() {
         this.starting = false;
         this.view.hideStartInstruction();
+        let report = await this.prefetching;
+        liveSend(Object.assign({type: 'prefetched'}, report));
         this.reqNext();
     }
 
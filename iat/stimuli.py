@@ -6,10 +6,19 @@ The categories should be paired and put into `primary` or `secondary` session co
 If a file stimuli.csv is present in app dir,
 it's content is loaded into the DICT
 the csv should contain (at least) two columns: category, stimulus
+
+All the stimuli are indexed in CATALOGUE on first use,
+image files are checked and their urls, sizes and hashes are precomputed.
+Urls point to the asset bundle when it is served, see ldt_core/asset_bundle.py
+The catalogue is built once for all server processes, see ldt_core/shared_cache.py
 """
 
+from functools import lru_cache
 from pathlib import Path
 import csv
+import hashlib
+
+from ldt_core import shared_cache, lazy, asset_bundle
 
 DICT = {
     'canidae': ['dog', 'wolf', 'coyote', 'fox', 'jackal'],
@@ -48,12 +57,109 @@ DICT = {
 
 csvfile = Path(__file__).parent / "stimuli.csv"
 
-if csvfile.exists():
-    with open(csvfile, encoding='utf-8-sig') as f:
+
+def load_csv(dictionary, filepath):
+    """Add stimuli from csv file to the dictionary"""
+    with open(filepath, encoding='utf-8-sig') as f:
         reader = csv.DictReader(f)
         for row in reader:
             cat = row['category']
             word = row['stimulus']
-            if cat not in DICT:
-                DICT[cat] = []
-            DICT[cat].append(word)
+            if cat not in dictionary:
+                dictionary[cat] = []
+            dictionary[cat].append(word)
+
+
+IMAGES_DIR = Path(__file__).parent / "static" / "images"
+IMAGES_URL = "/static/images/"
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif")
+
+
+def is_image(value):
+    return value.lower().endswith(IMAGE_SUFFIXES)
+
+
+def image_size(path):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return img.size
+
+
+class Stimulus:
+    """A stimulus with everything needed to show it on page
+    The `data` is either text of a word, or url of an image
+    """
+
+    __slots__ = ('value', 'category', 'is_image', 'data', 'width', 'height', 'hash')
+
+    def __init__(self, value, category):
+        self.value = value
+        self.category = category
+        self.is_image = is_image(value)
+        self.width = self.height = self.hash = None
+
+        if not self.is_image:
+            self.data = value
+            return
+
+        path = IMAGES_DIR / value
+        if not path.exists():
+            raise RuntimeError(f"image '{value}' of category '{category}' is missing in {IMAGES_DIR}")
+        content = path.read_bytes()
+        self.hash = hashlib.md5(content).hexdigest()
+        self.width, self.height = image_size(path)
+        bundle = asset_bundle.current()
+        if bundle is not None and f"images/{value}" in bundle:
+            self.data = bundle.url(f"images/{value}")
+        else:
+            # the hash makes browsers reload changed images
+            self.data = f"{IMAGES_URL}{value}?v={self.hash[:8]}"
+
+
+class Catalogue:
+    """Index of all stimuli by category and value"""
+
+    def __init__(self, dictionary):
+        self.categories = {}
+        self.index = {}
+        for cat, values in dictionary.items():
+            self.categories[cat] = tuple(Stimulus(value, cat) for value in values)
+            for stimulus in self.categories[cat]:
+                self.index[cat, stimulus.value] = stimulus
+
+    def __contains__(self, cat):
+        return cat in self.categories
+
+    def __getitem__(self, cat):
+        """Get all stimuli of a category"""
+        return self.categories[cat]
+
+    def get(self, cat, value):
+        """Get a stimulus by category and value"""
+        return self.index[cat, value]
+
+
+def catalogue_key(dictionary):
+    """Digest of stimuli and of their image files"""
+    images = [IMAGES_DIR / v for values in dictionary.values() for v in values if is_image(v)]
+    contents = hashlib.md5(repr(sorted(dictionary.items())).encode()).hexdigest()
+    return contents, shared_cache.files_signature(p for p in images if p.exists())
+
+
+@lru_cache(maxsize=None)
+def get_dict() -> dict:
+    """Load the csv into the DICT, on first use"""
+    if csvfile.exists():
+        load_csv(DICT, csvfile)
+    return DICT
+
+
+@lru_cache(maxsize=None)
+def get_catalogue() -> Catalogue:
+    """Index all the stimuli, on first use"""
+    dictionary = get_dict()
+    return shared_cache.get('iat-catalogue', catalogue_key(dictionary), lambda: Catalogue(dictionary))
+
+
+__getattr__ = lazy.attributes(__name__, CATALOGUE=get_catalogue)
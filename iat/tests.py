@@ -1,10 +1,11 @@
-import time
 from contextlib import contextmanager
 
 from otree.api import *
 from otree import settings
 
-from . import Player, Trial as Puzzle, Intro, RoundN, Results, generate_trial
+from . import Player, Trial as Puzzle, Intro, RoundN, Results, encode_trial
+from ldt_core import clock
+from ldt_core.fuzzing import fuzz, VALID, INVALID, ANY
 
 # tests copypasted from real-effort tasks because of the same communication proto
 # adjusted to skip missing features
@@ -29,6 +30,8 @@ class PlayerBot(Bot):
         "retrying_incorrect",  # answering the same puzzle incorrectly after correct answer, for no reason
         "retrying_nodelay",  # retrying w/out delay
         "retrying_many",  # retrying many times
+        "prefetching",  # reporting preloaded images
+        "fuzzing",  # random sequence of valid and malformed messages
     ]
 
     def play_round(self):
@@ -46,6 +49,14 @@ class PlayerBot(Bot):
         expect(player.num_failed, num_incorrect)
         expect(player.num_trials, num_total)
 
+        # pre-generated sequence is balanced
+        sequence = Puzzle.filter(player=player)
+        expect(len(sequence), self.session.params['num_iterations'][player.round_number])
+        sides = [t.correct for t in sequence]
+        expect(abs(sides.count('left') - sides.count('right')), '<=', 1)
+        stimuli = [t.stimulus for t in sequence]
+        expect(any(a == b for a, b in zip(stimuli, stimuli[1:])), False)
+
         if self.player.round_number == 7:
             yield Submission(Results, check_html=False)
 
@@ -77,7 +88,7 @@ def expect_failure(*exceptions):
 
 def get_last_puzzle_clone(p):
     # makes a clone to check changes of the same instance
-    data = Puzzle.values_dicts(player=p)  # noqa
+    data = Puzzle.values_dicts(player=p, iteration=p.iteration)  # noqa
     if len(data) == 0:
         return None
     datum = data[-1]
@@ -86,7 +97,8 @@ def get_last_puzzle_clone(p):
 
 def get_progress(p):
     return {
-        "total": len(Puzzle.filter(player=p)),
+        # trials are pre-generated, counting only those shown
+        "total": len([t for t in Puzzle.filter(player=p) if t.timestamp]),
         "correct": len(Puzzle.filter(player=p, is_correct=True)),
         "incorrect": len(Puzzle.filter(player=p, is_correct=False)),
     }
@@ -242,7 +254,7 @@ def live_test_normal(method, player, conf):
         resp, iteration=1, num_trials=1, num_correct=1, num_incorrect=0, total=max_iters
     )
 
-    time.sleep(trial_delay)
+    clock.sleep(trial_delay)
 
     # 2nd puzzle
     resp = move_forward(method, player)
@@ -275,7 +287,7 @@ def live_test_iter_limit(method, player, conf):
         move_forward(method, player)
         answer = solution(player)
         give_answer(method, player, answer)
-        time.sleep(trial_delay)
+        clock.sleep(trial_delay)
 
     expect_progress(player, total=max_iters, correct=max_iters, incorrect=0)
     last = get_last_puzzle_clone(player)
@@ -401,7 +413,7 @@ def live_test_retrying_correct(method, player, conf):
 
     last = get_last_puzzle_clone(player)
 
-    time.sleep(retry_delay)
+    clock.sleep(retry_delay)
 
     # 2nd correct answer
     answer2 = solution(player)
@@ -425,7 +437,7 @@ def live_test_retrying_incorrect(method, player, conf):
 
     last = get_last_puzzle_clone(player)
 
-    time.sleep(retry_delay)
+    clock.sleep(retry_delay)
 
     # 2nd incorrect answer
     answer2 = "0"
@@ -470,7 +482,7 @@ def live_test_retrying_many(method, player, conf):
         give_answer(method, player, answer1)
         expect_answered_incorrectly(player, answer1)
         expect_progress(player, total=1, correct=0, incorrect=1)
-        time.sleep(retry_delay)
+        clock.sleep(retry_delay)
 
     last = get_last_puzzle_clone(player)
 
@@ -500,7 +512,7 @@ def live_test_skipping_unanswered(method, player, conf):
     expect_progress(player, total=1, correct=0, incorrect=0)
     last = get_last_puzzle(player)
 
-    time.sleep(trial_delay)
+    clock.sleep(trial_delay)
 
     with expect_failure(RuntimeError):
         move_forward(method, player)
@@ -521,7 +533,7 @@ def live_test_skipping_incorrect(method, player, conf):
     expect_answered_incorrectly(player, answer)
     expect_progress(player, total=1, correct=0, incorrect=1)
 
-    time.sleep(trial_delay)
+    clock.sleep(trial_delay)
 
     if force_solve:
         with expect_failure(RuntimeError):
@@ -532,3 +544,84 @@ def live_test_skipping_incorrect(method, player, conf):
         move_forward(method, player)
         expect_forwarded(player, last)
         expect_progress(player, total=2, correct=0, incorrect=1)
+
+
+def live_test_prefetching(method, player, conf):
+    manifest = RoundN.js_vars(player)['prefetch']
+    urls = [item['url'] for item in manifest]
+
+    for z in Puzzle.filter(player=player):
+        if z.stimulus.endswith((".png", ".jpg")):
+            expect(encode_trial(z)['stimulus'], 'in', urls)
+
+    resp = method(player.id_in_group, dict(type='prefetched', time=100.5, failed=0))
+    expect(resp, None)
+    expect(player.prefetch_time, 100)
+    expect(player.prefetch_failed, 0)
+
+
+class TrialProtocol:
+    """Model of the live page for fuzzing, see ldt_core/fuzzing.py"""
+
+    def __init__(self, params, max_iters):
+        self.params = params
+        self.max_iters = max_iters
+        self.pauses = (0, params['retry_delay'] * 2, params['trial_delay'] * 2)
+        self.iteration = 0
+        self.answered = False
+        self.started = None  # monotonic readings of accepted messages
+        self.responded = None
+
+    def rows(self, player):
+        return Puzzle.filter(player=player)
+
+    def passed(self, since):
+        return clock.now().mono - since
+
+    def generate(self, rng):
+        kind = rng.choices(['load', 'prefetched', 'next', 'answer'], weights=[1, 1, 3, 4])[0]
+        if kind == 'load':
+            return dict(type='load'), VALID
+        if kind == 'prefetched':
+            return dict(type='prefetched', time=rng.randint(0, 1000), failed=rng.randint(0, 2)), VALID
+        if kind == 'next':
+            if self.iteration == 0:
+                return dict(type='next'), VALID
+            if not self.answered:
+                return dict(type='next'), INVALID
+            if self.passed(self.started) < self.params['trial_delay']:
+                return dict(type='next'), ANY
+            return dict(type='next'), VALID
+
+        message = dict(type='answer', answer=rng.choice(['left', 'right']), reaction_time=rng.uniform(0.2, 2.0))
+        if self.iteration == 0:
+            return message, INVALID
+        if self.answered and self.passed(self.responded) < self.params['retry_delay']:
+            return message, ANY
+        return message, VALID
+
+    def update(self, message, reply):
+        if reply is None:
+            return
+        if reply['type'] == 'trial':
+            self.iteration += 1
+            self.answered = False
+            self.started = clock.now().mono
+        if reply['type'] == 'feedback':
+            self.answered = True
+            self.responded = clock.now().mono
+
+    def check(self, player):
+        trials = Puzzle.filter(player=player)
+        answered = [t for t in trials if t.response is not None]
+        num_correct = sum(1 for t in answered if t.is_correct)
+        expect(player.num_trials, len(answered))
+        expect(player.num_correct, num_correct)
+        expect(player.num_failed, len(answered) - num_correct)
+        expect(player.iteration, self.iteration)
+        expect(player.iteration, '<=', self.max_iters)
+        expect(len(answered), '<=', self.iteration)
+
+
+def live_test_fuzzing(method, player, conf):
+    fuzz(method, player, TrialProtocol(conf, conf['num_iterations'][player.round_number]))
@@ -0,0 +1,251 @@
+"""Bundle of stimulus images, memory-mapped and served by the server itself
+
+Images referenced by stimuli are otherwise separate static files, each read from disk when requested,
+with urls the same for any content of the file, so browsers need to revalidate them.
+The bundle packs all of them into a single file: a header, an index with offset, size, MIME type and hash
+of each entry, and contents of the entries, so that any of them is a slice of memory-mapped pages,
+shared by all processes, with no file opened or read per request.
+Responses pass the entries to the ASGI server as views of the mapped pages, in chunks, without copying them,
+though the server itself may still copy the chunks when writing them out, as the pure-Python h11 one does.
+
+Entries are keyed by path within static files, like `images/emoji_u1f600.png`,
+and served at urls containing their hash, like `/bundle/3f2a9c1e/images/emoji_u1f600.png`,
+which never change for the same content, so browsers can cache them forever.
+
+The bundle is built by the `prodserver` on start, from images listed by function `bundled_images()`
+of each app, if it has one, and rebuilt only when any of the images changes.
+Apps use it when it is served, that is when its path is set in environment variable `LDT_ASSET_BUNDLE`,
+and use plain static files otherwise, as under `otree devserver`.
+
+To build it separately:
+```
+python -m ldt_core.asset_bundle assets.bundle generic iat
+```
+
+Example:
+    def bundled_images():
+        return {f"images/{name}": STATIC_IMAGES_DIR / name for name in IMAGES}
+
+    def image_url(name):
+        bundle = asset_bundle.current()
+        if bundle is not None and f"images/{name}" in bundle:
+            return bundle.url(f"images/{name}")
+        return f"/static/images/{name}"
+"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import quote
+import os
+import json
+import mmap
+import struct
+import hashlib
+import argparse
+import tempfile
+import importlib
+import mimetypes
+
+from ldt_core.settings_utils import app_names
+
+MAGIC = b'ASB1'
+# magic, number of entries, size of index, signature of sources
+HEADER = struct.Struct('<4sII16s')
+
+# environment variable with path to the bundle to serve
+BUNDLE_ENV = 'LDT_ASSET_BUNDLE'
+
+DEFAULT_PATH = Path(__file__).parent.parent / "assets.bundle"
+
+BUNDLE_URL = '/bundle/'
+
+# size of chunks of response bodies, sent as views of mapped pages
+CHUNK_SIZE = 64 * 1024
+
+# urls change with content, so browsers can keep them
+CACHE_CONTROL = b'public, max-age=31536000, immutable'
+
+
+class Entry(NamedTuple):
+    offset: int
+    size: int
+    mime: str
+    hash: str
+
+
+def files_signature(files):
+    """Digest of keys, paths, sizes and modification times of the files"""
+    digest = hashlib.md5()
+    for key, filepath in sorted(files.items()):
+        stat = os.stat(filepath)
+        digest.update(f"{key}:{Path(filepath).resolve()}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.digest()
+
+
+def build_bundle(bundlepath, files, signature):
+    """Write all the files into bundle
+
+    Args:
+        bundlepath (str|Path): path to the bundle
+        files (dict): paths to files, by keys of entries
+        signature (bytes): digest of the files, to check if the bundle is outdated
+    """
+    index = []
+    contents = []
+    offset = 0
+    for key, filepath in sorted(files.items()):
+        content = Path(filepath).read_bytes()
+        mime = mimetypes.guess_type(str(filepath))[0] or 'application/octet-stream'
+        index.append([key, offset, len(content), mime, hashlib.md5(content).hexdigest()])
+        contents.append(content)
+        offset += len(content)
+    index = json.dumps(index).encode()
+
+    bundlepath = Path(bundlepath)
+    # write to a temporary file and replace, so that running servers never see partial bundle
+    fd, tmppath = tempfile.mkstemp(dir=bundlepath.parent, prefix=bundlepath.name)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(files), len(index), signature))
+        f.write(index)
+        for content in contents:
+            f.write(content)
+    os.replace(tmppath, bundlepath)
+
+
+class Bundle:
+    """Memory-mapped indexed contents of files"""
+
+    def __init__(self, bundlepath):
+        with open(bundlepath, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, size, self.signature = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise RuntimeError(f"invalid asset bundle {bundlepath}")
+        start = HEADER.size + size
+        self.entries = {}
+        for key, offset, size, mime, digest in json.loads(self.data[HEADER.size : start]):
+            self.entries[key] = Entry(start + offset, size, mime, digest)
+        if len(self.entries) != count:
+            raise RuntimeError(f"invalid asset bundle {bundlepath}")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def content(self, key) -> memoryview:
+        """Content of an entry, as a view of mapped pages, without copying"""
+        entry = self.entries[key]
+        return memoryview(self.data)[entry.offset : entry.offset + entry.size]
+
+    def url(self, key):
+        """Url of an entry, changing with its content"""
+        return f"{BUNDLE_URL}{self.entries[key].hash[:8]}/{quote(key)}"
+
+
+def open_bundle(bundlepath, files):
+    """Open bundle, building it if missing or outdated
+
+    Args:
+        bundlepath (str|Path): path to the bundle
+        files (dict): paths to files, by keys of entries
+    """
+    signature = files_signature(files)
+
+    try:
+        bundle = Bundle(bundlepath)
+        if bundle.signature == signature:
+            return bundle
+    except (OSError, ValueError, struct.error, RuntimeError):
+        # missing or broken
+        pass
+
+    build_bundle(bundlepath, files, signature)
+    return Bundle(bundlepath)
+
+
+@lru_cache(maxsize=None)
+def current():
+    """The bundle served by this server, or None if not served"""
+    path = os.environ.get(BUNDLE_ENV)
+    return Bundle(path) if path else None
+
+
+def collect(apps):
+    """Get files to bundle from `bundled_images()` of apps, by keys of entries"""
+    files = {}
+    for name in apps:
+        module = importlib.import_module(name)
+        if not hasattr(module, 'bundled_images'):
+            continue
+        for key, filepath in module.bundled_images().items():
+            if not Path(filepath).exists():
+                raise RuntimeError(f"image '{key}' of app '{name}' is missing: {filepath}")
+            # apps' static dirs are merged, so the same key should be the same image
+            if key in files and Path(files[key]).read_bytes() != Path(filepath).read_bytes():
+                raise RuntimeError(f"image '{key}' of app '{name}' differs from {files[key]}")
+            files.setdefault(key, filepath)
+    return files
+
+
+class BundleFiles:
+    """ASGI app serving entries of a bundle at BUNDLE_URL, and passing any other requests to wrapped app"""
+
+    def __init__(self, app, bundle):
+        self.app = app
+        self.bundle = bundle
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(BUNDLE_URL):
+            await self.app(scope, receive, send)
+            return
+
+        # the path is already unquoted
+        version, _, key = scope['path'][len(BUNDLE_URL) :].partition('/')
+        entry = self.bundle.entries.get(key)
+        if scope['method'] not in ('GET', 'HEAD'):
+            await self.respond(send, 405)
+            return
+        if entry is None or not version or not entry.hash.startswith(version):
+            await self.respond(send, 404)
+            return
+
+        etag = f'"{entry.hash}"'.encode()
+        headers = [(b'cache-control', CACHE_CONTROL), (b'etag', etag)]
+        if dict(scope['headers']).get(b'if-none-match') == etag:
+            await self.respond(send, 304, headers)
+            return
+        headers += [(b'content-type', entry.mime.encode()), (b'content-length', str(entry.size).encode())]
+        if scope['method'] == 'HEAD':
+            await self.respond(send, 200, headers)
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        content = self.bundle.content(key)
+        for start in range(0, entry.size, CHUNK_SIZE):
+            chunk = content[start : start + CHUNK_SIZE]
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    @staticmethod
+    async def respond(send, status, headers=(), body=b''):
+        await send({'type': 'http.response.start', 'status': status, 'headers': list(headers)})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build bundle of stimulus images of apps")
+    parser.add_argument('output', type=Path, nargs='?', default=DEFAULT_PATH, help="file to write the bundle to")
+    parser.add_argument('apps', nargs='*', help="apps to collect images from, default all apps of settings.py")
+    args = parser.parse_args()
+
+    files = collect(args.apps or app_names())
+    bundle = open_bundle(args.output, files)
+    size = sum(entry.size for entry in bundle.entries.values())
+    print(f"{len(bundle)} images, {size} bytes, in {args.output}")
+
+
+if __name__ == '__main__':
+    main()
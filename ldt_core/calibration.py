@@ -0,0 +1,87 @@
+"""Estimation of network round-trip time and client clock offset, by bursts of pings
+
+The client sends a burst of pings, each next one immediately on receiving pong for previous one,
+carrying its clock reading (ms since epoch). So, for consecutive pings the server gets:
+- round-trip time: interval between receiving the pings, by server's monotonic clock
+- clock offset, NTP-style: server time of the pong minus midpoint of client times of sending the ping and receiving the pong
+
+Estimates are medians over samples of a burst, to filter out occasional delays,
+and jitter is median absolute deviation of round-trip times.
+
+Protocol:
+- receive: {'type': 'ping', 'time': ..., 'first': true} -- start of a burst
+- respond: {'type': 'pong'}
+- receive: {'type': 'ping', 'time': ...} -- next ping
+- respond: {'type': 'pong'}
+- ...
+- respond: {'type': 'calibrated', 'rtt': ..., 'offset': ...} -- the burst is completed
+
+The client is expected to send bursts at page load and periodically between trials, never during stimulus presentation.
+
+Player model should have fields:
+- `calibration`: state of current burst (LongStringField)
+- `rtt`, `rtt_jitter`, `clock_offset`: estimates, in ms (FloatField)
+"""
+
+import json
+import statistics
+
+# samples per burst
+NUM_SAMPLES = 5
+# intervals between pings longer than this are not considered round trips (ms)
+MAX_RTT = 5000
+# latency of a trial considered a spike, relative to estimated round-trip time
+SPIKE_FACTOR = 2
+SPIKE_MARGIN = 50
+
+
+def record_ping(player, client_time: float, now, num_samples: int = NUM_SAMPLES) -> bool:
+    """Record a ping from client, update estimates when a burst is completed
+
+    Args:
+        client_time: client clock reading, ms since epoch
+        now: server clock reading, see clock.now()
+
+    Return:
+        if the burst is completed
+    """
+    saved = player.field_maybe_none('calibration')
+    state = json.loads(saved) if saved else None
+    samples = []
+
+    if state is not None:
+        prev_client_time, prev_wall, prev_mono = state['prev']
+        samples = state['samples']
+        rtt = (now.mono - prev_mono) * 1000
+        if 0 <= rtt <= MAX_RTT:
+            offset = prev_wall * 1000 - (prev_client_time + client_time) / 2
+            samples.append([round(rtt, 3), round(offset, 3)])
+
+    if len(samples) >= num_samples:
+        estimate(player, samples)
+        player.calibration = None
+        return True
+
+    player.calibration = json.dumps(dict(prev=[client_time, now.wall, now.mono], samples=samples))
+    return False
+
+
+def reset(player):
+    """Start new burst"""
+    player.calibration = None
+
+
+def estimate(player, samples):
+    rtts = [s[0] for s in samples]
+    offsets = [s[1] for s in samples]
+    rtt = statistics.median(rtts)
+    player.rtt = round(rtt, 3)
+    player.rtt_jitter = round(statistics.median(abs(r - rtt) for r in rtts), 3)
+    player.clock_offset = round(statistics.median(offsets), 3)
+
+
+def is_spike(latency, rtt):
+    """Check if latency measured for a trial is abnormal, or None if unknown"""
+    if latency is None or rtt is None:
+        return None
+    return latency > SPIKE_FACTOR * rtt + SPIKE_MARGIN
@@ -0,0 +1,94 @@
+"""Server clock: wall time paired with monotonic time
+
+Wall time (`time.time`) is good for timestamps, but it can be stepped or slewed by NTP during a long session.
+Monotonic time (`time.monotonic_ns`) is steady, so intervals between server events are computed from it.
+Its origin is arbitrary (usually system boot) and it is shared by all processes of a machine,
+so its readings are only comparable within one machine and one uptime.
+
+Every server event is recorded as a pair of fields: wall timestamp and monotonic reading, both in seconds.
+Monotonic readings are stored as floats, keeping sub-microsecond resolution for years of uptime,
+because integer fields are 32-bit in some databases.
+
+Records without monotonic readings (made before it was added), or with readings from another uptime,
+fall back to wall time.
+
+Example:
+    now = clock.now()
+    trial.server_loaded_timestamp, trial.server_loaded_mono = now
+    ...
+    passed = clock.elapsed_ms(trial.server_loaded_timestamp, trial.server_loaded_mono, clock.now())
+
+The readings are taken from a replaceable source.
+In bot tests (setting VIRTUAL_CLOCK) it is a virtual clock, where sleeping advances time instantly,
+so that tests satisfy delays enforced by apps without waiting for them:
+    clock.sleep(params['retry_delay'])
+"""
+
+from typing import NamedTuple
+import time
+
+from otree import settings
+
+
+class Reading(NamedTuple):
+    wall: float  # seconds since epoch
+    mono: float  # seconds of monotonic clock
+
+
+class SystemClock:
+    """Readings of the system clocks"""
+
+    def read(self) -> Reading:
+        return Reading(time.time(), time.monotonic_ns() / 1e9)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock(SystemClock):
+    """System clocks shifted forward by all the sleeps, which return immediately"""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def read(self) -> Reading:
+        wall, mono = super().read()
+        return Reading(wall + self.offset, mono + self.offset)
+
+    def sleep(self, seconds):
+        self.offset += max(0.0, seconds)
+
+
+SOURCE = VirtualClock() if settings.VIRTUAL_CLOCK else SystemClock()
+
+
+def install(source: SystemClock) -> SystemClock:
+    """Replace source of readings, returning the previous one"""
+    global SOURCE
+    previous, SOURCE = SOURCE, source
+    return previous
+
+
+def now() -> Reading:
+    return SOURCE.read()
+
+
+def sleep(seconds):
+    """Wait for some time, or pretend to"""
+    SOURCE.sleep(seconds)
+
+
+def interval(start_wall, start_mono, end_wall, end_mono) -> float:
+    """Seconds between two recorded events, by monotonic clock when possible"""
+    if start_mono is not None and end_mono is not None and end_mono >= start_mono:
+        return end_mono - start_mono
+    return end_wall - start_wall
+
+
+def elapsed(wall, mono, reading: Reading) -> float:
+    """Seconds passed since a recorded event till the reading"""
+    return interval(wall, mono, reading.wall, reading.mono)
+
+
+def elapsed_ms(wall, mono, reading: Reading) -> int:
+    return int(elapsed(wall, mono, reading) * 1000)
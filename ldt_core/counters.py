@@ -0,0 +1,45 @@
+"""Counters of answered trials of a player
+
+Players keep the number of answered trials, of correct and of failed ones, shown as progress on every response.
+Each response updates them incrementally, replacing the outcome of a previous response to the same trial,
+and a page reload recounts them from the trials, repairing any drift.
+
+The counters are player fields `num_trials`, `num_failed`, and a field of correct ones,
+named `num_correct` or `num_solved`, depending on app.
+
+Example:
+    counters.count_response(player, was_correct, trial.is_correct)
+    ...
+    counters.recount(player, [t for t in Trial.filter(player=player) if t.response is not None])
+"""
+
+
+def count_response(player, was_correct, is_correct: bool, correct_field='num_correct'):
+    """Count outcome of a trial, replacing previously counted outcome of the same trial
+    Each counter is assigned at most once.
+
+    Args:
+        was_correct: correctness of previous response, or None if the trial is not counted yet
+        correct_field: name of player field counting correct trials
+    """
+    if was_correct is None:
+        player.num_trials += 1
+    elif was_correct == is_correct:
+        return
+    elif was_correct:
+        setattr(player, correct_field, getattr(player, correct_field) - 1)
+    else:
+        player.num_failed -= 1
+
+    if is_correct:
+        setattr(player, correct_field, getattr(player, correct_field) + 1)
+    else:
+        player.num_failed += 1
+
+
+def recount(player, answered: list, correct_field='num_correct'):
+    """Recount counters from all answered trials, repairing any drift"""
+    num_correct = sum(1 for t in answered if t.is_correct)
+    player.num_trials = len(answered)
+    setattr(player, correct_field, num_correct)
+    player.num_failed = len(answered) - num_correct
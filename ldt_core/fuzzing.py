@@ -0,0 +1,279 @@
+"""Model-based fuzzing of live methods, for bot tests
+
+A fuzzer sends long random sequences of live messages to a live method, valid and malformed,
+following a protocol model of the app. The model keeps track of what the live page should be in,
+predicts if each message should be accepted or rejected, and checks invariants of the stored state after each call.
+
+A rejected message raises an exception in the live method, and the server discards all changes made by it
+by rolling back the database transaction. The fuzzer does the same by restoring the player and its rows,
+to continue the sequence from a consistent state.
+
+Each call is timed, and percentiles of the time per message type are printed in the end.
+
+Protocol model is an object with:
+- `generate(rng)`: a next random message, and expectation `VALID`, `INVALID` or `ANY` (when the model cannot tell)
+- `update(message, reply)`: track an accepted message
+- `rows(player)`: list of player's rows (ExtraModel) that can be changed by messages
+- `check(player)`: check invariants of player and rows against the model, raising AssertionError
+- `pauses`: tuple of seconds to pick pauses between messages from
+- `admit(message)`, optional: expectation for any message, including malformed, before the app looks at it,
+  e.g. `INVALID` when it is going to be dropped by rate limiting, or None to not override the expectation
+
+Volume and seed of sequences are set by env vars, to reproduce a failure, or to run it longer:
+```
+FUZZ_STEPS=10000 FUZZ_SEED=12345 otree test testing_generic
+```
+Pauses are taken with `clock.sleep`, so that with virtual clock of bot tests they do not take any time.
+"""
+
+from collections import deque
+import os
+import random
+import time
+
+from sqlalchemy import inspect
+from sqlalchemy.orm.attributes import set_attribute
+
+from ldt_core import clock, live_engine
+from ldt_core.live_timing import percentile, PERCENTILES
+
+STEPS = int(os.environ.get('FUZZ_STEPS', 200))
+MALFORMED_RATE = 0.1
+CORRUPTED_RATE = 0.1
+HISTORY = 10
+
+VALID, INVALID, ANY = 'valid', 'invalid', 'any'
+
+# exceptions of live methods rejecting a message
+REJECTIONS = (RuntimeError, ValueError, KeyError, TypeError)
+
+MALFORMED = [None, [], 42, "load", {}, {'type': None}, {'type': ""}, {'type': "bogus"}, {'type': ["load"]}]
+CORRUPTIONS = [None, "", "bogus", [], {}, -1, 10 ** 9]
+DELETED = object()
+
+
+def corrupt(message, rng):
+    """Replace or delete a random field of a message"""
+    fields = [k for k in message if k != 'type']
+    if not fields:
+        return dict(message, type=rng.choice(CORRUPTIONS))
+    field = rng.choice(fields)
+    value = rng.choice(CORRUPTIONS + [DELETED])
+    corrupted = {k: v for k, v in message.items() if k != field}
+    if value is not DELETED:
+        corrupted[field] = value
+    return corrupted
+
+
+def snapshot(objects):
+    """Values of all columns of the objects"""
+    result = []
+    for obj in objects:
+        state = inspect(obj)
+        result.append((obj, {attr.key: state.attrs[attr.key].value for attr in state.mapper.column_attrs}))
+    return result
+
+
+def restore(snapshotted):
+    for obj, values in snapshotted:
+        for key, value in values.items():
+            set_attribute(obj, key, value)
+
+
+def fuzz(method, player, protocol, steps=None, seed=None):
+    """Run random sequence of messages against a live method
+
+    Args:
+        method: live method as passed to bot tests, `method(id_in_group, message)`
+        player: the player
+        protocol: model of the app, see above
+        steps (int): number of messages, default `FUZZ_STEPS` env var or 200
+        seed (int): random seed, default `FUZZ_SEED` env var or random one
+
+    Return:
+        dict of lists of timings in seconds, by message type
+    """
+    steps = steps or STEPS
+    if seed is None:
+        seed = int(os.environ.get('FUZZ_SEED', random.randrange(2 ** 32)))
+    print(f"Fuzzing with {steps} messages, seed {seed}")
+    rng = random.Random(seed)
+
+    timings = {}
+    history = deque(maxlen=HISTORY)
+    last_iteration = player.iteration
+
+    def fail(step, text):
+        messages = "\n".join(f"  {m!r} -> {r}" for m, r in history)
+        return AssertionError(f"Fuzzing seed {seed}, step {step}: {text}\nlast messages:\n{messages}")
+
+    for step in range(steps):
+        # before generating, for the model to see the time the message is sent at
+        clock.sleep(rng.choice(protocol.pauses))
+
+        if rng.random() < MALFORMED_RATE:
+            message, expected = rng.choice(MALFORMED), INVALID
+            label = 'malformed'
+        else:
+            message, expected = protocol.generate(rng)
+            label = message['type']
+            if rng.random() < CORRUPTED_RATE:
+                message, expected = corrupt(message, rng), ANY
+
+        if hasattr(protocol, 'admit'):
+            admitted = protocol.admit(message)
+            if admitted == INVALID or admitted == ANY and expected == VALID:
+                expected = admitted
+
+        rows = protocol.rows(player)
+        before = snapshot([player] + rows)
+
+        started = time.perf_counter()
+        try:
+            reply = method(player.id_in_group, message)
+        except REJECTIONS as e:
+            timings.setdefault(label, []).append(time.perf_counter() - started)
+            history.append((message, repr(e)))
+            if expected == VALID:
+                raise fail(step, f"valid message rejected with {e!r}")
+            # as if the transaction is rolled back
+            restore(before)
+            for row in protocol.rows(player):
+                if row not in rows:
+                    row.delete()
+        except Exception as e:
+            history.append((message, repr(e)))
+            raise fail(step, f"message failed with unexpected {e!r}") from e
+        else:
+            timings.setdefault(label, []).append(time.perf_counter() - started)
+            reply = reply[player.id_in_group] if reply else None
+            history.append((message, repr(reply)[:200]))
+            if expected == INVALID:
+                raise fail(step, "invalid message accepted")
+            protocol.update(message, reply)
+
+        try:
+            if player.iteration < last_iteration:
+                raise AssertionError(f"iteration went back from {last_iteration} to {player.iteration}")
+            last_iteration = player.iteration
+            protocol.check(player)
+        except AssertionError as e:
+            raise fail(step, f"invariant violated: {e}") from e
+        except Exception as e:  # e.g. invalid values failing to get saved
+            raise fail(step, f"checking state failed with {e!r}") from e
+
+    report(timings)
+    return timings
+
+
+def report(timings):
+    """Print percentiles of call times per message type, in ms"""
+    print(f"{'message':<16} {'count':>8}" + "".join(f" {'p' + str(p):>8}" for p in PERCENTILES) + f" {'max':>8}")
+    for label, values in sorted(timings.items()):
+        values = sorted(values)
+        line = f"{label:<16} {len(values):8d}"
+        for p in PERCENTILES:
+            line += f" {percentile(values, p) * 1000:8.2f}"
+        print(line + f" {values[-1] * 1000:8.2f}")
+
+
+class EngineProtocol:
+    """Model of live pages of TrialEngine, see ldt_core/live_engine.py"""
+
+    pauses = (0, 0.1, 1.0)
+
+    def __init__(self, engine, params):
+        self.engine = engine
+        self.params = params
+        self.batched = params['batch_size'] > 1
+        self.iteration = 0
+        self.answered = False
+        self.attempts = 0
+        self.delivered = 0
+
+    def rows(self, player):
+        return self.engine.Trial.filter(player=player)
+
+    def generate(self, rng):
+        kind = rng.choices(
+            ['load', 'new', 'response', 'timeout', 'ping', 'prefetched'], weights=[1, 3, 4, 1, 1, 1]
+        )[0]
+        if kind == 'load':
+            return dict(type='load'), VALID
+        if kind == 'ping':
+            message = dict(type='ping', time=clock.now().wall * 1000 + rng.uniform(-50, 50))
+            if rng.random() < 0.3:
+                message['first'] = True
+            return message, VALID
+        if kind == 'prefetched':
+            return dict(type='prefetched', time=rng.randint(0, 1000), failed=rng.randint(0, 2)), VALID
+        if kind == 'new':
+            if self.iteration > 0 and not self.answered:
+                return dict(type='new'), INVALID
+            return dict(type='new'), VALID
+
+        # response or timeout
+        if kind == 'response':
+            message = dict(
+                type='response',
+                response=rng.choice(self.engine.C.choices),
+                reaction_time=rng.randint(1, 3000),
+                total_time=rng.randint(0, 3500),
+            )
+        else:
+            message = dict(type='timeout')
+        if self.iteration == 0:
+            return message, INVALID
+        if not self.batched:
+            return message, self.expect_answer(kind)
+
+        iteration = rng.choice([self.iteration, self.iteration, self.iteration + 1, self.iteration - 1])
+        message['iteration'] = iteration
+        if iteration == self.iteration + 1:
+            if not self.answered or iteration > self.delivered:
+                return message, INVALID
+            return message, VALID
+        if iteration != self.iteration:
+            return message, INVALID
+        return message, self.expect_answer(kind)
+
+    def expect_answer(self, kind):
+        """Expectation of response or timeout to current trial"""
+        if kind == 'timeout' or not self.answered:
+            return VALID
+        max_attempts = self.params['attempts_per_trial']
+        if max_attempts <= 1 or self.attempts >= max_attempts:
+            return INVALID
+        return VALID
+
+    def update(self, message, reply):
+        message_type = message['type']
+        if reply and reply['type'] in ('trial', 'trials'):
+            self.iteration += 1
+            self.answered = False
+            self.attempts = 0
+        if message_type in ('response', 'timeout'):
+            if self.batched and message.get('iteration') == self.iteration + 1:
+                self.iteration += 1
+                self.answered = False
+                self.attempts = 0
+            self.answered = True
+            if message_type == 'response':
+                self.attempts += 1
+        if reply and reply.get('trials'):
+            self.delivered = max([self.delivered] + [t['iteration'] for t in reply['trials']])
+
+    def check(self, player):
+        trials = self.engine.Trial.filter(player=player)
+        responded = [t for t in trials if live_engine.is_counted(t)]
+        num_solved = sum(1 for t in responded if t.is_correct)
+        counters = (player.num_trials, player.num_solved, player.num_failed)
+        if counters != (len(responded), num_solved, len(responded) - num_solved):
+            raise AssertionError(f"counters {counters} do not match {len(responded)} responded trials")
+        if player.iteration != self.iteration:
+            raise AssertionError(f"iteration {player.iteration}, expected {self.iteration}")
+        if player.iteration > self.params['num_iterations']:
+            raise AssertionError(f"iteration {player.iteration} beyond num_iterations")
+        current = [t for t in trials if t.iteration == player.iteration]
+        if current and current[0].attempts != self.attempts:
+            raise AssertionError(f"attempts {current[0].attempts}, expected {self.attempts}")
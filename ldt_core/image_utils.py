@@ -1,9 +1,15 @@
 """
 Utilities to generate and manipulate images
+
+Pillow is imported by the functions on first use, not to slow down importing of the apps.
 """
 from io import BytesIO
 from base64 import b64encode
+from functools import lru_cache
 from pathlib import Path
+import importlib.util
+
+from . import lazy
 
 MSG_NEED_PIL = """
 FAILURE: Before using these real-effort tasks,
@@ -12,17 +18,13 @@ You need to:
 (2) add Pillow to your requirements.txt
 """
 
-try:
-    # PIL is not actually used here; this is just to generate the warning to install Pillow.
-    import PIL  # noqa
-except ImportError:
+# checking that Pillow is installed, without importing it
+if importlib.util.find_spec("PIL") is None:
     import sys
 
     sys.tracebacklimit = 0
     raise SystemExit(MSG_NEED_PIL)
 
-from PIL import Image, ImageDraw, ImageFont, ImageMorph, ImageFilter
-
 
 TEXT_FONT = Path(__file__).parent / "assets" / "FreeSans.otf"
 TEXT_SIZE = 32
@@ -32,6 +34,8 @@ TEXT_BACKGROND = "#FFFFFF"
 
 
 def render_text(text):
+    from PIL import Image, ImageDraw, ImageFont
+
     dumb = Image.new("RGB", (0, 0))
     font = ImageFont.truetype(str(TEXT_FONT), TEXT_SIZE)
     w, h = ImageDraw.ImageDraw(dumb).textsize(text, font)
@@ -45,17 +49,27 @@ def render_text(text):
     return image
 
 
-DISTORTIONS = [
-    ImageMorph.MorphOp(op_name="erosion4"),
-    ImageMorph.MorphOp(op_name="dilation4"),
-    ImageFilter.BoxBlur(radius=1),
-]
+@lru_cache(maxsize=None)
+def get_distortions():
+    """Distortion operations, with lookup tables of morphing built once"""
+    from PIL import ImageMorph, ImageFilter
+
+    return [
+        ImageMorph.MorphOp(op_name="erosion4"),
+        ImageMorph.MorphOp(op_name="dilation4"),
+        ImageFilter.BoxBlur(radius=1),
+    ]
+
+
+__getattr__ = lazy.attributes(__name__, DISTORTIONS=get_distortions)
 
 
 def distort_image(img):
+    from PIL import ImageMorph, ImageFilter
+
     img = img.convert("L")
 
-    for op in DISTORTIONS:
+    for op in get_distortions():
         if isinstance(op, ImageFilter.Filter):
             img = img.filter(op)
         if isinstance(op, ImageMorph.MorphOp):
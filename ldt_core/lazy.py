@@ -0,0 +1,37 @@
+"""Lazy module attributes, loaded on first access
+
+Stimuli pools, nonword banks and similar data used to be loaded at import of the apps,
+so every process importing them, like `otree test` or a restarting server, paid for all of them, used or not.
+Instead, they are loaded by functions, cached to run once, and code of the app calls the functions.
+The same data are kept available as module attributes, with a module `__getattr__` (PEP 562)
+calling the function on first access and storing the result in the module, so later access costs nothing.
+
+Example:
+    @lru_cache(maxsize=None)
+    def get_pool():
+        pool = []
+        stimuli_utils.load_csv(pool, Path(__file__).parent / "stimuli.csv")
+        return pool
+
+    __getattr__ = lazy.attributes(__name__, POOL=get_pool)
+"""
+
+import sys
+
+
+def attributes(module_name: str, **loaders):
+    """Make module `__getattr__`, computing attributes by given functions
+
+    Args:
+        module_name: `__name__` of the module
+        loaders: functions to call, by names of attributes
+    """
+
+    def __getattr__(name):
+        if name not in loaders:
+            raise AttributeError(f"module '{module_name}' has no attribute '{name}'")
+        value = loaders[name]()
+        setattr(sys.modules[module_name], name, value)
+        return value
+
+    return __getattr__
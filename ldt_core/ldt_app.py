@@ -0,0 +1,158 @@
+"""Common parts of the lexical decision apps on the trial engine
+
+The apps `ldt_yesno` and `ldt_gonogo` differ only by their constants: keymap, response recorded on timeout,
+and default `auto_response_time`. They keep the models and pages, as oTree requires them in the app,
+and take the rest from here: session parameters, stimuli, generating and encoding of trials.
+
+The stimuli are loaded on first use, not at import, see ldt_core/lazy.py.
+
+Example:
+    def creating_session(subsession: Subsession):
+        ldt_app.configure(subsession.session, auto_response_time=2000)
+        subsession.is_practice = True
+        GAME.setup(subsession)
+
+    GAME = live_engine.TrialEngine(
+        C,
+        Trial,
+        generate=partial(ldt_app.generate_trials, Trial),
+        encode=ldt_app.encode_trial,
+        export_fields=ldt_app.EXPORT_FIELDS,
+    )
+"""
+
+import random
+from functools import lru_cache
+from pathlib import Path
+
+from . import stimuli_utils, image_utils, nonword_bank, lexicon, strata_utils, live_timing, lazy
+
+DEFAULTS = dict(
+    num_iterations=10,
+    attempts_per_trial=1,
+    nonwords_proportion=0.5,
+    frequency_bands=None,
+    focus_display_time=500,
+    stimulus_display_time=None,
+    feedback_display_time=1000,
+    auto_response_time=None,
+    input_freezing_time=100,
+    inter_trial_time=2000,
+    batch_size=1,
+    calibration_pings=5,
+    calibration_period=5,
+)
+
+REQUIRED = ["labels"]
+
+EXPORT_FIELDS = ['target', 'band', 'solution']
+
+
+def configure(session, **defaults):
+    """Set `session.params` from session config
+
+    Args:
+        defaults: defaults of the app, overriding `DEFAULTS`
+    """
+    defaults = dict(DEFAULTS, **defaults)
+    session.params = {}
+    for param in defaults:
+        session.params[param] = session.config.get(param, defaults[param])
+    for param in REQUIRED:
+        session.params[param] = session.config[param]
+
+
+@lru_cache(maxsize=None)
+def get_pool():
+    """Words with their frequencies"""
+    pool = []
+    stimuli_utils.load_csv(pool, lexicon.TOP_WORDS, ['target', 't_freq'])
+    return pool
+
+
+@lru_cache(maxsize=None)
+def get_lexicon():
+    return lexicon.open_lexicon(Path(__file__).parent / "words.lex", [(lexicon.TOP_WORDS, ['target'])])
+
+
+@lru_cache(maxsize=None)
+def get_bank():
+    """Nonwords matched to the words, see ldt_core/nonword_bank.py to regenerate"""
+    return nonword_bank.load_bank(nonword_bank.TOP_WORDS_BANK)
+
+
+__getattr__ = lazy.attributes(__name__, POOL=get_pool, LEXICON=get_lexicon, BANK=get_bank)
+
+
+# strata of the pool, for each configured frequency bands
+STRATA = {}
+
+
+def get_strata(bands: dict) -> strata_utils.Strata:
+    """Get the pool indexed by frequency bands, building it once"""
+    key = tuple(sorted(bands.items())) if bands else None
+    if key not in STRATA:
+        STRATA[key] = strata_utils.Strata(get_pool(), 't_freq', bands)
+    return STRATA[key]
+
+
+def generate_trials(Trial, player):
+    """Create `num_iterations` trials with non-repeating random stimuli, balanced by frequency bands
+
+    Args:
+        Trial: trial model of the app
+    """
+    params = player.session.params
+    count = params['num_iterations']
+    proportion = params['nonwords_proportion']
+
+    if not count:
+        raise RuntimeError("Cannot generate trials without `num_iterations`")
+
+    strata = get_strata(params['frequency_bands'])
+
+    if len(strata) < count:
+        raise RuntimeError(f"Insufficient stimuli in the pool for {count} iterations")
+
+    sampled = strata.sample(count)
+
+    flags = [random.uniform(0, 1) < proportion for _ in range(count)]
+    sources = [row['target'] for (row, _), f in zip(sampled, flags) if f]
+    nonwords = iter(nonword_bank.sample_nonwords(get_bank(), sources, get_lexicon()))
+
+    for i, ((row, band), is_nonword) in enumerate(zip(sampled, flags)):
+        Trial.create(
+            round=player.round_number,
+            player=player,
+            iteration=1 + i,
+            #
+            target=next(nonwords) if is_nonword else row['target'],
+            band=band,
+            solution='nonword' if is_nonword else 'word',
+        )
+
+
+def static_image_url(path):
+    """hardcoded for now"""
+    return f'/static/images/{path}'
+
+
+def render_image(text):
+    with live_timing.phase('render'):
+        img = image_utils.render_text(text)
+        img = image_utils.distort_image(img)
+    with live_timing.phase('encode'):
+        data = image_utils.encode_image(img)
+    return data
+
+
+def encode_trial(trial) -> dict:
+    """Get trial data to pass to live page"""
+    # for plain text
+    # return dict(stimulus=dict(type='text', text=trial.stimulus))
+
+    # for static images
+    # return dict(stimulus=dict(type='image-url', url=static_image_url(trial.stimulus)))
+
+    # for rendered text
+    return dict(stimulus=dict(type='image-data', data=render_image(trial.target)))
@@ -0,0 +1,147 @@
+"""Lexicon index to check if a string is a known word
+
+The index is a file with sorted words, padded to the same width,
+so that a lookup is a binary search over memory-mapped records.
+It is built once from the wordlists and rebuilt only when any of them changes.
+All processes share the same mapped pages, and opening it does not read or parse the wordlists.
+
+Wordlists can be:
+- csv files, using specified columns, or the first one
+- plain text files, using the first word of each line
+
+An additional wordlist can be specified with environment variable `LDT_LEXICON`.
+
+Example:
+    LEXICON = lexicon.open_lexicon(Path(__file__).parent / "words.lex", [(Path(__file__).parent / "words.csv", ['target'])])
+    "word" in LEXICON
+"""
+
+from pathlib import Path
+import os
+import csv
+import mmap
+import struct
+import hashlib
+import tempfile
+
+MAGIC = b'LEX1'
+# magic, width of records, number of records, signature of sources
+HEADER = struct.Struct('<4sHI16s')
+
+# environment variable with path to an extra wordlist
+LEXICON_ENV = 'LDT_LEXICON'
+
+# wordlist of frequent words, with their frequencies, shared by the apps
+TOP_WORDS = Path(__file__).parent / "assets" / "words_top1000.csv"
+
+
+def read_words(filepath, fields=None):
+    """Read lowercased words from a csv or a plain text wordlist"""
+    filepath = Path(filepath)
+    with open(filepath, encoding='utf-8-sig') as f:
+        if filepath.suffix == '.csv':
+            reader = csv.DictReader(f, dialect='excel')
+            if fields is None:
+                fields = reader.fieldnames[:1]
+            for fld in fields:
+                if fld not in reader.fieldnames:
+                    raise RuntimeError(f"field '{fld}' is missing in {filepath}")
+            for row in reader:
+                for fld in fields:
+                    if row[fld]:
+                        yield row[fld].strip().lower()
+        else:
+            for line in f:
+                parts = line.split()
+                if parts:
+                    yield parts[0].lower()
+
+
+def sources_signature(sources):
+    """Digest of wordlists' paths, sizes and modification times"""
+    digest = hashlib.md5()
+    for filepath, fields in sources:
+        stat = os.stat(filepath)
+        digest.update(f"{Path(filepath).resolve()}:{fields}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.digest()
+
+
+def build_index(indexpath, sources, signature):
+    """Write sorted words from all sources into index file"""
+    words = set()
+    for filepath, fields in sources:
+        words.update(w.encode() for w in read_words(filepath, fields))
+    words = sorted(words)
+    width = max(map(len, words), default=0)
+
+    indexpath = Path(indexpath)
+    # write to a temporary file and replace, so that concurrent processes never see partial index
+    fd, tmppath = tempfile.mkstemp(dir=indexpath.parent, prefix=indexpath.name)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, width, len(words), signature))
+        for w in words:
+            f.write(w.ljust(width, b'\0'))
+    os.replace(tmppath, indexpath)
+
+
+class Lexicon:
+    """Memory-mapped sorted array of words"""
+
+    def __init__(self, indexpath):
+        with open(indexpath, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.count, self.signature = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise RuntimeError(f"invalid lexicon index {indexpath}")
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.record(i).rstrip(b'\0').decode()
+
+    def record(self, i):
+        start = HEADER.size + i * self.width
+        return self.data[start : start + self.width]
+
+    def __contains__(self, word):
+        key = word.lower().encode()
+        if len(key) > self.width:
+            return False
+        key = key.ljust(self.width, b'\0')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            rec = self.record(mid)
+            if rec == key:
+                return True
+            if rec < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return False
+
+
+def open_lexicon(indexpath, sources):
+    """Open lexicon index, building it if missing or outdated
+
+    Args:
+        indexpath (str|Path): path to the index file
+        sources (list): list of tuples (filepath, fields) of wordlists, fields are used only for csv files and default to the first column
+    """
+    sources = list(sources)
+    if os.environ.get(LEXICON_ENV):
+        sources.append((os.environ[LEXICON_ENV], None))
+    signature = sources_signature(sources)
+
+    try:
+        lexicon = Lexicon(indexpath)
+        if lexicon.signature == signature:
+            return lexicon
+    except (OSError, ValueError, struct.error, RuntimeError):
+        # missing or broken
+        pass
+
+    build_index(indexpath, sources, signature)
+    return Lexicon(indexpath)
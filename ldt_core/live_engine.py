@@ -0,0 +1,501 @@
+"""Generic stimulus/response workflow of a live page, shared by apps
+
+The engine runs pre-generated trials of a player through the states:
+delivered to client -> responded (possibly retried) -> next one,
+and keeps player's counters of trials.
+
+An app provides:
+- Constants with `choices`, `keymap`, `timeout_response`
+- Player model with fields: `iteration`, `delivered`, `num_trials`, `num_solved`, `num_failed`, `prefetch_time`, `prefetch_failed`,
+  `calibration`, `rtt`, `rtt_jitter`, `clock_offset`
+- Trial model with fields: `player`, `round`, `iteration`, `server_loaded_timestamp`, `server_response_timestamp`,
+  `server_loaded_mono`, `server_response_mono`, `solution`, `attempts`, `response`, `reaction_time`, `is_correct`, `is_timeout`,
+  `network_latency`, `latency_spike`, `server_timing`
+- function to generate all trials for a player
+- function to encode a trial to send to client
+- optional function to check a response
+- optional function to list images to prefetch
+
+Example:
+    GAME = live_engine.TrialEngine(
+        C, Trial, generate=generate_all_trials, encode=encode_trial, export_fields=['stimulus', 'solution']
+    )
+
+    @live_timing.instrument
+    def play_game(player, message):
+        return GAME.play(player, message)
+"""
+
+import logging
+import random
+
+from otree import settings
+
+from . import live_timing, clock, calibration, wire, counters
+
+logger = logging.getLogger(__name__)
+
+
+def check_solution(trial, response: str) -> bool:
+    """Check if the response matches trial's solution"""
+    return trial.solution == response
+
+
+def no_prefetch(player) -> list:
+    return []
+
+
+def is_counted(trial) -> bool:
+    """If the trial is counted in stats: responded, or timed out, even with no response, like in ldt_yesno"""
+    return trial.response is not None or bool(trial.is_timeout)
+
+
+class TrialEngine:
+    """Live task workflow over pre-generated trials
+
+    Args:
+        constants: app's Constants
+        trial_model: app's Trial model
+        generate (callable): function(player) creating all trials
+        encode (callable): function(trial) returning data to send to client
+        check (callable): function(trial, response) returning if the response is correct
+        prefetch (callable): function(player) returning list of images to preload, see js_vars
+        export_fields (list): fields of trials to export, in addition to generic ones
+    """
+
+    def __init__(
+        self,
+        constants,
+        trial_model,
+        *,
+        generate,
+        encode,
+        check=check_solution,
+        prefetch=no_prefetch,
+        export_fields=(),
+    ):
+        self.C = constants
+        self.Trial = trial_model
+        self.generate = generate
+        self.encode = encode
+        self.check = check
+        self.prefetch = prefetch
+        self.export_fields = list(export_fields)
+
+    def setup(self, subsession):
+        """Generate trials for all players"""
+        for player in subsession.get_players():
+            self.generate(player)
+
+    def get_current_trial(self, player):
+        """Get trial for current iteration, or None"""
+        trials = self.Trial.filter(player=player, iteration=player.iteration)
+        if trials:
+            [trial] = trials
+            return trial
+
+    def get_progress(self, player, trial=None) -> dict:
+        """Return whatever progress data to show on page"""
+        params = player.session.params
+        return dict(
+            total=params['num_iterations'],
+            completed=player.num_trials,
+            # attempts_total=params["attempts_per_trial"],
+            # attempts_used=trial.attempts if trial else None,
+        )
+
+    def recompute_stats(self, player):
+        """Recount stats from all responded or timed out trials, repairing any drift of counters"""
+        responded = [t for t in self.Trial.filter(player=player) if is_counted(t)]
+        counters.recount(player, responded, 'num_solved')
+
+    def deliver_trials(self, player, first: int, last: int, now: clock.Reading) -> list:
+        """Get encoded trials with iterations from `first` to `last`, to send in a batch"""
+        last = min(last, player.session.params['num_iterations'])
+        batch = []
+        for t in self.Trial.filter(player=player):
+            if first <= t.iteration <= last:
+                t.server_loaded_timestamp, t.server_loaded_mono = now
+                with live_timing.phase('encode'):
+                    batch.append(dict(self.encode(t), iteration=t.iteration))
+        batch.sort(key=lambda data: data['iteration'])
+        player.delivered = max(last, first - 1)
+        return batch
+
+    def refill_trials(self, player, now: clock.Reading) -> list:
+        """Get encoded trials to keep `batch_size` trials ahead of current one, in batch mode"""
+        last = player.iteration + player.session.params['batch_size']
+        return self.deliver_trials(player, player.delivered + 1, last, now)
+
+    def play(self, player, message: dict):
+        """Main task workflow on the live page
+        Implemented as reactive scheme: receive message from browser, react, respond.
+
+        Generic task workflow, from server point of view:
+
+        - receive: {'type': 'load'} -- the page has been loaded
+        - check if it's game start or page refresh midgame
+        - respond: {'type': 'status', 'progress': status}
+        - respond: {'type': 'status', 'progress': status, 'trial': data} -- in case of midgame page reload
+
+        - receive: {'type': 'prefetched', 'time': ..., 'failed': ...} -- images from manifest are preloaded
+        - record prefetch time, no response
+
+        - receive: {'type': 'ping', 'time': ...} -- clock calibration, see ldt_core/calibration.py
+        - respond: {'type': 'pong'} or {'type': 'calibrated', 'rtt': ..., 'offset': ...}
+
+        - receive: {'type': 'new'} -- request for a new (or first) trial
+        - generate new trial
+        - respond: {'type': 'trial', 'trial': data}
+        - respond: {'type': 'status', 'game_over': True} -- if num_iterations exhausted
+
+        - receive: {'type': 'response', 'response': ..., 'reaction_time': ...} -- user responded
+        - check and record response
+        - respond: {'type': 'feedback', 'response': ..., 'is_correct': true|false} -- feedback to the response
+
+        - receive: {'type': 'timeout'} -- response timeout happened
+        - record timeout response
+        - respond: {'type': 'feedback', 'response': ..., 'is_correct': true|false}
+
+        Field 'progress' is added to all server responses.
+
+        Compact schema, when requested by client in 'load' message, see ldt_core/wire.py:
+        messages are sent and received with short keys and integer types, and 'progress' carries only changed values.
+
+        Batch mode, when `batch_size` > 1:
+
+        - receive: {'type': 'new'}
+        - respond: {'type': 'trials', 'trials': [data, ...]} -- up to `batch_size` trials, starting from the new one
+
+        - receive: {'type': 'response', 'iteration': ..., ...} or {'type': 'timeout', 'iteration': ...}
+        - if iteration is the next one, advance to it without explicit 'new' message
+        - respond: {'type': 'feedback', ..., 'trials': [data, ...]} -- refilling the batch
+
+        The client runs through received trials on its own,
+        and the responses are still checked and recorded in order.
+        Latency is not measured in this mode.
+        """
+        if not isinstance(message, dict):
+            raise ValueError("invalid message")
+
+        message, is_compact = wire.receive(message)
+
+        def validate(*fields):
+            """Checks if the message has all the fields and they're nonempty"""
+            if any([message.get(f) in ("", None) for f in fields]):
+                raise ValueError("invalid message")
+
+        def respond(msgtype, **fields):
+            """Prepare message to send to current player"""
+            msgdata = {'type': msgtype}
+            msgdata.update(fields)
+            logger.debug("response: %s", msgdata)
+            if is_compact:
+                # page load gets full progress, other messages only changes
+                msgdata = wire.compact(msgdata, None if message_type == "load" else progress_before)
+            return {player.id_in_group: msgdata}
+
+        validate('type')
+        message_type = message["type"]
+
+        current = self.get_current_trial(player)
+        progress_before = self.get_progress(player, current) if is_compact else None
+        params = player.session.params
+        now = clock.now()
+
+        is_batched = params['batch_size'] > 1
+
+        if is_batched and current and message_type in ("response", "timeout"):
+            iteration = message.get('iteration')
+            if iteration == player.iteration + 1:  # client advanced to next trial on its own
+                if not is_counted(current):
+                    raise RuntimeError("trying to skip unanswered trial")
+                if iteration > player.delivered:
+                    raise RuntimeError("responding to undelivered trial")
+                player.iteration = iteration
+                current = self.get_current_trial(player)
+            elif iteration != player.iteration:
+                raise RuntimeError("responding out of order")
+
+        live_timing.track(current)
+
+        # time passed (ms) since the last trial retrieved by client
+        # NB: this includes network latency
+        time_passed = (
+            clock.elapsed_ms(current.server_loaded_timestamp, current.server_loaded_mono, now)
+            if current
+            else None
+        )
+
+        logger.debug(
+            "time: %s passed: %s iteration: %s current trial: %s received: %s",
+            now.wall,
+            time_passed,
+            player.iteration,
+            current,
+            message,
+        )
+
+        if message_type == "load":  # client loaded page
+            self.recompute_stats(player)
+            progress = self.get_progress(player, current)
+
+            if player.iteration == params["num_iterations"]:
+                return respond("status", progress=progress, game_over=True)
+            elif current:
+                # NB: not accurate because of network delays
+                timedout = (
+                    params['auto_response_time']
+                    and time_passed > params['auto_response_time']
+                )
+
+                with live_timing.phase('encode'):
+                    data = dict(self.encode(current), iteration=current.iteration)
+
+                return respond("status", progress=progress, trial=data, timed_out=timedout)
+            else:
+                return respond("status", progress=progress)
+
+        if message_type == "ping":  # client calibrates clock
+            validate('time')
+            if message.get('first'):
+                calibration.reset(player)
+            if calibration.record_ping(player, float(message['time']), now, params['calibration_pings']):
+                return respond("calibrated", rtt=player.rtt, offset=player.clock_offset)
+            return respond("pong")
+
+        if message_type == "prefetched":  # client preloaded images
+            validate('time')
+            player.prefetch_time = int(message['time'])
+            player.prefetch_failed = int(message.get('failed', 0))
+            return
+
+        if message_type == "new":  # client requests new trial
+            if current:
+                if not is_counted(current):
+                    raise RuntimeError("trying to skip unanswered trial")
+
+            if player.iteration == params["num_iterations"]:
+                return respond("status", game_over=True)
+
+            player.iteration += 1
+
+            t = self.get_current_trial(player)
+
+            if t is None:
+                raise RuntimeError("failed to pick next trial")
+
+            live_timing.track(t)
+
+            if is_batched:
+                batch = self.deliver_trials(
+                    player, player.iteration, player.iteration + params['batch_size'] - 1, now
+                )
+                return respond("trials", trials=batch)
+
+            t.server_loaded_timestamp, t.server_loaded_mono = now
+
+            with live_timing.phase('encode'):
+                data = self.encode(t)
+
+            return respond("trial", trial=data)
+
+        if message_type == "response":  # client responded current trial
+            max_attempts = params['attempts_per_trial']
+
+            if current is None:
+                raise RuntimeError("response without trial")
+
+            if current.response is not None:  # it's a retry
+                if max_attempts <= 1:
+                    raise RuntimeError("retrying not allowed")
+
+                if current.attempts >= max_attempts:
+                    raise RuntimeError("max attempts exhausted")
+
+            # a response after timeout replaces it
+            was_correct = current.is_correct if is_counted(current) else None
+
+            validate('response', 'reaction_time')
+            if message['response'] not in self.C.choices:
+                raise ValueError("invalid response")
+
+            current.response = message["response"]
+            current.is_correct = self.check(current, current.response)
+            current.attempts += 1
+
+            current.reaction_time = int(message["reaction_time"])
+            if not is_batched:
+                current.network_latency = time_passed - int(message.get('total_time', 0))
+                current.latency_spike = calibration.is_spike(
+                    current.network_latency, player.field_maybe_none('rtt')
+                )
+            current.server_response_timestamp, current.server_response_mono = now
+
+            counters.count_response(player, was_correct, current.is_correct, 'num_solved')
+
+            # if this is a final attempt and user should advance
+            is_final = (
+                max_attempts == 1 or current.is_correct or current.attempts == max_attempts
+            )
+
+            feedback = dict(
+                is_correct=current.is_correct,
+                is_final=is_final,
+                response=current.response,
+                progress=self.get_progress(player, current),
+            )
+            if is_batched:
+                feedback['trials'] = self.refill_trials(player, now)
+            return respond("feedback", **feedback)
+
+        if message_type == "timeout":  # client response timeout
+            if current is None:
+                raise RuntimeError("response without trial")
+
+            # a weird timeout after retry replaces the response
+            was_correct = current.is_correct if is_counted(current) else None
+
+            current.response = self.C.timeout_response
+            current.reaction_time = None
+
+            current.is_correct = self.check(current, current.response)
+            current.server_response_timestamp, current.server_response_mono = now
+            current.is_timeout = True
+
+            counters.count_response(player, was_correct, current.is_correct, 'num_solved')
+
+            feedback = dict(
+                is_correct=current.is_correct,
+                is_final=True,
+                response=current.response,
+                progress=self.get_progress(player, current),
+            )
+            if is_batched:
+                feedback['trials'] = self.refill_trials(player, now)
+            return respond("feedback", **feedback)
+
+        if message_type == "cheat" and settings.DEBUG:  # debugging
+            self.cheat_round(player, message['rt'])
+            return respond("status", game_over=True)
+
+        raise RuntimeError("unrecognized message from client")
+
+    def cheat_round(self, player, rt_mean):
+        params = player.session.params
+        now = clock.now()
+
+        rt_mean = float(rt_mean)
+        rt_std = 1.0
+
+        for i in range(max(1, player.iteration), params['num_iterations'] + 1):
+            r = random.choice(self.C.choices)
+            rt = max(0.0, random.gauss(rt_mean, rt_std))
+            t = self.Trial.filter(player=player, iteration=i)[0]
+            t.server_loaded_timestamp = now.wall + i
+            t.server_loaded_mono = now.mono + i
+            t.server_response_timestamp = now.wall + i + rt
+            t.server_response_mono = now.mono + i + rt
+            t.response = r
+            t.is_correct = self.check(t, r)
+            t.reaction_time = int(rt * 1000)
+            t.is_timeout = False
+        self.recompute_stats(player)
+
+    def page_vars(self, player) -> dict:
+        return dict(
+            conf=dict(
+                choices=self.C.choices,
+                keymap=self.C.keymap,
+            ),
+            params=player.session.params,
+            DEBUG=settings.DEBUG,
+        )
+
+    def js_vars(self, player) -> dict:
+        return dict(self.page_vars(player), prefetch=self.prefetch(player), wire=wire.js_vars())
+
+    def before_next_page(self, player, timeout_happened):
+        """Leaving the live page: store timing of messages collected for the trials, see ldt_core/live_timing.py"""
+        live_timing.store(self.Trial, player)
+
+    def export(self, players):
+        """Generate rows for custom export"""
+        yield [
+            "participant_code",
+            "is_dropout",
+            "session",
+            "round",
+            "is_practice",
+            "player",
+            "rtt",
+            "rtt_jitter",
+            "clock_offset",
+            "iteration",
+            "server_loaded_timestamp",
+            "server_response_timestamp",
+            "server_loaded_mono",
+            "server_response_mono",
+            "server_response_time",
+            "network_latency",
+            "latency_spike",
+            *self.export_fields,
+            "response",
+            "response_correct",
+            "reaction_time",
+            "response_timeout",
+            "attempts",
+            "server_timing",
+        ]
+        for player in players:
+            participant = player.participant
+            session = player.session
+            subsession = player.subsession
+
+            player_fields = [
+                participant.code,
+                participant.is_dropout if 'is_dropout' in participant.vars else None,
+                session.code,
+                subsession.round_number,
+                subsession.is_practice,
+                player.id,
+                player.field_maybe_none('rtt'),
+                player.field_maybe_none('rtt_jitter'),
+                player.field_maybe_none('clock_offset'),
+            ]
+
+            # yield a line for players even without trials
+            yield player_fields
+
+            for trial in self.Trial.filter(player=player):
+                if trial.server_loaded_timestamp is None:  # buffer trials
+                    continue
+                if trial.server_response_timestamp is None:  # unanswered trials
+                    continue
+                server_response_time = clock.interval(
+                    trial.server_loaded_timestamp,
+                    trial.server_loaded_mono,
+                    trial.server_response_timestamp,
+                    trial.server_response_mono,
+                )
+                yield player_fields + [
+                    trial.iteration,
+                    round(trial.server_loaded_timestamp, 3),
+                    round(trial.server_response_timestamp, 3),
+                    trial.server_loaded_mono,
+                    trial.server_response_mono,
+                    int(server_response_time * 1000),
+                    trial.network_latency,
+                    trial.latency_spike,
+                    *[getattr(trial, f) for f in self.export_fields],
+                    trial.response,
+                    trial.is_correct,
+                    trial.reaction_time,
+                    trial.is_timeout,
+                    trial.attempts,
+                    trial.server_timing,
+                ]
+
+    def admin_report(self, subsession) -> dict:
+        """Vars for admin report, with percentiles of server processing time"""
+        return live_timing.admin_report(self.Trial, subsession)
@@ -0,0 +1,247 @@
+"""Instrumentation of live methods: server processing time of each message
+
+Switched on by setting LIVE_TIMING (env var `LIVE_TIMING=1`), when off the wrapped live method is called directly.
+
+Processing time of a message is measured from entering the live method till returning from it,
+and split into exclusive phases:
+- `db`: database queries, including autoflush of pending changes
+  (changes left at the end are written by oTree after the live method, and are not counted)
+- `render`: rendering of images
+- `encode`: encoding of data to send to client
+The rest of the time is the app's own logic.
+
+The samples are collected per trial/puzzle the message concerns, in memory of the server process,
+not to write the row on every message, and stored on the rows once, when the player leaves the live page,
+in a field `server_timing`, as json: {message_type: [[total, db, render, encode], ...]}, all in ms.
+Messages not concerning any row (like initial page load) are not recorded.
+With several server processes, samples collected by a process other than the one serving the page submission are lost.
+
+Example:
+    @live_timing.instrument
+    def play_game(player, message):
+        current = get_current_trial(player)
+        live_timing.track(current)
+        ...
+        with live_timing.phase('encode'):
+            data = encode_trial(current)
+
+    class Main(Page):
+        @staticmethod
+        def before_next_page(player, timeout_happened):
+            live_timing.store(Trial, player)
+
+    def vars_for_admin_report(subsession):
+        return live_timing.admin_report(Trial, subsession)
+"""
+
+from collections import OrderedDict
+from contextvars import ContextVar
+from time import perf_counter
+import functools
+import json
+
+from otree import settings
+from otree.database import engine
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from . import wire
+
+PHASES = ('db', 'render', 'encode')
+# max number of samples per message type kept on a row
+MAX_SAMPLES = 100
+PERCENTILES = (50, 90, 99)
+# max number of rows with samples kept in memory, of most recently active ones
+MAX_ROWS = 10000
+
+# samples not stored yet, {message_type: [sample, ...]} by (model, id) of rows
+COLLECTED = OrderedDict()
+
+# profile of the message being processed
+_profile = ContextVar('live_timing_profile', default=None)
+
+
+def is_enabled():
+    return getattr(settings, 'LIVE_TIMING', False)
+
+
+class Profile:
+    """Times of a message processing
+
+    Nested phases are exclusive: entering a phase pauses the outer one.
+    """
+
+    def __init__(self):
+        self.row = None
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.stack = []
+        self.started = self.mark = perf_counter()
+
+    def enter(self, name):
+        now = perf_counter()
+        if self.stack:
+            self.times[self.stack[-1]] += now - self.mark
+        self.stack.append(name)
+        self.mark = now
+
+    def exit(self):
+        now = perf_counter()
+        if self.stack:
+            self.times[self.stack.pop()] += now - self.mark
+        self.mark = now
+
+    def finish(self) -> list:
+        """Close all phases and get the sample: [total, *phases] in ms"""
+        while self.stack:
+            self.exit()
+        total = perf_counter() - self.started
+        return [round(t * 1000, 3) for t in (total, *self.times.values())]
+
+
+def track(row):
+    """Mark a trial/puzzle to store timing of current message on"""
+    profile = _profile.get()
+    if profile is not None and row is not None:
+        profile.row = row
+
+
+class phase:
+    """Context manager measuring a phase of current message processing"""
+
+    __slots__ = ('profile', 'name')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.profile = _profile.get()
+        if self.profile is not None:
+            self.profile.enter(self.name)
+
+    def __exit__(self, *exc):
+        if self.profile is not None:
+            self.profile.exit()
+
+
+def timed(name):
+    """Decorator to count all the time spent in a function as a phase"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@event.listens_for(engine, 'before_cursor_execute')
+def _before_query(*args):
+    profile = _profile.get()
+    if profile is not None:
+        profile.enter('db')
+
+
+@event.listens_for(engine, 'after_cursor_execute')
+def _after_query(*args):
+    profile = _profile.get()
+    if profile is not None:
+        profile.exit()
+
+
+def row_key(row):
+    if row.id is None:
+        # a row created by the message gets its id by the insert, written at the end of the message anyway
+        object_session(row).flush()
+    return type(row).__name__, row.id
+
+
+def collect(row, message_type, sample):
+    """Keep a sample in memory, till the row is stored"""
+    key = row_key(row)
+    timing = COLLECTED.setdefault(key, {})
+    samples = timing.setdefault(message_type, [])
+    samples.append(sample)
+    del samples[:-MAX_SAMPLES]
+    COLLECTED.move_to_end(key)
+    if len(COLLECTED) > MAX_ROWS:
+        COLLECTED.popitem(last=False)
+
+
+def merged(row, collected: dict) -> dict:
+    """Samples stored on the row, with collected ones appended"""
+    timing = json.loads(row.server_timing) if row.server_timing else {}
+    for message_type, samples in collected.items():
+        kept = timing.setdefault(message_type, [])
+        kept.extend(samples)
+        del kept[:-MAX_SAMPLES]
+    return timing
+
+
+def store(model, player):
+    """Store samples collected for trials/puzzles of a player, a single write per row, on leaving the live page"""
+    if not COLLECTED:
+        return
+    for row in model.filter(player=player):
+        collected = COLLECTED.pop(row_key(row), None)
+        if collected:
+            row.server_timing = json.dumps(merged(row, collected), separators=(',', ':'))
+
+
+def instrument(live_method):
+    """Decorator for live methods to measure processing time of messages"""
+
+    @functools.wraps(live_method)
+    def wrapper(player, message):
+        if not is_enabled():
+            return live_method(player, message)
+
+        profile = Profile()
+        token = _profile.set(profile)
+        try:
+            result = live_method(player, message)
+        finally:
+            _profile.reset(token)
+        sample = profile.finish()
+        if profile.row is not None:
+            collect(profile.row, str(wire.message_type(message)), sample)
+        return result
+
+    return wrapper
+
+
+def percentile(values, p):
+    """Percentile of sorted values, by nearest rank"""
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def summary(rows) -> list:
+    """Percentiles of processing time over samples of rows, stored or still collected
+
+    Return:
+        list of dicts with keys `message`, `phase`, `count`, `p50`, `p90`, `p99`, `max`,
+        for total time and each phase of each message type
+    """
+    collected = {}
+    for row in rows:
+        for message_type, samples in merged(row, COLLECTED.get(row_key(row), {})).items():
+            collected.setdefault(message_type, []).extend(samples)
+
+    result = []
+    for message_type, samples in sorted(collected.items()):
+        for i, name in enumerate(('total',) + PHASES):
+            values = sorted(s[i] for s in samples)
+            stats = dict(message=message_type, phase=name, count=len(values), max=values[-1])
+            for p in PERCENTILES:
+                stats[f"p{p}"] = percentile(values, p)
+            result.append(stats)
+    return result
+
+
+def admin_report(model, subsession) -> dict:
+    """Vars for admin report of an app, for a trial/puzzle model linked to player"""
+    rows = [row for player in subsession.get_players() for row in model.filter(player=player)]
+    return dict(live_timing_enabled=is_enabled(), live_timing=summary(rows))
@@ -0,0 +1,201 @@
+"""Precomputed bank of nonwords matched to source words
+
+The bank is generated offline from a wordlist and saved into a csv file with columns:
+- `word`: source word
+- `nonword`: a mutation of the word, absent from lexicon
+- `length`: number of letters
+- `syllables`: approximate number of syllables, see `nonword_utils.count_syllables`
+- `bigram_freq`: mean frequency of letter bigrams, relative to all bigrams of lexicon
+- `neighbours`: orthographic neighbourhood size, number of lexicon words differing by single letter
+
+For each word, candidates are ranked by closeness of length, syllables and bigram frequency to the source word,
+and the best `per_word` are kept.
+Candidates found in the lexicon, or with no syllables, are dropped at generation,
+so that the bank holds only entries usable as drawn.
+For that the bank should be generated against the full lexicon of the app using it, given by option `--app`.
+
+Generating a bank, from a column of one or more csv files:
+```python -m ldt_core.nonword_bank ldt_core/assets/nonwords.csv target ldt_core/assets/words_top1000.csv --app ldt_core.ldt_app```
+
+Using it:
+    BANK = nonword_bank.load_bank(Path(__file__).parent / "nonwords.csv")
+    nonwords = nonword_bank.sample_nonwords(BANK, words, LEXICON)
+"""
+
+from pathlib import Path
+from collections import Counter
+import argparse
+import importlib
+import random
+import math
+import csv
+import os
+
+from . import nonword_utils, stimuli_utils, lexicon
+
+# number of nonwords to keep per word
+PER_WORD = 5
+# number of mutations to try per word
+CANDIDATES = 50
+
+FIELDS = ['word', 'nonword', 'length', 'syllables', 'bigram_freq', 'neighbours']
+
+# bank generated from `lexicon.TOP_WORDS`, shared by the apps
+TOP_WORDS_BANK = Path(__file__).parent / "assets" / "nonwords.csv"
+
+
+def bigrams(word):
+    return [word[i : i + 2] for i in range(len(word) - 1)]
+
+
+def bigram_table(words):
+    """Relative frequencies of all letter bigrams in words"""
+    counts = Counter(b for w in words for b in bigrams(w))
+    total = sum(counts.values())
+    return {b: c / total for b, c in counts.items()}
+
+
+def bigram_freq(word, table):
+    """Mean frequency of word's bigrams"""
+    grams = bigrams(word)
+    if not grams:
+        return 0.0
+    return sum(table.get(b, 0.0) for b in grams) / len(grams)
+
+
+def neighbour_keys(word):
+    """Patterns matching words differing from the word by a single letter"""
+    return [word[:i] + '?' + word[i + 1 :] for i in range(len(word))]
+
+
+def neighbour_table(words):
+    """Count of words matching each single-letter substitution pattern"""
+    return Counter(k for w in words for k in neighbour_keys(w))
+
+
+def count_neighbours(word, table):
+    """Number of words differing from the (non)word by a single letter"""
+    return sum(table.get(k, 0) for k in neighbour_keys(word))
+
+
+def describe(word, nonword, bigrams_tbl, neighbours_tbl):
+    return dict(
+        word=word,
+        nonword=nonword,
+        length=len(nonword),
+        syllables=nonword_utils.count_syllables(nonword),
+        bigram_freq=round(bigram_freq(nonword, bigrams_tbl), 6),
+        neighbours=count_neighbours(nonword, neighbours_tbl),
+    )
+
+
+def distance(source, candidate):
+    """Ranking key of a candidate nonword against source word properties"""
+    return (
+        abs(candidate['length'] - source['length'])
+        + abs(candidate['syllables'] - source['syllables']),
+        abs(math.log1p(candidate['bigram_freq'] * 1000) - math.log1p(source['bigram_freq'] * 1000)),
+    )
+
+
+def generate_bank(words, known, per_word=PER_WORD, candidates=CANDIDATES):
+    """Generate matched nonwords for each word
+
+    Args:
+        words (list): source words
+        known (set|Lexicon): all known words, in lowercase
+        per_word (int): max number of nonwords to keep for a word
+        candidates (int): number of mutations to try for a word
+
+    Return:
+        list of dicts with fields FIELDS
+    """
+    bigrams_tbl = bigram_table(known)
+    neighbours_tbl = neighbour_table(known)
+
+    bank = []
+    for word in dict.fromkeys(w.lower() for w in words):
+        source = describe(word, word, bigrams_tbl, neighbours_tbl)
+        mutations = {m for m in nonword_utils.mutate_words([word] * candidates) if m not in known}
+        rows = [describe(word, m, bigrams_tbl, neighbours_tbl) for m in sorted(mutations)]
+        rows = [r for r in rows if r['syllables'] > 0]
+        rows.sort(key=lambda r: distance(source, r))
+        bank.extend(rows[:per_word])
+    return bank
+
+
+def save_bank(bank, filepath):
+    with open(filepath, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, FIELDS, dialect='excel')
+        writer.writeheader()
+        writer.writerows(bank)
+
+
+def load_bank(filepath):
+    """Load bank from csv file into a dict of nonwords per word"""
+    rows = []
+    stimuli_utils.load_csv(rows, filepath, FIELDS)
+    bank = {}
+    for row in rows:
+        bank.setdefault(row['word'], []).append(row['nonword'])
+    return bank
+
+
+def sample_nonwords(bank, words, lex):
+    """Pick a random nonword from the bank for each word
+
+    Nonwords of the bank are checked against lexicon, in case it was extended after generating the bank.
+    Words missing in the bank are mutated on the go.
+    """
+    result = [None] * len(words)
+    missing = []
+    for i, word in enumerate(words):
+        choices = [n for n in bank.get(word.lower(), ()) if n not in lex]
+        if choices:
+            result[i] = random.choice(choices)
+        else:
+            missing.append(i)
+    if missing:
+        generated = nonword_utils.generate_nonwords([words[i] for i in missing], lex)
+        for i, nonword in zip(missing, generated):
+            result[i] = nonword
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate bank of nonwords matched to words from csv files")
+    parser.add_argument('output', type=Path, help="csv file to write the bank to")
+    parser.add_argument('field', help="column of the csv files containing words")
+    parser.add_argument('sources', type=Path, nargs='+', help="csv files with words")
+    parser.add_argument('--per-word', type=int, default=PER_WORD, help="number of nonwords per word")
+    parser.add_argument(
+        '--lexicon',
+        type=Path,
+        action='append',
+        default=[],
+        help=f"additional wordlist of known words, default from {lexicon.LEXICON_ENV}",
+    )
+    parser.add_argument('--app', help="module of the app using the bank, to add all words of its `LEXICON`")
+    args = parser.parse_args()
+
+    pool = []
+    for filepath in args.sources:
+        stimuli_utils.load_csv(pool, filepath, [args.field])
+    words = [row[args.field] for row in pool]
+
+    extra = args.lexicon
+    if not extra and os.environ.get(lexicon.LEXICON_ENV):
+        extra = [Path(os.environ[lexicon.LEXICON_ENV])]
+    known = {w.lower() for w in words}
+    for filepath in extra:
+        known.update(lexicon.read_words(filepath))
+    if args.app:
+        known.update(importlib.import_module(args.app).LEXICON)
+
+    bank = generate_bank(words, known, args.per_word)
+    save_bank(bank, args.output)
+    print(f"{len(bank)} nonwords for {len(set(words))} words saved into {args.output}")
+
+
+if __name__ == '__main__':
+    main()
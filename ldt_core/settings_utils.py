@@ -0,0 +1,13 @@
+"""Utils reading project settings, for command line tools run from the project directory"""
+
+
+def app_names():
+    """Apps of all session configs of settings.py, in order of appearance"""
+    import settings
+
+    names = []
+    for config in settings.SESSION_CONFIGS:
+        for app in config['app_sequence']:
+            if app not in names:
+                names.append(app)
+    return names
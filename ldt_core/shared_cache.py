@@ -0,0 +1,127 @@
+"""Cache of precomputed data shared by server processes
+
+Stimulus pools, precomputed blocks and similar data are built once per process and kept in module variables.
+With several worker processes (see `prodserver/`) each of them would build the same data again,
+and data built for a session in one process would be rebuilt by another when a participant's request lands there.
+
+The cache keeps pickled values in files of a directory set by environment variable `LDT_SHARED_CACHE`.
+A value is built by the first process needing it, under a file lock, so that other processes wait and load it
+instead of building it too. The files are written to temporary ones and replaced,
+so that concurrent processes never see partial values, and are read through memory mapping.
+Each process also keeps loaded values in memory, so a file is read once per process.
+
+Without `LDT_SHARED_CACHE` values are kept only in memory of the process, as with a single server process.
+
+The keys should identify the data they are built from, e.g. session code, or signature of source files,
+since the cache is kept until the directory is cleared (which the `prodserver` does on start).
+
+Example:
+    def get_strata(bands):
+        key = tuple(sorted(bands.items()))
+        return shared_cache.get('strata', key, lambda: strata_utils.Strata(POOL, 't_freq', bands))
+"""
+
+from pathlib import Path
+import os
+import mmap
+import pickle
+import hashlib
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # windows, without locking
+    fcntl = None
+
+# environment variable with path to directory of the cache
+CACHE_ENV = 'LDT_SHARED_CACHE'
+
+# values loaded or built by this process, by (namespace, key)
+LOCAL = {}
+
+
+def cache_dir():
+    """Directory of the shared cache, or None if it is not configured"""
+    path = os.environ.get(CACHE_ENV)
+    return Path(path) if path else None
+
+
+def entry_path(directory, namespace, key):
+    digest = hashlib.md5(repr(key).encode()).hexdigest()
+    return Path(directory) / f"{namespace}-{digest}.pickle"
+
+
+def read_entry(filepath):
+    """Load pickled value from a file, or raise OSError if missing"""
+    with open(filepath, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return pickle.loads(data)
+
+
+def write_entry(filepath, value):
+    filepath = Path(filepath)
+    fd, tmppath = tempfile.mkstemp(dir=filepath.parent, prefix=filepath.name)
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmppath, filepath)
+
+
+def load_or_build(filepath, build):
+    """Load value from a file, or build and store it, holding a lock for the time of building"""
+    try:
+        return read_entry(filepath)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        pass
+
+    with open(f"{filepath}.lock", 'wb') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        # another process might have built it while waiting for the lock
+        try:
+            return read_entry(filepath)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            pass
+        value = build()
+        write_entry(filepath, value)
+        return value
+
+
+def get(namespace: str, key, build):
+    """Get a value, building it once for all processes
+
+    Args:
+        namespace (str): kind of values, used in names of files
+        key: hashable value identifying the value, its repr is used in shared cache
+        build: function to build the value if it is not cached yet
+    """
+    if (namespace, key) in LOCAL:
+        return LOCAL[namespace, key]
+    directory = cache_dir()
+    if directory is None:
+        value = build()
+    else:
+        directory.mkdir(parents=True, exist_ok=True)
+        value = load_or_build(entry_path(directory, namespace, key), build)
+    LOCAL[namespace, key] = value
+    return value
+
+
+def files_signature(paths):
+    """Digest of files' paths, sizes and modification times, to use in keys of values built from them"""
+    digest = hashlib.md5()
+    for filepath in paths:
+        stat = os.stat(filepath)
+        digest.update(f"{Path(filepath).resolve()}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def clear(directory=None):
+    """Remove all values from shared cache and from memory of this process"""
+    LOCAL.clear()
+    directory = Path(directory) if directory else cache_dir()
+    if directory is None or not directory.exists():
+        return
+    for filepath in directory.iterdir():
+        # entries, their locks, and temporary files left by killed processes
+        if '.pickle' in filepath.name:
+            filepath.unlink(missing_ok=True)
@@ -0,0 +1,97 @@
+"""Sampling of stimuli balanced by frequency (or any other numeric field) bands
+
+The pool is sorted by frequency once, and each band is a contiguous range of the sorted pool,
+so that drawing a balanced set takes only sampling of indexes within ranges.
+
+Bands are defined by their minimal frequency, a word belongs to the band with highest minimum not exceeding word's frequency.
+Words with frequency below all the minimums are not used.
+
+Example:
+    STRATA = Strata(POOL, 't_freq', {'high': 2e-4, 'medium': 1e-4, 'low': 0})
+    for row, band in STRATA.sample(10):
+        ...
+"""
+
+from bisect import bisect_left
+import random
+
+
+class Strata:
+    """Pool of stimuli indexed by frequency bands
+
+    Args:
+        pool (list of dicts): stimuli
+        field (str): field of stimuli containing frequency
+        bands (dict): mapping of band names to minimal frequencies, or None for single band named None
+    """
+
+    def __init__(self, pool, field, bands=None):
+        if not bands:
+            bands = {None: float('-inf')}
+
+        self.rows = sorted(pool, key=lambda r: float(r[field]))
+        freqs = [float(r[field]) for r in self.rows]
+
+        self.ranges = {}
+        hi = len(freqs)
+        for name, minimum in sorted(bands.items(), key=lambda b: b[1], reverse=True):
+            lo = bisect_left(freqs, minimum)
+            self.ranges[name] = range(lo, hi)
+            hi = lo
+
+    def __len__(self):
+        return sum(len(r) for r in self.ranges.values())
+
+    def sizes(self):
+        """Number of stimuli in each band"""
+        return {name: len(r) for name, r in self.ranges.items()}
+
+    def allocate(self, count):
+        """Split count evenly between bands, giving remainder to random bands"""
+        names = list(self.ranges)
+        quota = dict.fromkeys(names, count // len(names))
+        for name in random.sample(names, count % len(names)):
+            quota[name] += 1
+        return quota
+
+    def draw(self, indexes, k, key, seen):
+        """Draw up to k random rows from a range of indexes, skipping rows with seen keys"""
+        if key is None:
+            return [self.rows[i] for i in random.sample(indexes, min(k, len(indexes)))]
+
+        drawn = []
+        # try small oversample first, then the whole range
+        for size in (min(len(indexes), 2 * k), len(indexes)):
+            drawn, keys = [], set()
+            for i in random.sample(indexes, size):
+                if len(drawn) == k:
+                    break
+                value = key(self.rows[i])
+                if value in seen or value in keys:
+                    continue
+                drawn.append(self.rows[i])
+                keys.add(value)
+            if len(drawn) == k:
+                break
+        seen.update(keys)
+        return drawn
+
+    def sample(self, count, key=None):
+        """Draw `count` non-repeating stimuli, balanced by bands, in random order
+
+        Args:
+            count (int): number of stimuli
+            key (callable): function of a stimulus, to draw only stimuli with distinct values of it
+
+        Return:
+            list of tuples (row, band)
+        """
+        sampled = []
+        seen = set()
+        for name, k in self.allocate(count).items():
+            drawn = self.draw(self.ranges[name], k, key, seen)
+            if len(drawn) < k:
+                raise RuntimeError(f"Insufficient stimuli in band '{name}' for {count} iterations")
+            sampled.extend((row, name) for row in drawn)
+        random.shuffle(sampled)
+        return sampled
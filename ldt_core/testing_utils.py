@@ -1,12 +1,13 @@
 from contextlib import contextmanager
-import time
 import random
 
 from otree.api import expect
 
+from ldt_core import clock
+
 
 def sleep(time_ms):
-    time.sleep(time_ms / 1000)
+    clock.sleep(time_ms / 1000)
 
 
 def get_trial(Trial, p):  # noqa
@@ -30,7 +31,7 @@ def send(m, p, tp, **values):
 
 
 def send_slow(m, p, tp, slowdown=0.5, **values):
-    time.sleep(slowdown)
+    clock.sleep(slowdown)
     return send(m, p, tp, **values)
 
 
@@ -69,6 +70,7 @@ def expect_new(trial, last):
     expect(trial.id, '!=', last.id)
     expect(trial.iteration, last.iteration + 1)
     expect(trial.server_loaded_timestamp, '>', last.server_loaded_timestamp)
+    expect(trial.server_loaded_mono, '>', last.server_loaded_mono)
 
 
 def expect_answered(z, response):
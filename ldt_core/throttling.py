@@ -0,0 +1,63 @@
+"""Rate limiting of live messages per player, by token bucket
+
+Each player has a bucket of `burst` tokens, refilled at `rate` tokens per second.
+Each message takes a token, and a message finding the bucket empty is rejected
+before the live method makes any database queries.
+So a client flooding the server gets at most `rate` messages per second processed, after an initial burst.
+
+The buckets are kept in memory of the server process, not in the database,
+so that tokens taken by messages that fail later are not returned by rollback of their transaction.
+With several server processes each of them limits the messages it receives.
+
+Example:
+    def play_game(player, message):
+        params = player.session.params
+        if not throttling.take(player, params['rate_limit'], params['rate_burst']):
+            raise RuntimeError("too many messages")
+"""
+
+from collections import OrderedDict
+
+from . import clock
+
+# max number of buckets kept, of most recently active players
+MAX_BUCKETS = 10000
+
+# (tokens, monotonic clock reading of last update) by player
+BUCKETS = OrderedDict()
+
+
+def bucket_key(player):
+    return type(player).__module__, player.id
+
+
+def available(player, rate, burst, now: clock.Reading = None) -> float:
+    """Number of tokens in player's bucket at the moment"""
+    now = now or clock.now()
+    tokens, mono = BUCKETS.get(bucket_key(player), (burst, now.mono))
+    return min(burst, tokens + max(0.0, now.mono - mono) * rate)
+
+
+def take(player, rate, burst, now: clock.Reading = None) -> bool:
+    """Take a token from player's bucket
+
+    Args:
+        rate (float): tokens added per second, `0` or None to not limit
+        burst (int): capacity of the bucket
+
+    Return:
+        if there was a token
+    """
+    if not rate:
+        return True
+    now = now or clock.now()
+    key = bucket_key(player)
+    tokens = available(player, rate, burst, now)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    BUCKETS[key] = (tokens, now.mono)
+    BUCKETS.move_to_end(key)
+    if len(BUCKETS) > MAX_BUCKETS:
+        BUCKETS.popitem(last=False)
+    return allowed
@@ -0,0 +1,193 @@
+"""Compact wire schema of live messages
+
+Messages of live pages are small dicts, sent many times per trial, and most of their bytes are keys and type names.
+In compact form keys are replaced with short ones (`KEYS`), and message type with its integer code (`TYPES`).
+Keys are replaced in the message itself and in the records nested in known fields (`RECORDS`, `RECORD_LISTS`,
+`RECORD_MAPS`), while any other values, like maps of stimuli or slider values, are passed as is.
+The `progress`, included in each response, carries only the values changed by the message.
+
+The schema is negotiated per page: the client requests it in the page load message,
+and if the server supports the same version, it replies in compact form, and the client switches to it.
+A client not requesting it, like bots or older pages, gets all the messages in full form.
+```
+receive: {'type': 'load', 'schema': 3}
+respond: {'t': 1, 'p': {'N': 10, 'n': 0}}
+receive: {'t': 6}
+respond: {'t': 7, 'tr': {'s': {'t': 'image-url', 'u': '/static/images/emoji_u1f600.png'}}}
+receive: {'t': 9, 'r': 'left', 'rt': 532, 'tt': 580}
+respond: {'t': 11, 'c': True, 'f': True, 'r': 'left', 'p': {'n': 1}}
+```
+
+The client does the same translation with the tables passed in js_vars, see `_static/live/wire.js`.
+Codes are positions in the lists, so new keys and types should be appended, and the `SCHEMA` version bumped.
+
+Example:
+    def play_game(player, message):
+        message, compact = wire.receive(message)
+        before = get_progress(player)
+        ...
+        reply = dict(type='feedback', progress=get_progress(player), ...)
+        if compact:
+            reply = wire.compact(reply, before)
+        return {player.id_in_group: reply}
+"""
+
+SCHEMA = 3
+
+KEYS = {
+    'type': 't',
+    'schema': 'sc',
+    'progress': 'p',
+    'total': 'N',
+    'completed': 'n',
+    'iteration': 'i',
+    'trial': 'tr',
+    'trials': 'ts',
+    'stimulus': 's',
+    'target': 'g',
+    'prime': 'm',
+    'text': 'x',
+    'url': 'u',
+    'data': 'd',
+    'response': 'r',
+    'reaction_time': 'rt',
+    'total_time': 'tt',
+    'is_correct': 'c',
+    'is_final': 'f',
+    'game_over': 'go',
+    'timed_out': 'to',
+    'time': 'tm',
+    'failed': 'fl',
+    'first': 'fs',
+    'rtt': 'rr',
+    'offset': 'o',
+    'puzzle': 'z',
+    'image': 'im',
+    'size': 'sz',
+    'grid': 'gr',
+    'values': 'vs',
+    'correct': 'cs',
+    'slider': 'sl',
+    'value': 'v',
+    'is_completed': 'cc',
+    'solved': 'sv',
+    'version': 'vr',
+}
+
+TYPES = [
+    'load',
+    'status',
+    'prefetched',
+    'ping',
+    'pong',
+    'calibrated',
+    'new',
+    'trial',
+    'trials',
+    'response',
+    'timeout',
+    'feedback',
+    'puzzle',
+    'value',
+]
+
+# fields holding a record
+RECORDS = {'progress', 'trial', 'stimulus', 'target', 'prime', 'puzzle'}
+# fields holding a list of records
+RECORD_LISTS = {'trials'}
+# fields holding a map of ids to records
+RECORD_MAPS = {'sliders'}
+
+LONG_KEYS = {short: key for key, short in KEYS.items()}
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+
+
+def rename(record: dict, keys: dict, names: dict) -> dict:
+    """Replace keys of a record, and of records nested in known fields
+
+    Args:
+        keys: replacements of keys
+        names: full names of the keys, to recognize the known fields
+    """
+
+    def nested(value):
+        return rename(value, keys, names) if isinstance(value, dict) else value
+
+    renamed = {}
+    for k, v in record.items():
+        name = names.get(k, k)
+        if name in RECORDS:
+            v = nested(v)
+        elif name in RECORD_LISTS and isinstance(v, list):
+            v = [nested(r) for r in v]
+        elif name in RECORD_MAPS and isinstance(v, dict):
+            v = {i: nested(r) for i, r in v.items()}
+        renamed[keys.get(k, k)] = v
+    return renamed
+
+
+def is_compact(message) -> bool:
+    return isinstance(message, dict) and KEYS['type'] in message
+
+
+def receive(message):
+    """Expand incoming message if it is in compact form
+
+    Return:
+        (message in full form, if the response should be compact)
+    """
+    if not is_compact(message):
+        requested = isinstance(message, dict) and message.get('type') == 'load' and message.get('schema') == SCHEMA
+        return message, requested
+    return expand(message), True
+
+
+def expand(message: dict) -> dict:
+    """Convert message from compact form"""
+    expanded = rename(message, LONG_KEYS, LONG_KEYS)
+    code = expanded['type']
+    if type(code) is int:
+        if not 0 <= code < len(TYPES):
+            raise ValueError("invalid message type")
+        expanded['type'] = TYPES[code]
+    return expanded
+
+
+def compact(message: dict, progress: dict = None) -> dict:
+    """Convert message to compact form
+
+    Args:
+        message: message in full form
+        progress: progress known to client before the message, to send only changes of it,
+            or None to send it all
+    """
+    message = dict(message)
+    if progress is not None and 'progress' in message:
+        changes = {k: v for k, v in message['progress'].items() if progress.get(k) != v}
+        if changes:
+            message['progress'] = changes
+        else:
+            del message['progress']
+    compacted = rename(message, KEYS, {})
+    compacted[KEYS['type']] = TYPE_CODES.get(message['type'], message['type'])
+    return compacted
+
+
+def message_type(message):
+    """Type name of a message in any form, or None"""
+    if is_compact(message):
+        code = message[KEYS['type']]
+        return TYPES[code] if type(code) is int and 0 <= code < len(TYPES) else code
+    return message.get('type') if isinstance(message, dict) else None
+
+
+def js_vars() -> dict:
+    """Tables for the client, to pass in js_vars as `wire`"""
+    return dict(
+        schema=SCHEMA,
+        keys=KEYS,
+        types=TYPES,
+        records=sorted(RECORDS),
+        record_lists=sorted(RECORD_LISTS),
+        record_maps=sorted(RECORD_MAPS),
+    )
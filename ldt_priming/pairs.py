@@ -0,0 +1,66 @@
+"""Index of prime/target pairs from free association norms
+
+Pairs are loaded from csv files with columns CUE, TARGET, FSG (forward strength),
+parsed once and indexed by cue and by target.
+
+Pairs with zero strength are normed but unrelated.
+Unrelated primes can also be made by re-pairing a target with a random cue not associated with it.
+"""
+
+import random
+
+from ldt_core import stimuli_utils
+
+# attempts to pick unrelated cue for a target before giving up
+MAX_ATTEMPTS = 100
+
+
+class Pairs:
+    """Prime/target pairs indexed by cue and by target
+
+    Attributes:
+        pairs (list of dicts): all pairs as dicts with fields `cue`, `target`, `strength`
+        by_cue (dict): mapping of cue to mapping of its targets to strength
+        by_target (dict): mapping of target to mapping of its cues to strength
+        cues (list): all cues
+    """
+
+    def __init__(self):
+        self.pairs = []
+        self.by_cue = {}
+        self.by_target = {}
+        self.cues = []
+
+    def add(self, cue, target, strength):
+        if target in self.by_cue.get(cue, {}):
+            return
+        if cue not in self.by_cue:
+            self.cues.append(cue)
+        self.pairs.append(dict(cue=cue, target=target, strength=strength))
+        self.by_cue.setdefault(cue, {})[target] = strength
+        self.by_target.setdefault(target, {})[cue] = strength
+
+    def load_csv(self, filepath):
+        rows = []
+        stimuli_utils.load_csv(rows, filepath, ['CUE', 'TARGET', 'FSG'])
+        for row in rows:
+            self.add(row['CUE'], row['TARGET'], float(row['FSG']))
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def strength(self, cue, target):
+        """Forward strength of a pair, 0 for pairs not in the norms"""
+        return self.by_cue.get(cue, {}).get(target, 0.0)
+
+    def is_related(self, cue, target):
+        """Check if words are associated in any direction"""
+        return self.strength(cue, target) > 0 or self.strength(target, cue) > 0
+
+    def unrelated_cue(self, target):
+        """Pick a random cue not associated with the target"""
+        for _ in range(MAX_ATTEMPTS):
+            cue = random.choice(self.cues)
+            if cue != target and not self.is_related(cue, target):
+                return cue
+        raise RuntimeError(f"failed to find unrelated cue for '{target}'")
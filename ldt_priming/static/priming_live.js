@@ -6,6 +6,8 @@ class Model {
         this.stimuli_slots = ['target', 'prime'];
         this.reset();
         this.progress = null;
+        // trials received in advance, in batch mode
+        this.queue = [];
     }
 
     reset() {
@@ -18,6 +20,7 @@ class Model {
     }
 
     setTrial(data) {
+        this.iteration = data.iteration;
         this.stimuli.target = data.target;
         this.stimuli.prime = data.prime;
     }
@@ -194,6 +197,9 @@ class View {
     }
 }
 
+/** longest wait for a burst of calibration pings to complete, after which it is abandoned (ms) */
+const CALIBRATION_TIMEOUT = 3000;
+
 /** the Controller
  * implements main workflow
  * handles messages from server and user interactions
@@ -205,8 +211,11 @@ class Controller {
 
         this.starting = true;
         this.frozen = false;
+        // resolving function of the calibration burst in progress
+        this.calibrating = null;
 
-        window.liveRecv = (message) => this.onMessage(message);
+        this.wire = new Wire(WIRE);
+        window.liveRecv = (message) => this.onMessage(this.wire.decode(message));
         document.querySelector('body').addEventListener('keydown', (e) => this.onKey(e));
         document.querySelectorAll('.touch-spot').forEach((t) => t.addEventListener('touchstart', (e) => this.onTouch(e)));
 
@@ -230,11 +239,31 @@ class Controller {
         document.getElementById("form").submit();
     }
 
+    calibrate() {
+        /** start a burst of pings, to estimate network roundtrip time and clock offset
+         * resolves when the server replies with calibration, or after CALIBRATION_TIMEOUT, abandoning the burst
+         */
+        if (!PARAMS.calibration_pings) return Promise.resolve();
+        this.sendMessage('ping', {time: performance.timeOrigin + performance.now(), first: true});
+        return new Promise((resolve) => {
+            let done = () => {
+                if (this.calibrating === done) this.calibrating = null;
+                resolve();
+            };
+            this.calibrating = done;
+            setTimeout(done, CALIBRATION_TIMEOUT);
+        });
+    }
+
     continueGame() {
         this.model.reset();
         this.view.reset();
 
-        this.sendMessage('new');
+        if (this.model.queue.length) {  // batch mode, the trial is already received
+            this.onTrial({trial: this.model.queue.shift()});
+        } else {
+            this.sendMessage('new');
+        }
     }
 
     async displayTrial() {
@@ -282,14 +311,14 @@ class Controller {
 
     sendMessage(type, data) {
         console.debug("sending:", type, data);
-        liveSend(Object.assign({type: type}, data));
+        liveSend(this.wire.encode(Object.assign({type: type}, data)));
     }
 
     onMessage(message) {
         console.debug("received:", message);
 
-        if (message.progress)
-            this.model.progress = message.progress;
+        if (message.progress)  // in compact schema, only changed values
+            this.model.progress = Object.assign({}, this.model.progress, message.progress);
 
         switch(message.type) {
             case 'status':
@@ -299,14 +328,32 @@ class Controller {
                     this.endGame();
                 } else { // start of the game
                     this.starting = true;
+                    this.calibrate();
                 }
                 break;
 
+            case 'pong':
+                if (this.calibrating)
+                    this.sendMessage('ping', {time: performance.timeOrigin + performance.now()});
+                break;
+
+            case 'calibrated':
+                if (this.calibrating)
+                    this.calibrating();
+                break;
+
             case 'trial':
                 this.onTrial(message);
                 break;
 
+            case 'trials':
+                this.model.queue = message.trials;
+                this.continueGame();
+                break;
+
             case 'feedback':
+                if (message.trials)
+                    this.model.queue.push(...message.trials);
                 this.onFeedback(message);
                 break;
 
@@ -349,6 +396,7 @@ class Controller {
 
     onResponse(response) {
         performance.mark("responded");
+        this.responded = performance.now();
         timers.clear();
         this.freezeInputs();
 
@@ -360,6 +408,7 @@ class Controller {
         let loading_measure = performance.getEntriesByName("loading")[0];
         let reaction_measure = performance.getEntriesByName("reaction")[0];
         this.sendMessage('response', {
+            iteration: this.model.iteration,
             response: this.model.response,
             reaction_time: reaction_measure.duration,
             total_time: loading_measure.duration,
@@ -367,9 +416,10 @@ class Controller {
     }
 
     onTimeout() {
+        this.responded = performance.now();
         timers.clear();
         this.freezeInputs();
-        this.sendMessage('timeout');
+        this.sendMessage('timeout', {iteration: this.model.iteration});
     }
 
     onFeedback(feedback) {
@@ -381,7 +431,20 @@ class Controller {
 
         if (feedback.is_final) {
             this.view.renderProgress();
-            timers.delay(PARAMS.inter_trial_time, () => this.continueGame(), "advancing");
+            let calibrated = Promise.resolve();
+            if (PARAMS.calibration_period && this.model.progress.completed % PARAMS.calibration_period == 0) {
+                // between trials, and the next one waits for the burst, not to interfere with stimulus presentation
+                calibrated = this.calibrate();
+            }
+            let delay = PARAMS.inter_trial_time;
+            if (PARAMS.batch_size > 1) {
+                // counting since the response, to exclude network roundtrip
+                delay = Math.max(0, delay - (performance.now() - this.responded));
+            }
+            timers.delay(delay, async () => {
+                await calibrated;
+                this.continueGame();
+            }, "advancing");
             return;
         }
 
@@ -0,0 +1,49 @@
+from otree.api import *
+
+from generic.testing_utils import *
+from . import Trial, Intro, Main, Results
+
+
+class PlayerBot(Bot):
+    cases = [
+        "generating_unrelated",
+    ]
+
+    def play_round(self):
+        print(f"Playing test case: {self.case}")
+        yield Submission(Intro, check_html=False)
+        yield Submission(Main, check_html=False)
+        yield Submission(Results, check_html=False)
+
+
+def call_live_method(method, group, case, **kwargs):  # noqa
+    print(f"Playing live case: {case}")
+
+    testname = f"live_test_{case}"
+    try:
+        test = globals()[testname]
+    except KeyError:
+        raise NotImplementedError(f"Test {testname} not implemented")
+
+    test(method, group.get_players()[0], group.session.params)
+
+
+def strength_band(strength, bands):
+    """Band with highest minimum not exceeding the strength"""
+    return max((b for b in bands.items() if b[1] <= strength), key=lambda b: b[1])[0]
+
+
+def live_test_generating_unrelated(m, p, conf):  # noqa
+    """trials with prime replaced by an unrelated cue have no band, others have the band of their strength"""
+    trials = Trial.filter(player=p)
+    expect(len(trials), conf['num_iterations'])
+
+    for z in trials:
+        if z.band is None:
+            expect_attrs(z, is_related=False, strength=0.0)
+        else:
+            expect(z.band, strength_band(z.strength, conf['strength_bands']))
+
+    # half of the trials are re-paired, so all drawn from one band is about impossible
+    expect(None, 'in', [z.band for z in trials])
+    expect('related', 'in', [z.band for z in trials])
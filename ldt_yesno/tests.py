@@ -0,0 +1,61 @@
+from otree.api import *
+
+from generic.testing_utils import *
+from . import Trial, Intro, Main, Results
+
+
+class PlayerBot(Bot):
+    cases = [
+        "reloading_timeout",
+    ]
+
+    def play_round(self):
+        print(f"Playing test case: {self.case}")
+        yield Submission(Intro, check_html=False)
+        yield Submission(Main, check_html=False)
+        yield Submission(Results, check_html=False)
+
+
+def call_live_method(method, group, case, **kwargs):  # noqa
+    print(f"Playing live case: {case}")
+
+    testname = f"live_test_{case}"
+    try:
+        test = globals()[testname]
+    except KeyError:
+        raise NotImplementedError(f"Test {testname} not implemented")
+
+    test(method, group.get_players()[0], group.session.params)
+
+
+def live_test_reloading_timeout(m, p, conf):  # noqa
+    """timed out trials have no response in this app, and still count after reload"""
+    send(m, p, 'load')
+    send(m, p, 'new')
+    z = get_trial(Trial, p)
+
+    sleep(conf['auto_response_time'])
+    r = send(m, p, 'timeout')
+    expect_fields(r, type='feedback', is_correct=False, is_final=True, response=None)
+    expect_attrs(z, response=None, is_timeout=True)
+    expect_attrs(p, num_trials=1, num_solved=0, num_failed=1)
+
+    # a weird repeated timeout replaces the previous one
+    send(m, p, 'timeout')
+    expect_attrs(p, num_trials=1, num_solved=0, num_failed=1)
+
+    # reload recounts the stats
+    r = send(m, p, 'load')
+    expect(r['progress']['completed'], 1)
+    expect_attrs(p, num_trials=1, num_solved=0, num_failed=1)
+
+    sleep(conf['inter_trial_time'])
+    send(m, p, 'new')
+    z = get_trial(Trial, p)
+    sleep(conf['input_freezing_time'])
+    send(m, p, 'response', response=get_correct_response(z), reaction_time=500)
+    expect_attrs(p, num_trials=2, num_solved=1, num_failed=1)
+
+    r = send(m, p, 'load')
+    expect(r['progress']['completed'], 2)
+    expect_attrs(p, num_trials=2, num_solved=1, num_failed=1)
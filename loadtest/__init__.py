@@ -0,0 +1,148 @@
+"""Load testing of live pages, with many concurrent simulated participants
+
+The harness creates a session on a running server via REST API,
+and runs a client for each participant: it navigates pages over http like a browser,
+and on live pages replays the apps' message protocol over websocket, with realistic think times.
+
+Every message waiting for a reply is timed from sending to receiving the reply.
+Messages with no reply in time, or failed connections, are counted as errors.
+
+Run a server and the load from the project directory:
+```
+otree prodserver 8000
+python -m loadtest --config generic --participants 200 --ramp 30 --server-pid <pid of server>
+```
+The server cpu includes all processes started by the server, like workers of `python -m prodserver`.
+To measure how throughput scales with the number of workers, see `loadtest/scaling.py`.
+
+For the REST API to work under OTREE_AUTH_LEVEL, set the same OTREE_REST_KEY for the server and the harness.
+
+Requires packages `requests` and `websockets`, see requirements.devel.txt.
+"""
+
+import os
+import time
+
+# clock ticks per second, for cpu times from /proc
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, p):
+    """Percentile of sorted values, by nearest rank"""
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+class Stats:
+    """Latencies and errors per message type"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.started = time.monotonic()
+        self.finished = None
+
+    def record(self, message_type, seconds):
+        self.latencies.setdefault(message_type, []).append(seconds)
+
+    def error(self, message_type):
+        self.errors[message_type] = self.errors.get(message_type, 0) + 1
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    @property
+    def duration(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def report(self):
+        """Print table of message types"""
+        header = f"{'message':<16} {'count':>8} {'errors':>8} {'err_rate':>8}"
+        header += "".join(f" {'p' + str(p):>8}" for p in PERCENTILES) + f" {'max':>8}"
+        print(header)
+        total, total_errors = 0, 0
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(name, []))
+            errors = self.errors.get(name, 0)
+            total += len(values)
+            total_errors += errors
+            line = f"{name:<16} {len(values):8d} {errors:8d} {error_rate(errors, len(values)):8.2%}"
+            for p in PERCENTILES:
+                line += f" {percentile(values, p) * 1000:8.1f}" if values else f" {'-':>8}"
+            line += f" {values[-1] * 1000:8.1f}" if values else f" {'-':>8}"
+            print(line)
+        print(f"{'total':<16} {total:8d} {total_errors:8d} {error_rate(total_errors, total):8.2%}")
+        print("latencies in ms")
+        print(f"throughput: {total / self.duration:.1f} messages/s in {self.duration:.1f} s")
+
+
+def error_rate(errors, successes):
+    attempts = errors + successes
+    return errors / attempts if attempts else 0.0
+
+
+def read_stat(pid):
+    """Fields of /proc/<pid>/stat after the command, counting from field 3 (state), or None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+
+
+def process_tree(pid):
+    """Pids of a process and all its running descendants"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            fields = read_stat(entry)
+            if fields:
+                parents[int(entry)] = int(fields[1])
+    tree = [pid]
+    for p in tree:
+        tree.extend(child for child, parent in parents.items() if parent == p)
+    return tree
+
+
+def process_cpu_time(pid):
+    """Cpu time used by a process and its children, running or finished, in seconds, or None if unavailable
+
+    Reads /proc, so works on Linux only.
+    """
+    fields = read_stat(pid)
+    if fields is None:
+        return None
+    # utime, stime, cutime, cstime of the process
+    total = sum(int(v) for v in fields[11:15])
+    # utime, stime of running descendants
+    for child in process_tree(pid)[1:]:
+        child_fields = read_stat(child)
+        if child_fields:
+            total += sum(int(v) for v in child_fields[11:13])
+    return total / CLK_TCK
+
+
+class CpuMeter:
+    """Cpu usage of the server process and of the harness itself, over the load run"""
+
+    def __init__(self, pid=None):
+        self.pid = pid
+        self.server_start = process_cpu_time(pid) if pid else None
+        self.client_start = time.process_time()
+        self.wall_start = time.monotonic()
+
+    def usage(self):
+        """Cpu used by the harness and by the server, in cores, the latter None if unavailable"""
+        wall = time.monotonic() - self.wall_start
+        client = (time.process_time() - self.client_start) / wall
+        server = process_cpu_time(self.pid) if self.server_start is not None else None
+        if server is not None:
+            server = (server - self.server_start) / wall
+        return client, server
+
+    def report(self):
+        client, server = self.usage()
+        print(f"harness cpu: {client:.0%} of a core")
+        if server is not None:
+            print(f"server cpu: {server:.0%} of a core")
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import os
+import traceback
+
+from . import Stats, CpuMeter
+from .client import Participant, create_session
+from .scenarios import SCENARIOS
+
+# max number of non-live pages to click through before a live page
+MAX_INTRO_PAGES = 5
+
+
+async def run_participant(p: Participant, delay: float):
+    await asyncio.sleep(delay)
+    try:
+        await p.start()
+        for _ in range(MAX_INTRO_PAGES):
+            if p.page.live_url:
+                break
+            await p.submit()
+
+        while p.page.live_url:
+            scenario = SCENARIOS.get(p.page.app)
+            if scenario is None:
+                raise RuntimeError(f"no scenario for live page of app '{p.page.app}'")
+            await p.connect()
+            try:
+                completed = await scenario(p)
+            finally:
+                await p.disconnect()
+            if not completed:
+                break
+            await p.submit()
+    except Exception:
+        p.stats.error('(participant)')
+        traceback.print_exc()
+
+
+async def run(args):
+    codes = await asyncio.to_thread(
+        create_session, args.server, args.config, args.participants, os.environ.get('OTREE_REST_KEY')
+    )
+    print(f"session created with {len(codes)} participants")
+
+    stats = Stats()
+    cpu = CpuMeter(args.server_pid)
+    participants = [
+        Participant(args.server, code, stats, args.speed, args.timeout, args.iterations) for code in codes
+    ]
+    await asyncio.gather(
+        *[run_participant(p, args.ramp * i / len(participants)) for i, p in enumerate(participants)]
+    )
+    stats.finish()
+    stats.report()
+    cpu.report()
+    return stats, cpu
+
+
+def make_parser(description="Load testing of live pages with simulated participants"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--server', default="http://localhost:8000", help="base url of running server")
+    parser.add_argument('--config', required=True, help="name of session config")
+    parser.add_argument('--participants', type=int, default=100, help="number of concurrent participants")
+    parser.add_argument('--ramp', type=float, default=10.0, help="seconds to spread starts of participants over")
+    parser.add_argument('--speed', type=float, default=1.0, help="factor to speed up think times of participants")
+    parser.add_argument('--iterations', type=int, default=10, help="max number of trials per live page")
+    parser.add_argument('--timeout', type=float, default=10.0, help="seconds to wait for a reply")
+    parser.add_argument('--server-pid', type=int, help="pid of server process, to measure its cpu usage")
+    return parser
+
+
+def main():
+    asyncio.run(run(make_parser().parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Simulated participant: pages navigation over http, live messaging over websocket"""
+
+from urllib.parse import urlsplit
+import asyncio
+import html
+import json
+import random
+import time
+import re
+
+import requests
+import websockets
+
+JS_VARS_re = re.compile(r'var js_vars = (.*?);</script>', re.S)
+LIVE_URL_re = re.compile(r'data-socket-url="(/live\?[^"]+)"')
+PAGE_URL_re = re.compile(r'/p/\w+/(\w+)/(\w+)/\d+')
+
+REST_KEY_HEADER = 'otree-rest-key'
+
+
+def create_session(server, config, num_participants, rest_key=None):
+    """Create session via REST API, returning codes of participants"""
+    headers = {REST_KEY_HEADER: rest_key} if rest_key else {}
+    resp = requests.post(
+        f"{server}/api/sessions",
+        json=dict(session_config_name=config, num_participants=num_participants),
+        headers=headers,
+    )
+    resp.raise_for_status()
+    code = resp.json()['code']
+    resp = requests.get(f"{server}/api/sessions/{code}", headers=headers)
+    resp.raise_for_status()
+    return [p['code'] for p in resp.json()['participants']]
+
+
+class Page:
+    """A page loaded by participant"""
+
+    def __init__(self, resp):
+        self.url = resp.url
+        match = PAGE_URL_re.search(urlsplit(resp.url).path)
+        self.app, self.name = match.groups() if match else (None, None)
+        match = JS_VARS_re.search(resp.text)
+        self.js_vars = json.loads(match.group(1)) if match else {}
+        match = LIVE_URL_re.search(resp.text)
+        self.live_url = html.unescape(match.group(1)) if match else None
+
+
+class Participant:
+    """A simulated participant
+
+    Args:
+        server (str): base url of server
+        code (str): participant code
+        stats (Stats): collector of timings
+        speed (float): factor to speed up think times
+        timeout (float): max time to wait for a reply, in seconds
+        iterations (int): max number of trials to play on a live page
+    """
+
+    def __init__(self, server, code, stats, speed=1.0, timeout=10.0, iterations=10):
+        self.server = server
+        self.code = code
+        self.stats = stats
+        self.speed = speed
+        self.timeout = timeout
+        self.iterations = iterations
+        self.http = requests.Session()
+        self.page = None
+        self.socket = None
+
+    async def start(self):
+        resp = await asyncio.to_thread(self.http.get, f"{self.server}/InitializeParticipant/{self.code}")
+        resp.raise_for_status()
+        self.page = Page(resp)
+
+    async def submit(self):
+        """Submit current page and load next one"""
+        resp = await asyncio.to_thread(self.http.post, self.page.url)
+        resp.raise_for_status()
+        self.page = Page(resp)
+
+    async def connect(self):
+        url = urlsplit(self.server)._replace(scheme='wss' if self.server.startswith('https') else 'ws')
+        self.socket = await websockets.connect(url.geturl() + self.page.live_url)
+
+    async def disconnect(self):
+        if self.socket is not None:
+            await self.socket.close()
+            self.socket = None
+
+    async def send(self, msgtype, reply=True, **fields):
+        """Send a live message and wait for reply
+
+        Return:
+            the reply, or None if no reply is expected or it failed
+        """
+        data = dict(type=msgtype, **fields)
+        started = asyncio.get_running_loop().time()
+        try:
+            await self.socket.send(json.dumps(data))
+            if not reply:
+                return None
+            received = await asyncio.wait_for(self.socket.recv(), self.timeout)
+        except (asyncio.TimeoutError, websockets.ConnectionClosed, OSError):
+            self.stats.error(msgtype)
+            return None
+        self.stats.record(msgtype, asyncio.get_running_loop().time() - started)
+        return json.loads(received)
+
+    async def think(self, ms):
+        """Wait like a human would, scaled by speed"""
+        await asyncio.sleep(max(0.0, ms) / 1000 / self.speed)
+
+    async def pause(self, ms):
+        """Wait for a delay enforced by server, not scaled"""
+        await asyncio.sleep(max(0.0, ms) / 1000)
+
+    def clock(self):
+        """Client clock reading, ms since epoch"""
+        return time.time() * 1000
+
+    def reaction_time(self, mean=600, std=150, minimum=150):
+        """Random reaction time, ms"""
+        return max(minimum, random.gauss(mean, std))
@@ -0,0 +1,168 @@
+"""Protocols of live pages of the apps, replayed by simulated participants
+
+Each scenario plays a live page of a participant till its end, and returns if the page can be submitted then.
+Responses are random, not necessarily correct.
+"""
+
+import random
+import string
+
+
+async def calibrate(p):
+    """Burst of pings, see ldt_core/calibration.py"""
+    reply = await p.send('ping', time=p.clock(), first=True)
+    while reply and reply['type'] == 'pong':
+        reply = await p.send('ping', time=p.clock())
+
+
+async def play_trials(p):
+    """Live engine protocol of `generic` and `ldt_*` apps, see ldt_core/live_engine.py"""
+    conf, params = p.page.js_vars['conf'], p.page.js_vars['params']
+    responses = list(conf['keymap'].values())
+    batched = params['batch_size'] > 1
+
+    reply = await p.send('load')
+    if reply is None or reply.get('game_over'):
+        return True
+    if params.get('calibration_pings'):
+        await calibrate(p)
+    if 'prefetch' in p.page.js_vars:
+        await p.send('prefetched', reply=False, time=0, failed=0)
+
+    queue = []
+    for i in range(p.iterations):
+        if queue:
+            trial = queue.pop(0)
+        else:
+            reply = await p.send('new')
+            if reply is None or reply['type'] == 'status':
+                return reply is not None
+            if reply['type'] == 'trials':
+                queue = reply['trials']
+                trial = queue.pop(0)
+            else:
+                trial = reply['trial']
+
+        await p.think(params['focus_display_time'])
+        while True:
+            rt = p.reaction_time()
+            timeout = params['auto_response_time']
+            if timeout and rt > timeout:
+                await p.think(timeout)
+                reply = await p.send('timeout', iteration=trial.get('iteration'))
+            else:
+                await p.think(rt)
+                reply = await p.send(
+                    'response',
+                    iteration=trial.get('iteration'),
+                    response=random.choice(responses),
+                    reaction_time=rt,
+                    total_time=params['focus_display_time'] + rt,
+                )
+            if reply is None:
+                return False
+            if batched:
+                queue.extend(reply.get('trials', []))
+            if reply['is_final']:
+                break
+            await p.think(params['input_freezing_time'])
+
+        completed = reply['progress']['completed']
+        period = params.get('calibration_period')
+        if params.get('calibration_pings') and period and completed % period == 0:
+            await calibrate(p)
+        await p.think(params['inter_trial_time'])
+    return False
+
+
+async def play_puzzles(p):
+    """Protocol of `real_effort` app"""
+    params = p.page.js_vars['params']
+
+    reply = await p.send('load')
+    if reply is None:
+        return False
+
+    for i in range(p.iterations):
+        reply = await p.send('next')
+        if reply is None:
+            return False
+        if reply['type'] == 'status':  # iterations exhausted
+            return True
+        for attempt in range(params['attempts_per_puzzle']):
+            await p.think(p.reaction_time(5000, 1500, 1000))
+            answer = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
+            reply = await p.send('answer', answer=answer)
+            if reply is None:
+                return False
+            if reply['is_correct']:
+                break
+            await p.pause(params['retry_delay'] * 1000)
+        await p.pause(params['puzzle_delay'] * 1000)
+    # the page is submitted by timeout, unless max_iterations are exhausted
+    return False
+
+
+async def play_sliders(p):
+    """Protocol of `sliders` app"""
+    params = p.page.js_vars['params']
+
+    reply = await p.send('load')
+    if reply is None:
+        return False
+    if 'puzzle' not in reply:
+        reply = await p.send('new')
+        if reply is None:
+            return False
+    # motions left for each slider
+    motions = {int(i): params['attempts_per_slider'] for i in reply['puzzle']['sliders']}
+
+    for _ in range(p.iterations * params['num_sliders']):
+        movable = [s for s, left in motions.items() if left]
+        if not movable:
+            break
+        slider = random.choice(movable)
+        motions[slider] -= 1
+        await p.think(p.reaction_time(1000, 300))
+        await p.pause(params['retry_delay'] * 1000)
+        reply = await p.send('value', slider=slider, value=random.randint(-200, 200))
+        if reply is None:
+            return False
+    return True
+
+
+async def play_iat(p):
+    """Protocol of `iat` app, one round"""
+    params = p.page.js_vars['params']
+    responses = list(p.page.js_vars['keys'].values())
+
+    reply = await p.send('load')
+    if reply is None:
+        return False
+    if 'prefetch' in p.page.js_vars:
+        await p.send('prefetched', reply=False, time=0, failed=0)
+
+    while True:
+        reply = await p.send('next')
+        if reply is None:
+            return False
+        if reply['type'] == 'status':  # round completed
+            return True
+        rt = p.reaction_time()
+        await p.think(rt)
+        reply = await p.send('answer', answer=random.choice(responses), reaction_time=rt)
+        if reply is None:
+            return False
+        await p.pause(params['trial_delay'] * 1000)
+
+
+# by `name_in_url` of apps, as seen in page urls
+SCENARIOS = {
+    'generic': play_trials,
+    'ldt_gonogo': play_trials,
+    'ldt_yesno': play_trials,
+    'ldt_priming': play_trials,
+    'transcription': play_puzzles,
+    'sliders': play_sliders,
+    'iat': play_iat,
+}
@@ -0,0 +1,22 @@
+import argparse
+
+from otree.cli.prodserver1of2 import get_addr_port
+
+from . import run, default_workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Production server with several worker processes")
+    parser.add_argument('addrport', nargs='?', help="port number, or ipaddr:port")
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help="number of worker processes, default WEB_CONCURRENCY env var or 1, and 1 without a database server",
+    )
+    args = parser.parse_args()
+    addr, port = get_addr_port(args.addrport)
+    run(addr, port, args.workers or default_workers())
+
+
+if __name__ == "__main__":
+    main()
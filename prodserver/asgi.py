@@ -0,0 +1,16 @@
+"""The oTree app for a worker process
+
+Each worker is a fresh process, importing the app by name,
+so it sets up oTree as the `otree` command does before loading the app,
+and serves the bundle of stimulus images in front of it, see `ldt_core/asset_bundle.py`.
+"""
+
+from otree.main import setup
+
+setup()
+
+from otree.asgi import app  # noqa: E402
+from ldt_core import asset_bundle  # noqa: E402
+
+if asset_bundle.current() is not None:
+    app = asset_bundle.BundleFiles(app, asset_bundle.current())
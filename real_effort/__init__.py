@@ -1,9 +1,8 @@
-import time
-
 from otree import settings
 from otree.api import *
 
 from .image_utils import encode_image
+from ldt_core import live_timing, clock, counters
 
 doc = """
 Real-effort tasks. The different tasks are available in task_matrix.py, task_transcription.py, etc.
@@ -74,13 +73,18 @@ class Puzzle(ExtraModel):
     iteration = models.IntegerField(initial=0)
     attempts = models.IntegerField(initial=0)
     timestamp = models.FloatField(initial=0)
+    # monotonic clock readings paired with the timestamps, see ldt_core/clock.py
+    timestamp_mono = models.FloatField()
     # can be either simple text, or a json-encoded definition of the puzzle, etc.
     text = models.LongStringField()
     # solution may be the same as text, if it's simply a transcription task
     solution = models.LongStringField()
     response = models.LongStringField()
     response_timestamp = models.FloatField()
+    response_timestamp_mono = models.FloatField()
     is_correct = models.BooleanField()
+    # server processing time of messages, see ldt_core/live_timing.py
+    server_timing = models.LongStringField()
 
 
 def generate_puzzle(player: Player) -> Puzzle:
@@ -88,8 +92,13 @@ def generate_puzzle(player: Player) -> Puzzle:
     task_module = get_task_module(player)
     fields = task_module.generate_puzzle_fields()
     player.iteration += 1
+    now = clock.now()
     return Puzzle.create(
-        player=player, iteration=player.iteration, timestamp=time.time(), **fields
+        player=player,
+        iteration=player.iteration,
+        timestamp=now.wall,
+        timestamp_mono=now.mono,
+        **fields,
     )
 
 
@@ -104,11 +113,18 @@ def encode_puzzle(puzzle: Puzzle):
     """Create data describing puzzle to send to client"""
     task_module = get_task_module(puzzle.player)  # noqa
     # generate image for the puzzle
-    image = task_module.render_image(puzzle)
-    data = encode_image(image)
+    with live_timing.phase('render'):
+        image = task_module.render_image(puzzle)
+    with live_timing.phase('encode'):
+        data = encode_image(image)
     return dict(image=data)
 
 
+def recompute_progress(player: Player):
+    """Recount progress from all answered puzzles, repairing any drift of counters"""
+    counters.recount(player, [z for z in Puzzle.filter(player=player) if z.response is not None])
+
+
 def get_progress(player: Player):
     """Return current player progress"""
     return dict(
@@ -119,6 +135,7 @@ def get_progress(player: Player):
     )
 
 
+@live_timing.instrument
 def play_game(player: Player, message: dict):
     """Main game workflow
     Implemented as reactive scheme: receive message from vrowser, react, respond.
@@ -149,14 +166,16 @@ def play_game(player: Player, message: dict):
     params = session.params
     task_module = get_task_module(player)
 
-    now = time.time()
+    now = clock.now()
     # the current puzzle or none
     current = get_current_puzzle(player)
+    live_timing.track(current)
 
     message_type = message['type']
 
     # page loaded
     if message_type == 'load':
+        recompute_progress(player)
         p = get_progress(player)
         if current:
             return {
@@ -173,7 +192,8 @@ def play_game(player: Player, message: dict):
         if current is not None:
             if current.response is None:
                 raise RuntimeError("trying to skip over unsolved puzzle")
-            if now < current.timestamp + params["puzzle_delay"]:
+            passed = clock.elapsed(current.timestamp, current.timestamp_mono, now)
+            if passed < params["puzzle_delay"]:
                 raise RuntimeError("retrying too fast")
             if current.iteration == params['max_iterations']:
                 return {
@@ -183,6 +203,7 @@ def play_game(player: Player, message: dict):
                 }
         # generate new puzzle
         z = generate_puzzle(player)
+        live_timing.track(z)
         p = get_progress(player)
         return {my_id: dict(type='puzzle', puzzle=encode_puzzle(z), progress=p)}
 
@@ -194,33 +215,26 @@ def play_game(player: Player, message: dict):
         if current.response is not None:  # it's a retry
             if current.attempts >= params["attempts_per_puzzle"]:
                 raise RuntimeError("no more attempts allowed")
-            if now < current.response_timestamp + params["retry_delay"]:
+            passed = clock.elapsed(current.response_timestamp, current.response_timestamp_mono, now)
+            if passed < params["retry_delay"]:
                 raise RuntimeError("retrying too fast")
 
-            # undo last updation of player progress
-            player.num_trials -= 1
-            if current.is_correct:
-                player.num_correct -= 1
-            else:
-                player.num_failed -= 1
+            was_correct = current.is_correct
+        else:
+            was_correct = None
 
         # check answer
         answer = message["answer"]
 
-        if answer == "" or answer is None:
+        if not isinstance(answer, str) or answer == "":
             raise ValueError("bogus answer")
 
         current.response = answer
         current.is_correct = task_module.is_correct(answer, current)
-        current.response_timestamp = now
+        current.response_timestamp, current.response_timestamp_mono = now
         current.attempts += 1
 
-        # update player progress
-        if current.is_correct:
-            player.num_correct += 1
-        else:
-            player.num_failed += 1
-        player.num_trials += 1
+        counters.count_response(player, was_correct, current.is_correct)
 
         retries_left = params["attempts_per_puzzle"] - current.attempts
         p = get_progress(player)
@@ -236,6 +250,10 @@ def play_game(player: Player, message: dict):
     raise RuntimeError("unrecognized message from client")
 
 
+def vars_for_admin_report(subsession: Subsession):
+    return live_timing.admin_report(Puzzle, subsession)
+
+
 class Game(Page):
     timeout_seconds = 60
 
@@ -256,6 +274,7 @@ class Game(Page):
     def before_next_page(player: Player, timeout_happened):
         if not timeout_happened and not player.session.params['max_iterations']:
             raise RuntimeError("malicious page submission")
+        live_timing.store(Puzzle, player)
 
 
 class Results(Page):
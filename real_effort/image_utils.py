@@ -3,6 +3,7 @@ Utilities to generate and manipulate images
 """
 from io import BytesIO
 from base64 import b64encode
+import importlib.util
 
 MSG_NEED_PIL = """
 FAILURE: Before using these real-effort tasks,
@@ -11,10 +12,8 @@ You need to:
 (2) add Pillow to your requirements.txt
 """
 
-try:
-    # PIL is not actually used here; this is just to generate the warning to install Pillow.
-    import PIL  # noqa
-except ImportError:
+# checking that Pillow is installed, without importing it
+if importlib.util.find_spec("PIL") is None:
     import sys
 
     sys.tracebacklimit = 0
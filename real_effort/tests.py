@@ -1,10 +1,12 @@
-import time
+import json
 from contextlib import contextmanager
 
 from otree.api import *
 from otree import settings
 
 from . import Player, Puzzle, Game
+from ldt_core import live_timing, clock
+from ldt_core.fuzzing import fuzz, VALID, INVALID, ANY
 
 
 class PlayerBot(Bot):
@@ -19,6 +21,8 @@ class PlayerBot(Bot):
         "forward_nodelay",  # advancing to a next puzzle w/out delay
         "reloading_start",  # page reload at the start of a round
         "reloading_midgame",  # page reload in the middle of a round
+        "reloading_drift",  # page reload with counters out of sync
+        "timing",  # recording processing time of messages
         "skipping_unanswered",  # advancing to a next puzzle w/out replying
         "skipping_incorrect",  # advancing to a next puzzle after incorrect answer
         "retrying_correct",  # answering to the same puzzle correctly after incorrect answer
@@ -29,6 +33,7 @@ class PlayerBot(Bot):
         "iter_limit",  # exchausting number of iterations
         "cheat_debug",
         "cheat_nodebug",
+        "fuzzing",  # random sequence of valid and malformed messages
     ]
 
     def play_round(self):
@@ -243,7 +248,7 @@ def live_test_normal(method, player, conf):
         resp, iteration=1, num_trials=1, num_correct=1, num_incorrect=0
     )
 
-    time.sleep(puzzle_delay)
+    clock.sleep(puzzle_delay)
 
     # 2nd puzzle
     resp = move_forward(method, player)
@@ -338,6 +343,31 @@ def live_test_reloading_midgame(method, player, conf):
     )
 
 
+def live_test_reloading_drift(method, player, conf):
+    move_forward(method, player)
+    solution = get_last_puzzle(player).solution
+    give_answer(method, player, solution)
+
+    # counters gone out of sync
+    player.num_trials, player.num_correct, player.num_failed = 5, 0, 5
+
+    resp = reload(method, player)
+    expect_response_progress(
+        resp, iteration=1, num_trials=1, num_correct=1, num_incorrect=0
+    )
+
+
+def live_test_timing(method, player, conf):
+    move_forward(method, player)
+    give_answer(method, player, solution(player))
+
+    live_timing.store(Puzzle, player)
+    timing = json.loads(get_last_puzzle(player).server_timing)
+    expect(sorted(timing), ['answer', 'next'])
+    render_time = timing['next'][0][1 + live_timing.PHASES.index('render')]
+    expect(render_time, '>', 0)
+
+
 def live_test_replying_empty(method, player, conf):
     move_forward(method, player)
     with expect_failure(ValueError):
@@ -375,7 +405,7 @@ def live_test_retrying_correct(method, player, conf):
 
     last = get_last_puzzle_clone(player)
 
-    time.sleep(retry_delay)
+    clock.sleep(retry_delay)
 
     # 2nd correct answer
     answer2 = solution(player)
@@ -410,7 +440,7 @@ def live_test_retrying_incorrect(method, player, conf):
 
     last = get_last_puzzle_clone(player)
 
-    time.sleep(retry_delay)
+    clock.sleep(retry_delay)
 
     # 2nd incorrect answer
     answer2 = "0"
@@ -467,7 +497,7 @@ def live_test_retrying_many(method, player, conf):
         give_answer(method, player, answer1)
         expect_answered_incorrectly(player, answer1)
         expect_progress(player, total=1, correct=0, incorrect=1)
-        time.sleep(retry_delay)
+        clock.sleep(retry_delay)
 
     last = get_last_puzzle_clone(player)
 
@@ -492,7 +522,7 @@ def live_test_retrying_limit(method, player, conf):
         give_answer(method, player, answer1)
         expect_answered_incorrectly(player, answer1)
         expect_progress(player, total=1, correct=0, incorrect=1)
-        time.sleep(retry_delay)
+        clock.sleep(retry_delay)
 
     last = get_last_puzzle_clone(player)
 
@@ -523,7 +553,7 @@ def live_test_skipping_unanswered(method, player, conf):
     expect_progress(player, total=1, correct=0, incorrect=0)
     last = get_last_puzzle(player)
 
-    time.sleep(puzzle_delay)
+    clock.sleep(puzzle_delay)
 
     with expect_failure(RuntimeError):
         move_forward(method, player)
@@ -544,7 +574,7 @@ def live_test_skipping_incorrect(method, player, conf):
     expect_answered_incorrectly(player, answer)
     expect_progress(player, total=1, correct=0, incorrect=1)
 
-    time.sleep(puzzle_delay)
+    clock.sleep(puzzle_delay)
 
     if force_solve:
         with expect_failure(RuntimeError):
@@ -567,7 +597,7 @@ def live_test_iter_limit(method, player, conf):
         move_forward(method, player)
         answer = solution(player)
         give_answer(method, player, answer)
-        time.sleep(puzzle_delay)
+        clock.sleep(puzzle_delay)
 
     expect_progress(player, total=max_iter, correct=max_iter, incorrect=0)
     last = get_last_puzzle_clone(player)
@@ -600,3 +630,78 @@ def live_test_cheat_nodebug(method, player, conf):
 
 def live_test_fake_submit(method, player, conf):
     pass
+
+
+class PuzzleProtocol:
+    """Model of the live page for fuzzing, see ldt_core/fuzzing.py"""
+
+    def __init__(self, params):
+        self.params = params
+        self.pauses = (0, params['retry_delay'] * 2, params['puzzle_delay'] * 2)
+        self.iteration = 0
+        self.answered = False
+        self.attempts = 0
+        self.started = None  # monotonic readings of accepted messages
+        self.responded = None
+        self.current = None
+
+    def rows(self, player):
+        return Puzzle.filter(player=player)
+
+    def passed(self, since):
+        return clock.now().mono - since
+
+    def generate(self, rng):
+        kind = rng.choices(['load', 'next', 'answer'], weights=[1, 3, 4])[0]
+        if kind == 'load':
+            return dict(type='load'), VALID
+        if kind == 'next':
+            if self.iteration == 0:
+                return dict(type='next'), VALID
+            if not self.answered:
+                return dict(type='next'), INVALID
+            if self.passed(self.started) < self.params['puzzle_delay']:
+                return dict(type='next'), ANY
+            return dict(type='next'), VALID
+
+        solution = self.current.solution if self.current else "x"
+        answer = rng.choice([solution, solution + "1"])
+        message = dict(type='answer', answer=answer)
+        if self.iteration == 0:
+            return message, INVALID
+        if self.answered:
+            if self.attempts >= self.params['attempts_per_puzzle']:
+                return message, INVALID
+            if self.passed(self.responded) < self.params['retry_delay']:
+                return message, ANY
+        return message, VALID
+
+    def update(self, message, reply):
+        if reply['type'] == 'puzzle':
+            self.iteration += 1
+            self.answered = False
+            self.attempts = 0
+            self.started = clock.now().mono
+        if reply['type'] == 'feedback':
+            self.answered = True
+            self.attempts += 1
+            self.responded = clock.now().mono
+
+    def check(self, player):
+        puzzles = Puzzle.filter(player=player)
+        answered = [z for z in puzzles if z.response is not None]
+        num_correct = sum(1 for z in answered if z.is_correct)
+        expect(player.num_trials, len(answered))
+        expect(player.num_correct, num_correct)
+        expect(player.num_failed, len(answered) - num_correct)
+        expect(player.iteration, self.iteration)
+        expect(len(puzzles), self.iteration)
+        if self.params['max_iterations']:
+            expect(player.iteration, '<=', self.params['max_iterations'])
+        self.current = puzzles[-1] if puzzles else None
+        if self.current:
+            expect(self.current.attempts, self.attempts)
+
+
+def live_test_fuzzing(method, player, conf):
+    fuzz(method, player, PuzzleProtocol(conf))
@@ -15,6 +15,7 @@ SESSION_CONFIGS = [
         num_demo_participants=1,
         app_sequence=["ldt_yesno"],
         labels={'word': 'word', 'nonword': "non-word"},
+        frequency_bands={'high': 2e-4, 'medium': 1e-4, 'low': 0},
     ),
     dict(
         name="ldt_gonogo",
@@ -29,6 +30,8 @@ SESSION_CONFIGS = [
         num_demo_participants=1,
         app_sequence=["ldt_priming"],
         labels={'word': 'word', 'nonword': "non-word"},
+        strength_bands={'related': 0.01, 'unrelated': 0},
+        unrelated_proportion=0.25,
     ),
     dict(
         name="sliders",
@@ -124,16 +127,24 @@ Real-effort tasks with multiple configuration options.
 
 SECRET_KEY = "2015765205890"
 
+# recording server processing time of live messages, see ldt_core/live_timing.py
+LIVE_TIMING = environ.get("LIVE_TIMING") not in [None, "", "0"]
+
+# virtual server clock, advanced by sleeps of bot tests, see ldt_core/clock.py
+VIRTUAL_CLOCK = False
+
 # adjustments for testing
 # generating session configs for all varieties of features
 import sys
 
 
-if sys.argv[1] == 'test':
+if len(sys.argv) > 1 and sys.argv[1] == 'test':
     MAX_ITERATIONS = 5
     FREEZE_TIME = 100
     TRIAL_PAUSE = 200
     TRIAL_TIMEOUT = 300
+    LIVE_TIMING = True
+    VIRTUAL_CLOCK = True
 
     SESSION_CONFIGS = [
         dict(
@@ -152,7 +163,7 @@ if sys.argv[1] == 'test':
             name=f"testing_generic_retries",
             num_demo_participants=1,
             app_sequence=['generic'],
-            auto_response_time=None,
+            auto_response_time=TRIAL_TIMEOUT,
             input_freezing_time=FREEZE_TIME,
             inter_trial_time=TRIAL_PAUSE,
             num_iterations=MAX_ITERATIONS,
@@ -172,6 +183,38 @@ if sys.argv[1] == 'test':
             categories={'foo': 'positive', 'bar': 'negative'},
             labels={'foo': 'Positive', 'bar': 'Negative'},
         ),
+        dict(
+            name=f"testing_generic_batched",
+            num_demo_participants=1,
+            app_sequence=['generic'],
+            auto_response_time=None,
+            input_freezing_time=FREEZE_TIME,
+            inter_trial_time=TRIAL_PAUSE,
+            num_iterations=MAX_ITERATIONS,
+            attempts_per_trial=1,
+            batch_size=3,
+            categories={'foo': 'positive', 'bar': 'negative'},
+            labels={'foo': 'Positive', 'bar': 'Negative'},
+        ),
+        dict(
+            name=f"testing_ldt_yesno",
+            num_demo_participants=1,
+            app_sequence=['ldt_yesno'],
+            auto_response_time=TRIAL_TIMEOUT,
+            input_freezing_time=FREEZE_TIME,
+            inter_trial_time=TRIAL_PAUSE,
+            num_iterations=MAX_ITERATIONS,
+            labels={'word': 'word', 'nonword': "non-word"},
+        ),
+        dict(
+            name=f"testing_ldt_priming",
+            num_demo_participants=1,
+            app_sequence=['ldt_priming'],
+            num_iterations=40,
+            strength_bands={'related': 0.01, 'unrelated': 0},
+            unrelated_proportion=0.5,
+            labels={'word': 'word', 'nonword': "non-word"},
+        ),
         dict(
             name=f"testing_iat",
             num_demo_participants=1,
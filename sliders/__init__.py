@@ -1,11 +1,12 @@
-import time
 import json
+from collections import OrderedDict
 
 from otree import settings
 from otree.api import *
 
 from .image_utils import encode_image
 from . import task_sliders
+from ldt_core import live_timing, clock, wire, throttling
 
 doc = """
 """
@@ -30,7 +31,9 @@ def creating_session(subsession: Subsession):
         retry_delay=0.1,
         num_sliders=48,
         num_columns=3,
-        attempts_per_slider=10
+        attempts_per_slider=10,
+        rate_limit=20,
+        rate_burst=40,
     )
     session.params = {}
     for param in defaults:
@@ -58,13 +61,20 @@ class Puzzle(ExtraModel):
     player = models.Link(Player)
     iteration = models.IntegerField()
     timestamp = models.FloatField()
+    # monotonic clock readings paired with the timestamps, see ldt_core/clock.py
+    timestamp_mono = models.FloatField()
 
     num_sliders = models.IntegerField()
     layout = models.LongStringField()
 
     response_timestamp = models.FloatField()
+    response_timestamp_mono = models.FloatField()
     num_correct = models.IntegerField(initial=0)
     is_solved = models.BooleanField(initial=False)
+    # version of state of sliders, incremented with each change
+    version = models.IntegerField(initial=0)
+    # server processing time of messages, see ldt_core/live_timing.py
+    server_timing = models.LongStringField()
 
 
 class Slider(ExtraModel):
@@ -76,6 +86,8 @@ class Slider(ExtraModel):
     value = models.IntegerField()
     is_correct = models.BooleanField(initial=False)
     attempts = models.IntegerField(initial=0)
+    # version of puzzle when the slider was last changed
+    version = models.IntegerField(initial=0)
 
 
 def generate_puzzle(player: Player) -> Puzzle:
@@ -83,8 +95,9 @@ def generate_puzzle(player: Player) -> Puzzle:
     params = player.session.params
     num = params['num_sliders']
     layout = task_sliders.generate_layout(params)
+    now = clock.now()
     puzzle = Puzzle.create(
-        player=player, iteration=player.iteration, timestamp=time.time(),
+        player=player, iteration=player.iteration, timestamp=now.wall, timestamp_mono=now.mono,
         num_sliders=num,
         layout=json.dumps(layout)
     )
@@ -106,25 +119,46 @@ def get_current_puzzle(player):
         return puzzle
 
 
-def get_slider(puzzle, idx):
-    sliders = Slider.filter(puzzle=puzzle, idx=idx)
-    if sliders:
-        [puzzle] = sliders
-        return puzzle
-
+def encode_puzzle(puzzle: Puzzle, compact=False):
+    """Create data describing puzzle to send to client
 
-def encode_puzzle(puzzle: Puzzle):
-    """Create data describing puzzle to send to client"""
+    In compact form, states of sliders are sent as list of values and list of indexes of correct sliders
+    """
     layout = json.loads(puzzle.layout)
     sliders = Slider.filter(puzzle=puzzle)
     # generate image for the puzzle
-    image = task_sliders.render_image(layout, targets=[s.target for s in sliders])
-    return dict(
-        image=encode_image(image),
-        size=layout['size'],
-        grid=layout['grid'],
-        sliders={s.idx: {'value': s.value, 'is_correct': s.is_correct} for s in sliders}
-    )
+    with live_timing.phase('render'):
+        image = task_sliders.render_image(layout, targets=[s.target for s in sliders])
+    with live_timing.phase('encode'):
+        data = dict(
+            id=puzzle.id,
+            version=puzzle.version,
+            image=encode_image(image),
+            size=layout['size'],
+            grid=layout['grid'],
+        )
+        if compact:
+            data['values'] = [s.value for s in sliders]
+            data['correct'] = [s.idx for s in sliders if s.is_correct]
+        else:
+            data['sliders'] = {s.idx: {'value': s.value, 'is_correct': s.is_correct} for s in sliders}
+        return data
+
+
+def encode_changes(puzzle: Puzzle, since: int, compact=False):
+    """Create data describing changes of puzzle since some version, for client having the rest of it
+
+    In compact form, values are sent as mapping of indexes to values
+    """
+    sliders = Slider.objects_filter(Slider.version > since, puzzle=puzzle).order_by('id')
+    with live_timing.phase('encode'):
+        data = dict(id=puzzle.id, version=puzzle.version)
+        if compact:
+            data['values'] = {s.idx: s.value for s in sliders}
+            data['correct'] = [s.idx for s in sliders if s.is_correct]
+        else:
+            data['sliders'] = {s.idx: {'value': s.value, 'is_correct': s.is_correct} for s in sliders}
+        return data
 
 
 def get_progress(player: Player):
@@ -135,13 +169,90 @@ def get_progress(player: Player):
     )
 
 
-def handle_response(puzzle, slider, value):
-    slider.value = task_sliders.snap_value(value, slider.target)
-    slider.is_correct = slider.value == slider.target
-    puzzle.num_correct = len(Slider.filter(puzzle=puzzle, is_correct=True))
+# max number of puzzles with coalesced values kept, of most recently active ones
+MAX_PENDING = 10000
+
+# values of sliders received too fast, to apply with next value, {idx: value} by puzzle id
+# kept in memory of the server process, like buckets of ldt_core/throttling.py, not to write the puzzle for each value
+PENDING = OrderedDict()
+
+
+def coalesce_value(puzzle, idx, value):
+    """Keep value of a slider to apply later, replacing previously kept one"""
+    PENDING.setdefault(puzzle.id, {})[idx] = value
+    PENDING.move_to_end(puzzle.id)
+    if len(PENDING) > MAX_PENDING:
+        PENDING.popitem(last=False)
+
+
+def has_pending(puzzle) -> bool:
+    return puzzle.id in PENDING
+
+
+def take_pending(puzzle) -> dict:
+    """Get coalesced values by indexes of sliders, removing them"""
+    return PENDING.pop(puzzle.id, {})
+
+
+def apply_values(puzzle, values, max_attempts):
+    """Apply values of sliders, by indexes, as a single change of puzzle
+    Values of sliders out of attempts are dropped.
+
+    Return:
+        list of changed sliders, in order of the values
+    """
+    sliders = {s.idx: s for s in Slider.filter(puzzle=puzzle)}
+    puzzle.version += 1
+
+    changed = []
+    for idx, value in values.items():
+        slider = sliders[idx]
+        if slider.attempts >= max_attempts:
+            continue
+        slider.value = task_sliders.snap_value(value, slider.target)
+        slider.is_correct = slider.value == slider.target
+        slider.attempts += 1
+        slider.version = puzzle.version
+        changed.append(slider)
+
+    puzzle.num_correct = sum(1 for s in sliders.values() if s.is_correct)
     puzzle.is_solved = puzzle.num_correct == puzzle.num_sliders
+    return changed
 
 
+def handle_response(puzzle, idx, value, max_attempts):
+    """Apply value of a slider, together with values coalesced before it, as a single change of puzzle
+
+    Return:
+        the slider and list of other changed sliders
+    """
+    slider = Slider.filter(puzzle=puzzle, idx=idx)[0]
+    if slider.attempts >= max_attempts:
+        raise RuntimeError("too many slider motions")
+
+    values = take_pending(puzzle)
+    values.pop(idx, None)
+    values[idx] = value
+    changed = apply_values(puzzle, values, max_attempts)
+    return slider, changed[:-1]
+
+
+def flush_pending(player, puzzle, max_attempts):
+    """Apply coalesced values, when no other value came to apply them with"""
+    if has_pending(puzzle):
+        apply_values(puzzle, take_pending(puzzle), max_attempts)
+        player.num_correct = puzzle.num_correct
+
+
+def within_retry_delay(puzzle, params, now):
+    """If the last change of puzzle was sooner than `retry_delay` before now"""
+    return bool(
+        puzzle.response_timestamp
+        and clock.elapsed(puzzle.response_timestamp, puzzle.response_timestamp_mono, now) < params["retry_delay"]
+    )
+
+
+@live_timing.instrument
 def play_game(player: Player, message: dict):
     """Main game workflow
     Implemented as reactive scheme: receive message from browser, react, respond.
@@ -153,6 +264,10 @@ def play_game(player: Player, message: dict):
     - respond: {'type': 'status', 'progress': ..., 'puzzle': data}
       in case of midgame page reload
 
+    - receive: {'type': 'load', 'puzzle': id, 'version': ...} -- page reloaded with puzzle kept by client
+    - respond: {'type': 'status', 'progress': ..., 'puzzle': {'id': ..., 'version': ..., 'sliders': ...}}
+      with only sliders changed since the version, and without image, or the full puzzle if the client has another one
+
     - receive: {'type': 'new'} -- request for a new puzzle
     - generate new sliders
     - respond: {'type': 'puzzle', 'puzzle': data}
@@ -161,28 +276,63 @@ def play_game(player: Player, message: dict):
       - slider: the index of the slider
       - value: the value of slider in pixels
     - check if the answer is correct
-    - respond: {'type': 'feedback', 'slider': ..., 'value': ..., 'is_correct': ..., 'is_completed': ...}
+    - respond: {'type': 'feedback', 'slider': ..., 'value': ..., 'is_correct': ..., 'is_completed': ..., 'version': ...}
       - slider: the index of slider submitted
       - value: the value aligned to slider steps
       - is_corect: if submitted value is correct
       - is_completed: if all sliders are correct
+      - version: version of puzzle after the change
+      - sliders: {idx: {'value': ..., 'is_correct': ...}} -- other sliders changed by coalesced values, if any
+
+    Values received sooner than `retry_delay` after the last change are coalesced:
+    the latest value of each slider is kept, with no response, and applied together with the next value,
+    or by a 'load' message after the delay, or on leaving the page.
+    The client resyncs with a 'load' message when a value stays without response.
+    The values are kept in memory of the server process, with several processes
+    the ones kept by a process other than serving the resync or leaving the page are lost.
+
+    Each player can send `rate_burst` messages at once, and `rate_limit` messages per second after that,
+    messages beyond that are rejected, see ldt_core/throttling.py
+
+    Compact schema, when requested by client in 'load' message, see ldt_core/wire.py:
+    messages are sent and received with short keys and integer types, and 'progress' carries only changed values.
     """
     session = player.session
     my_id = player.id_in_group
     params = session.params
 
-    now = time.time()
+    now = clock.now()
+    if not throttling.take(player, params['rate_limit'], params['rate_burst'], now):
+        raise RuntimeError("too many messages")
+
     # the current puzzle or none
     puzzle = get_current_puzzle(player)
+    live_timing.track(puzzle)
 
+    message, is_compact = wire.receive(message)
     message_type = message['type']
+    progress_before = get_progress(player)
+
+    def respond(msgtype, **fields):
+        msgdata = dict(type=msgtype, **fields)
+        if is_compact:
+            # page load gets full progress, other messages only changes
+            msgdata = wire.compact(msgdata, None if message_type == 'load' else progress_before)
+        return {my_id: msgdata}
 
     if message_type == 'load':
+        if puzzle and not within_retry_delay(puzzle, params, now):
+            flush_pending(player, puzzle, params['attempts_per_slider'])
         p = get_progress(player)
         if puzzle:
-            return {my_id: dict(type='status', progress=p, puzzle=encode_puzzle(puzzle))}
+            since = message.get('version')
+            if message.get('puzzle') == puzzle.id and type(since) is int and 0 <= since <= puzzle.version:
+                data = encode_changes(puzzle, since, is_compact)
+            else:
+                data = encode_puzzle(puzzle, is_compact)
+            return respond('status', progress=p, puzzle=data)
         else:
-            return {my_id: dict(type='status', progress=p)}
+            return respond('status', progress=p)
 
     if message_type == "new":
         if puzzle is not None:
@@ -190,40 +340,39 @@ def play_game(player: Player, message: dict):
 
         player.iteration += 1
         z = generate_puzzle(player)
+        live_timing.track(z)
         p = get_progress(player)
 
-        return {my_id: dict(type='puzzle', puzzle=encode_puzzle(z), progress=p)}
+        return respond('puzzle', puzzle=encode_puzzle(z, is_compact), progress=p)
 
     if message_type == "value":
         if puzzle is None:
             raise RuntimeError("missing puzzle")
-        if puzzle.response_timestamp and now < puzzle.response_timestamp + params["retry_delay"]:
-            raise RuntimeError("retrying too fast")
 
-        slider = get_slider(puzzle, int(message["slider"]))
-
-        if slider is None:
+        idx = int(message["slider"])
+        value = int(message["value"])
+        if not 0 <= idx < puzzle.num_sliders:
             raise RuntimeError("missing slider")
-        if slider.attempts >= params['attempts_per_slider']:
-            raise RuntimeError("too many slider motions")
 
-        value = int(message["value"])
-        handle_response(puzzle, slider, value)
-        puzzle.response_timestamp = now
-        slider.attempts += 1
+        if within_retry_delay(puzzle, params, now):
+            coalesce_value(puzzle, idx, value)
+            return
+
+        slider, others = handle_response(puzzle, idx, value, params['attempts_per_slider'])
+        puzzle.response_timestamp, puzzle.response_timestamp_mono = now
         player.num_correct = puzzle.num_correct
 
-        p = get_progress(player)
-        return {
-            my_id: dict(
-                type='feedback',
-                slider=slider.idx,
-                value=slider.value,
-                is_correct=slider.is_correct,
-                is_completed=puzzle.is_solved,
-                progress=p,
-            )
-        }
+        feedback = dict(
+            slider=slider.idx,
+            value=slider.value,
+            is_correct=slider.is_correct,
+            is_completed=puzzle.is_solved,
+            version=puzzle.version,
+            progress=get_progress(player),
+        )
+        if others:
+            feedback['sliders'] = {s.idx: {'value': s.value, 'is_correct': s.is_correct} for s in others}
+        return respond('feedback', **feedback)
 
     if message_type == "cheat" and settings.DEBUG:
         return {my_id: dict(type='solution', solution={s.idx: s.target for s in Slider.filter(puzzle=puzzle)})}
@@ -231,6 +380,10 @@ def play_game(player: Player, message: dict):
     raise RuntimeError("unrecognized message from client")
 
 
+def vars_for_admin_report(subsession: Subsession):
+    return live_timing.admin_report(Puzzle, subsession)
+
+
 class Game(Page):
     timeout_seconds = 120
 
@@ -241,6 +394,7 @@ class Game(Page):
         return dict(
             params=player.session.params,
             slider_size=task_sliders.SLIDER_BBOX,
+            wire=wire.js_vars(),
         )
 
     @staticmethod
@@ -254,8 +408,17 @@ class Game(Page):
     def before_next_page(player: Player, timeout_happened):
         puzzle = get_current_puzzle(player)
 
+        if puzzle:
+            flush_pending(player, puzzle, player.session.params['attempts_per_slider'])
+        live_timing.store(Puzzle, player)
+
         if puzzle and puzzle.response_timestamp:
-            player.elapsed_time = puzzle.response_timestamp - puzzle.timestamp
+            player.elapsed_time = clock.interval(
+                puzzle.timestamp,
+                puzzle.timestamp_mono,
+                puzzle.response_timestamp,
+                puzzle.response_timestamp_mono,
+            )
             player.num_correct = puzzle.num_correct
             player.payoff = player.num_correct
 
@@ -6,7 +6,6 @@ class Model {
     }
 
     reset() {
-        this.progress = {};
         this.sliders = {};
     }
 
@@ -14,6 +13,57 @@ class Model {
         this.sliders = sliders;
         for(let s in this.sliders) this.sliders[s].attempts = 0;
     }
+
+    static unpack(values, correct) {
+        /** sliders from compact form of puzzle, values are list or mapping of indexes */
+        let sliders = {};
+        for (let i in values) sliders[i] = {value: values[i], is_correct: correct.includes(Number(i))};
+        return sliders;
+    }
+}
+
+
+class Cache {
+    /** last state of puzzle confirmed by server, kept in session storage to resync after page reload
+     * the image is stored separately, once per puzzle
+     */
+    constructor(key) {
+        this.key = key;
+        this.state = null;  // {id, version, size, grid, sliders}
+        this.image = null;
+        try {
+            this.state = JSON.parse(sessionStorage.getItem(`${key}:state`));
+            this.image = sessionStorage.getItem(`${key}:image`);
+        } catch (e) {  // storage disabled
+        }
+        if (this.image === null) this.state = null;
+    }
+
+    _store(name, value) {
+        try {
+            sessionStorage.setItem(`${this.key}:${name}`, value);
+        } catch (e) {  // storage disabled or full
+        }
+    }
+
+    load(data, sliders) {
+        /** new puzzle, or changes since cached version when there's no image */
+        if (data.image === undefined) {
+            Object.assign(this.state.sliders, sliders);
+            this.state.version = data.version;
+        } else {
+            this.state = {id: data.id, version: data.version, size: data.size, grid: data.grid, sliders: sliders};
+            this.image = data.image;
+            this._store('image', this.image);
+        }
+        this._store('state', JSON.stringify(this.state));
+    }
+
+    update(i, value, is_correct, version) {
+        this.state.sliders[i] = {value: value, is_correct: is_correct};
+        this.state.version = version;
+        this._store('state', JSON.stringify(this.state));
+    }
 }
 
 
@@ -140,15 +190,26 @@ class Controller {
         this.ts_answer = 0;
         this.input_disabled = false;
 
-        window.liveRecv = (message) => this.recvMessage(message);
+        this.wire = new Wire(js_vars.wire);
+        this.cache = new Cache('sliders');
+        window.liveRecv = (message) => this.recvMessage(this.wire.decode(message));
 
         this.picked_slider = null;
         this.hover_handle = null;
+        this.resync_timer = null;
         this.view.$canvas.onmousedown = (e) => this.pickHandle(e);
         this.view.$canvas.onmousemove = (e) => this.picked_slider !== null ? this.dragHandle(e) : this.hoverHandle(e);
         this.view.$canvas.onmouseup = (e) => this.picked_slider !== null ? this.dropHandle(e) : null;
 
-        liveSend({type: 'load'});
+        this.reqLoad();
+    }
+
+    reqLoad() {
+        let load = this.wire.loadMessage();
+        if (this.cache.state) {  // to get only changes since then
+            Object.assign(load, {puzzle: this.cache.state.id, version: this.cache.state.version});
+        }
+        liveSend(load);
     }
 
     recvMessage(message) {
@@ -184,15 +245,23 @@ class Controller {
     }
 
     recvPuzzle(data) {
-        this.model.load(data.sliders);
-        this.view.load(data.size, data.image, data.grid);
+        this.cache.load(data, data.sliders || Model.unpack(data.values, data.correct));
+        let state = this.cache.state;
+        // the model is changed while dragging, the cache keeps confirmed values
+        this.model.load(JSON.parse(JSON.stringify(state.sliders)));
+        this.view.load(state.size, this.cache.image, state.grid);
         this.view.render();
     }
 
     recvFeedback(message) {
-        let i = message.slider;
-        this.model.sliders[i].value = message.value;
-        this.model.sliders[i].is_correct = message.is_correct;
+        // other sliders, with values coalesced by server, are applied together with the submitted one
+        let changed = Object.assign({}, message.sliders);
+        changed[message.slider] = {value: message.value, is_correct: message.is_correct};
+        for (let i in changed) {
+            this.model.sliders[i].value = changed[i].value;
+            this.model.sliders[i].is_correct = changed[i].is_correct;
+            this.cache.update(i, changed[i].value, changed[i].is_correct, message.version);
+        }
         this.view.render();
 
         if (message.is_completed) {
@@ -201,7 +270,8 @@ class Controller {
     }
 
     recvProgress(data) {
-        this.model.progress = data;
+        // in compact schema, only changed values
+        this.model.progress = Object.assign({}, this.model.progress, data);
         this.view.renderProgress();
     }
 
@@ -214,7 +284,19 @@ class Controller {
         let slider = this.model.sliders[i];
         slider.attempts ++;
         slider.is_correct = null;
-        liveSend({type: 'value', slider: i, value: slider.value});
+        liveSend(this.wire.encode({type: 'value', slider: i, value: slider.value}));
+
+        // a value coming too soon after another one is kept by server without reply,
+        // and applied by the next message after retry delay
+        window.clearTimeout(this.resync_timer);
+        this.resync_timer = window.setTimeout(() => this.resync(), js_vars.params.retry_delay * 2000);
+    }
+
+    resync() {
+        let unresolved = Object.values(this.model.sliders).some((s) => s.is_correct === null);
+        if (unresolved && this.cache.state) {
+            this.reqLoad();
+        }
     }
 
     reqNew() {
@@ -222,7 +304,7 @@ class Controller {
         this.view.reset();
         this.view.clear();
 
-        liveSend({type: 'new'});
+        liveSend(this.wire.encode({type: 'new'}));
     }
 
     pickHandle(event) {
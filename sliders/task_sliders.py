@@ -1,6 +1,5 @@
 import math
 import json
-from PIL import Image, ImageDraw
 import random
 
 SLIDER_SNAP = 4  # size of 1 unit
@@ -57,6 +56,9 @@ def snap_value(value, center):
 
 
 def render_image(layout, targets):
+    # imported on first use, not to slow down importing of the app
+    from PIL import Image, ImageDraw
+
     size = layout["size"]
     grid = layout["grid"]
 
@@ -1,4 +1,3 @@
-import time
 import random
 import json
 from contextlib import contextmanager
@@ -6,8 +5,10 @@ from contextlib import contextmanager
 from otree.api import *
 from otree import settings
 
-from . import Player, Puzzle, Slider,  Game
+from . import Player, Puzzle, Slider,  Game, PENDING, has_pending
 from .task_sliders import snap_value, SLIDER_SNAP
+from ldt_core import clock, wire, throttling
+from ldt_core.fuzzing import fuzz, VALID, INVALID, ANY
 
 
 class PlayerBot(Bot):
@@ -17,16 +18,22 @@ class PlayerBot(Bot):
         "dropout_timeout",
         "snapping",
         "reloading",
+        "reloading_delta",
         "submitting_null",
         "submitting_empty",
         "submitting_none",
         "submitting_blank",
         "submitting_premature",
         "submitting_toofast",
+        "submitting_trailing",
+        "submitting_trailing_leave",
         "submitting_toomany",
+        "flooding",
         "skipping",
         "cheat_debug",
         "cheat_nodebug",
+        "compact_schema",
+        "fuzzing",  # random sequence of valid and malformed messages
     ]
 
     def play_round(self):
@@ -37,6 +44,11 @@ class PlayerBot(Bot):
         make_timeout = 'timeout' in self.case
         yield Submission(Game, check_html=False, timeout_happened=make_timeout)
 
+        if self.case == 'submitting_trailing_leave':
+            # the coalesced value is applied on leaving the page
+            expect(self.player.num_correct, 2)
+            expect(self.player.payoff, 2)
+
 
 # utils
 
@@ -75,7 +87,9 @@ def get_progress(p):
 def send(m, p, t, **values):
     data = {'type': t}
     data.update(values)
-    return m(p.id_in_group, data)[p.id_in_group]
+    resp = m(p.id_in_group, data)
+    # no response to coalesced values
+    return resp[p.id_in_group] if resp else None
 
 
 @contextmanager
@@ -160,7 +174,7 @@ def live_test_normal(method, player, conf):
         expect_slider(puzzle, i, value)
         expect_response(resp, 'feedback', slider=i, value=value, is_correct=False, is_completed=False)
 
-        time.sleep(retry_delay)
+        clock.sleep(retry_delay)
 
         # 2nd attempt - correct
         value = target
@@ -169,7 +183,7 @@ def live_test_normal(method, player, conf):
         expect_slider(puzzle, i, value)
         expect_response(resp, 'feedback', slider=i, value=value, is_correct=True, is_completed=last)
 
-        time.sleep(retry_delay)
+        clock.sleep(retry_delay)
 
 
 def live_test_normal_timeout(method, player, conf):
@@ -226,6 +240,48 @@ def live_test_reloading(method, player, conf):
     expect_slider(puzzle, 0, target)
 
 
+def live_test_reloading_delta(method, player, conf):
+    send(method, player, 'load')
+    resp = send(method, player, 'new')
+    puzzle = get_last_puzzle(player)
+    expect(resp['puzzle']['id'], puzzle.id)
+    expect(resp['puzzle']['version'], 0)
+
+    target0, target1 = get_target(puzzle, 0), get_target(puzzle, 1)
+    resp = send(method, player, 'value', slider=0, value=target0)
+    expect_response(resp, 'feedback', version=1)
+    clock.sleep(conf['retry_delay'])
+    resp = send(method, player, 'value', slider=1, value=target1 + SLIDER_SNAP)
+    expect_response(resp, 'feedback', version=2)
+
+    # reload with version 1 kept, getting changes since then
+    resp = send(method, player, 'load', puzzle=puzzle.id, version=1)
+    expect_response(resp, 'status')
+    expect_response_progress(resp, iteration=1, solved=1)
+    changed = {1: {'value': target1 + SLIDER_SNAP, 'is_correct': False}}
+    expect(resp['puzzle'], {'id': puzzle.id, 'version': 2, 'sliders': changed})
+
+    resp = send(method, player, 'load', puzzle=puzzle.id, version=2)
+    expect(resp['puzzle'], {'id': puzzle.id, 'version': 2, 'sliders': {}})
+
+    resp = send(method, player, 'load', puzzle=puzzle.id, version=2, schema=wire.SCHEMA)
+    expect(wire.expand(resp)['puzzle'], {'id': puzzle.id, 'version': 2, 'values': {}, 'correct': []})
+
+    resp = send(method, player, 'load', puzzle=puzzle.id, version=0, schema=wire.SCHEMA)
+    values = {0: target0, 1: target1 + SLIDER_SNAP}
+    expect(wire.expand(resp)['puzzle'], {'id': puzzle.id, 'version': 2, 'values': values, 'correct': [0]})
+
+    # another puzzle or unknown version, getting full puzzle
+    for cached in [
+        dict(puzzle=puzzle.id + 1, version=0),
+        dict(puzzle=puzzle.id, version=3),
+        dict(puzzle=puzzle.id, version="1"),
+    ]:
+        resp = send(method, player, 'load', **cached)
+        expect('image', 'in', resp['puzzle'])
+        expect(len(resp['puzzle']['sliders']), conf['num_sliders'])
+
+
 def live_test_submitting_null(method, player, conf):
     send(method, player, 'load')
     send(method, player, 'new')
@@ -273,6 +329,47 @@ def live_test_submitting_premature(method, player, conf):
         send(method, player, 'value', slider=0, value=100)
 
 
+def live_test_submitting_trailing(method, player, conf):
+    send(method, player, 'load')
+    send(method, player, 'new')
+
+    puzzle = get_last_puzzle(player)
+    target0, target1 = get_target(puzzle, 0), get_target(puzzle, 1)
+
+    resp = send(method, player, 'value', slider=0, value=target0)
+    expect_response(resp, 'feedback', version=1)
+    # the final position of a fast drag, with nothing after it
+    expect(send(method, player, 'value', slider=1, value=target1), None)
+    expect_puzzle(puzzle, version=1, num_correct=1)
+
+    # still kept within the delay
+    send(method, player, 'load')
+    expect_puzzle(puzzle, version=1, num_correct=1)
+
+    # applied by the resync after the delay
+    clock.sleep(conf['retry_delay'])
+    resp = send(method, player, 'load', puzzle=puzzle.id, version=1)
+    expect_response(resp, 'status')
+    expect(resp['puzzle']['version'], 2)
+    expect(resp['puzzle']['sliders'], {1: {'value': target1, 'is_correct': True}})
+    expect_response_progress(resp, solved=2)
+    expect_puzzle(puzzle, version=2, num_correct=2)
+    expect(has_pending(puzzle), False)
+    expect(get_slider(puzzle, 1).attempts, 1)
+    expect(player.num_correct, 2)
+
+
+def live_test_submitting_trailing_leave(method, player, conf):
+    send(method, player, 'load')
+    send(method, player, 'new')
+
+    puzzle = get_last_puzzle(player)
+    send(method, player, 'value', slider=0, value=get_target(puzzle, 0))
+    expect(send(method, player, 'value', slider=1, value=get_target(puzzle, 1)), None)
+    expect_puzzle(puzzle, num_correct=1)
+    # the page is submitted right after, checked in play_round
+
+
 def live_test_submitting_toomany(method, player, conf):
     retry_delay = conf['retry_delay']
 
@@ -289,7 +386,7 @@ def live_test_submitting_toomany(method, player, conf):
         resp = send(method, player, 'value', slider=0, value=v1)
         expect_response(resp, 'feedback')
         expect_slider(puzzle, 0, v1)
-        time.sleep(retry_delay)
+        clock.sleep(retry_delay)
 
     with expect_failure(RuntimeError):
         send(method, player, 'value', slider=0, value=v2)
@@ -307,14 +404,80 @@ def live_test_submitting_toofast(method, player, conf):
     v1 = snap_value(100, target)
     v2 = snap_value(50, target)
 
+    v3 = snap_value(150, target)
+    target1 = get_target(puzzle, 1)
+
     resp = send(method, player, 'value', slider=0, value=v1)
     expect_response(resp, 'feedback')
     expect_slider(puzzle, 0, v1)
 
+    # kept without response, the latest value per slider
+    expect(send(method, player, 'value', slider=0, value=v3), None)
+    expect(send(method, player, 'value', slider=0, value=v2), None)
+    expect(send(method, player, 'value', slider=1, value=target1), None)
+    expect_slider(puzzle, 0, v1)
+    expect(get_slider(puzzle, 0).attempts, 1)
+    expect_puzzle(puzzle, version=1, num_correct=0)
+
     with expect_failure(RuntimeError):
-        send(method, player, 'value', slider=0, value=v2)
+        send(method, player, 'value', slider=-1, value=v2)
 
-    expect_slider(puzzle, 0, v1)
+    # applied with the next value
+    clock.sleep(conf['retry_delay'])
+    target2 = get_target(puzzle, 2)
+    resp = send(method, player, 'value', slider=2, value=target2)
+    expect_response(resp, 'feedback', slider=2, value=target2, is_correct=True, version=2)
+    expect(resp['sliders'], {0: {'value': v2, 'is_correct': v2 == target}, 1: {'value': target1, 'is_correct': True}})
+    expect_slider(puzzle, 0, v2)
+    expect_slider(puzzle, 1, target1)
+    expect([get_slider(puzzle, i).attempts for i in range(3)], [2, 1, 1])
+    expect([get_slider(puzzle, i).version for i in range(3)], [2, 2, 2])
+    expect_puzzle(puzzle, version=2, num_correct=2 + (v2 == target))
+    expect(has_pending(puzzle), False)
+
+
+class FrozenClock(clock.VirtualClock):
+    """Virtual clock not advancing by itself, to count tokens refilled by time exactly"""
+
+    def __init__(self, reading: clock.Reading):
+        super().__init__()
+        self.reading = reading
+
+    def read(self):
+        return clock.Reading(self.reading.wall + self.offset, self.reading.mono + self.offset)
+
+
+def live_test_flooding(method, player, conf):
+    rate, burst = conf['rate_limit'], conf['rate_burst']
+    frozen = FrozenClock(clock.now())
+    previous = clock.install(frozen)
+    try:
+        send(method, player, 'load')
+        send(method, player, 'new')
+        puzzle = get_last_puzzle(player)
+        target = get_target(puzzle, 0)
+
+        for _ in range(burst - 2):
+            send(method, player, 'load')
+
+        with expect_failure(RuntimeError):
+            send(method, player, 'load')
+        with expect_failure(RuntimeError):
+            send(method, player, 'value', slider=0, value=target)
+        expect(get_slider(puzzle, 0).attempts, 0)
+
+        # a bit more than a token, not to depend on rounding of clock readings
+        clock.sleep(1.5 / rate)
+        resp = send(method, player, 'value', slider=0, value=target)
+        expect_response(resp, 'feedback', slider=0, is_correct=True)
+        with expect_failure(RuntimeError):
+            send(method, player, 'load')
+
+        clock.sleep(burst / rate)
+        expect(throttling.available(player, rate, burst), burst)
+    finally:
+        clock.install(previous)
+        previous.sleep(frozen.offset)
 
 
 def live_test_skipping(method, player, conf):
@@ -343,3 +506,149 @@ def live_test_cheat_nodebug(method, player, conf):
 
     with expect_failure(RuntimeError):
         send(method, player, 'cheat')
+
+
+def live_test_compact_schema(method, player, conf):
+    def send_compact(t, **values):
+        return method(player.id_in_group, wire.compact(dict(type=t, **values)))[player.id_in_group]
+
+    resp = send(method, player, 'load', schema=wire.SCHEMA)
+    expect(resp, {'t': wire.TYPE_CODES['status'], 'p': {'i': 0, 'sv': 0}})
+
+    resp = wire.expand(send_compact('new'))
+    expect_response(resp, 'puzzle', progress={'iteration': 1})
+    puzzle = get_last_puzzle(player)
+    sliders = Slider.filter(puzzle=puzzle)
+    expect(resp['puzzle']['values'], [s.value for s in sliders])
+    expect(resp['puzzle']['correct'], [])
+    expect('sliders', 'not in', resp['puzzle'])
+
+    target = get_target(puzzle, 1)
+    resp = wire.expand(send_compact('value', slider=1, value=target))
+    expect_response(resp, 'feedback', slider=1, value=target, is_correct=True, progress={'solved': 1})
+
+    clock.sleep(conf['retry_delay'])
+    resp = send_compact('value', slider=1, value=target)
+    expect('p', 'not in', resp)
+
+    # midgame reload
+    resp = wire.expand(send(method, player, 'load', schema=wire.SCHEMA))
+    expect_response(resp, 'status', progress={'iteration': 1, 'solved': 1})
+    expect(resp['puzzle']['correct'], [1])
+
+
+class SliderProtocol:
+    """Model of the live page for fuzzing, see ldt_core/fuzzing.py"""
+
+    # seconds or tokens, within which the model cannot tell what the server sees
+    MARGIN = 0.05
+
+    def __init__(self, params, player):
+        self.params = params
+        self.player = player
+        self.pauses = (0, params['retry_delay'] * 2)
+        self.iteration = 0
+        self.attempts = [0] * params['num_sliders']
+        self.responded = None  # monotonic reading of last applied value
+        self.flushing = None  # if the last message can apply coalesced values
+        self.pending = set()  # sliders with coalesced values
+        self.targets = None
+
+    def rows(self, player):
+        puzzles = Puzzle.filter(player=player)
+        return puzzles + [s for z in puzzles for s in Slider.filter(puzzle=z)]
+
+    def generate(self, rng):
+        kind = rng.choices(['load', 'new', 'value'], weights=[1, 1, 8])[0]
+        self.flushing = self.flushes() if kind == 'load' else False
+        if kind == 'load':
+            return dict(type='load'), VALID
+        if kind == 'new':
+            return dict(type='new'), INVALID if self.iteration else VALID
+
+        num = self.params['num_sliders']
+        idx = rng.choice(range(-1, num + 1))
+        target = self.targets[idx] if self.targets and 0 <= idx < num else 0
+        value = target + rng.choice([0, 0, 1, -1, SLIDER_SNAP, -SLIDER_SNAP * 10])
+        message = dict(type='value', slider=idx, value=value)
+        if self.iteration == 0 or not 0 <= idx < num:
+            return message, INVALID
+        if self.responded is not None:
+            elapsed = clock.now().mono - self.responded
+            if elapsed < self.params['retry_delay'] - self.MARGIN:
+                return message, VALID  # coalesced
+            if elapsed < self.params['retry_delay'] + self.MARGIN:
+                return message, ANY
+        if self.attempts[idx] >= self.params['attempts_per_slider']:
+            return message, INVALID
+        return message, VALID
+
+    def flushes(self):
+        """If a load message applies coalesced values, after retry delay
+        Within the margin, peeking into the coalesced values after the message is handled.
+        """
+        if not self.pending:
+            return False
+        elapsed = clock.now().mono - self.responded
+        if elapsed < self.params['retry_delay'] - self.MARGIN:
+            return False
+        if elapsed < self.params['retry_delay'] + self.MARGIN:
+            return ANY
+        return True
+
+    def admit(self, message):
+        """Expectation by rate limit, peeking into the bucket of the player"""
+        tokens = throttling.available(self.player, self.params['rate_limit'], self.params['rate_burst'])
+        if tokens < 1 - self.MARGIN:
+            return INVALID
+        if tokens < 1 + self.MARGIN:
+            return ANY
+        return None
+
+    def update(self, message, reply):
+        if reply is None:
+            self.pending.add(int(message['slider']))
+            return
+        if reply['type'] == 'status' and self.flushing:
+            if self.flushing is ANY:
+                [z] = Puzzle.filter(player=self.player, iteration=self.iteration)
+                self.flushing = not has_pending(z)
+            if self.flushing:
+                for i in self.pending:
+                    if self.attempts[i] < self.params['attempts_per_slider']:
+                        self.attempts[i] += 1
+                self.pending = set()
+        if reply['type'] == 'puzzle':
+            self.iteration += 1
+            self.responded = None
+            self.pending = set()
+        if reply['type'] == 'feedback':
+            idx = reply['slider']
+            applied = {i for i in self.pending - {idx} if self.attempts[i] < self.params['attempts_per_slider']}
+            expect(set(reply.get('sliders', {})), applied)
+            for i in applied | {idx}:
+                self.attempts[i] += 1
+            self.pending = set()
+            self.responded = clock.now().mono
+
+    def check(self, player):
+        expect(player.iteration, self.iteration)
+        puzzles = Puzzle.filter(player=player)
+        expect(len(puzzles), self.iteration)
+        if not puzzles:
+            return
+        [z] = puzzles
+        sliders = Slider.filter(puzzle=z)
+        self.targets = [s.target for s in sliders]
+        num_correct = sum(1 for s in sliders if s.is_correct)
+        expect(z.num_correct, num_correct)
+        expect(player.num_correct, num_correct)
+        expect(z.is_solved, num_correct == z.num_sliders)
+        expect([s.attempts for s in sliders], self.attempts)
+        expect(set(PENDING.get(z.id, {})), self.pending)
+        for s in sliders:
+            expect(s.is_correct, s.value == s.target)
+
+
+def live_test_fuzzing(method, player, conf):
+    fuzz(method, player, SliderProtocol(conf, player))